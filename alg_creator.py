@@ -1,8 +1,14 @@
 from core_funs import *
 import collections
 import random
-from process_data import OSRMHandler
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import io
+import contextlib
+import numpy as np
+from multiprocessing import shared_memory
+from process_data import OSRMHandler, CompiledInstance, compile_instance, MIN_ENERGY_COST_PER_KM
+from config import Config
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import math
 
 class AdaptiveTabuList:
@@ -52,6 +58,8 @@ class AdaptiveTabuList:
 
 def k_opt_improvement(solution, instance, map_handler, k=2):
     """Geliştirilmiş k-opt iyileştirme"""
+    # Her değerlendirmede yeniden derlenmesin; handler aynı instance'ı tekrar indekslemez
+    instance = compile_instance(instance)
     improved = solution.copy()
     best_distance = evaluate_solution_with_real_distances(improved, instance, map_handler)
     improvement_found = True
@@ -163,24 +171,38 @@ def diversify_solution(solution):
     
     return new_solution
 
-def split_into_routes(solution, customers, vehicle_capacity):
+def split_into_routes(solution, customers, vehicle_capacity, leg_cost=None, max_routes=None):
     """
     Çözümü araç kapasitesine göre rotalara böl
     
+    leg_cost verilirse dev tur üzerinde en kısa yol bölmesi (Prins split) yapılır
+    ve kapasiteye uygun en düşük maliyetli bölümleme döndürülür. Verilmezse
+    araçlar tur sırasıyla açgözlü doldurulur.
+    
     Args:
         solution: Çözüm dizisi (müşteri id'leri)
-        customers: (customer_id, demand) çiftlerinden oluşan liste
+        customers: CompiledInstance veya (customer_id, demand) çiftlerinden oluşan liste
         vehicle_capacity: Araç kapasitesi
+        leg_cost: (from_node, to_node, route_load) -> maliyet fonksiyonu (opsiyonel)
+        max_routes: En iyi bölmede kullanılabilecek en fazla rota (araç) sayısı
         
     Returns:
         Rotalar listesi veya geçersiz çözüm için None
     """
+    if isinstance(customers, CompiledInstance):
+        demands = customers.demand_list
+    else:
+        demands = dict(customers)
+    
+    if leg_cost is not None:
+        return _optimal_split(solution, demands, vehicle_capacity, leg_cost, max_routes)
+    
     routes = []
     current_route = []
     current_load = 0
     
     for customer_id in solution:
-        customer_demand = next(demand for cid, demand in customers if cid == customer_id)
+        customer_demand = demands[customer_id]
         
         if current_load + customer_demand > vehicle_capacity:
             if current_route:  # Mevcut rotayı ekle
@@ -196,106 +218,443 @@ def split_into_routes(solution, customers, vehicle_capacity):
     
     return routes
 
+def _route_arcs(node_at, n, start, demands, vehicle_capacity, leg_cost):
+    """
+    start pozisyonundan başlayan kapasiteye uygun rotaları üretir.
+    
+    Her adımda (bitiş pozisyonu + 1, rota maliyeti) döner; rota maliyeti depodan
+    çıkış, rota içi bacaklar (kümülatif yük ile) ve depoya dönüşü içerir. Tek
+    müşterili rota kapasiteyi aşsa bile üretilir (açgözlü bölmeyle aynı davranış).
+    """
+    load = 0.0
+    partial = 0.0
+    prev = 0
+    for p in range(start, n):
+        customer_id = node_at(p)
+        demand = demands[customer_id]
+        if p > start and load + demand > vehicle_capacity:
+            return
+        load += demand
+        partial += leg_cost(prev, customer_id, load)
+        if partial == float('inf'):
+            return
+        yield p + 1, partial + leg_cost(customer_id, 0, load)
+        prev = customer_id
+
+def _tour_arcs(node_at, n, demands, vehicle_capacity, leg_cost):
+    """Her başlangıç pozisyonu için kapasiteye uygun rota yaylarını bir kez fiyatlar"""
+    return [list(_route_arcs(node_at, n, i, demands, vehicle_capacity, leg_cost)) for i in range(n)]
+
+def _split_labels(arcs, n, max_routes=None):
+    """
+    Rota yayları üzerinde en kısa yol bölmesi.
+    
+    Önce rota sayısı sınırsız çözülür; en iyi bölme max_routes'u aşıyorsa
+    rota sayısı da etikete eklenerek sınırlı problem çözülür.
+    
+    Returns:
+        (maliyet, [(başlangıç, bitiş), ...]) - uygun bölme yoksa maliyet inf
+    """
+    inf = float('inf')
+    labels = [0.0] + [inf] * n
+    counts = [0] * (n + 1)
+    pred = [0] * (n + 1)
+    for i in range(n):
+        if labels[i] == inf:
+            continue
+        for end, cost in arcs[i]:
+            value = labels[i] + cost
+            if value < labels[end] or (value == labels[end] and counts[i] + 1 < counts[end]):
+                labels[end] = value
+                counts[end] = counts[i] + 1
+                pred[end] = i
+    
+    if max_routes is not None and counts[n] > max_routes and labels[n] != inf:
+        # Sınırlı problem: layers[r][p] = ilk p müşteri tam r rota ile
+        layers = [[0.0] + [inf] * n]
+        preds = [[0] * (n + 1)]
+        for r in range(1, min(max_routes, n) + 1):
+            previous = layers[-1]
+            layer = [inf] * (n + 1)
+            layer_pred = [0] * (n + 1)
+            for i in range(n):
+                if previous[i] == inf:
+                    continue
+                for end, cost in arcs[i]:
+                    if previous[i] + cost < layer[end]:
+                        layer[end] = previous[i] + cost
+                        layer_pred[end] = i
+            layers.append(layer)
+            preds.append(layer_pred)
+        
+        best_r = min(range(len(layers)), key=lambda r: layers[r][n])
+        if layers[best_r][n] == inf:
+            return inf, []
+        bounds = []
+        end = n
+        for r in range(best_r, 0, -1):
+            bounds.append((preds[r][end], end))
+            end = preds[r][end]
+        bounds.reverse()
+        return layers[best_r][n], bounds
+    
+    if labels[n] == inf:
+        return inf, []
+    bounds = []
+    end = n
+    while end > 0:
+        bounds.append((pred[end], end))
+        end = pred[end]
+    bounds.reverse()
+    return labels[n], bounds
+
+def _optimal_split(solution, demands, vehicle_capacity, leg_cost, max_routes=None):
+    """Dev tur için en düşük maliyetli kapasite-uygun bölmeyi (Prins split) hesaplar"""
+    n = len(solution)
+    arcs = _tour_arcs(solution.__getitem__, n, demands, vehicle_capacity, leg_cost)
+    cost, bounds = _split_labels(arcs, n, max_routes)
+    if n and cost == float('inf'):
+        return None
+    return [list(solution[start:end]) for start, end in bounds]
+
 def evaluate_solution_cost(solution, instance_data, maps_handler, vehicle_capacity, distance_weight=1.0, energy_weight=0.5):
-    """Çözümün ağırlıklı hibrit maliyetini (mesafe + enerji) hesaplar"""
-    routes = split_into_routes(solution, [
-        (i, float(instance_data[f'C_{i}']['demand']))
-        for i in range(1, len(solution) + 1)
-    ], vehicle_capacity)
+    """Çözümün ağırlıklı hibrit maliyetini (mesafe + enerji) en iyi kapasite bölmesiyle hesaplar"""
+    evaluator = TourCostEvaluator(
+        instance_data, maps_handler, vehicle_capacity, distance_weight, energy_weight
+    )
+    return evaluator.reset(solution)
+
+class TourCostEvaluator:
+    """
+    Dev tur için artımlı hibrit maliyet değerlendiricisi.
     
-    if not routes:
-        return float('inf')
+    Tur, kapasiteye uygun rotalara en kısa yol bölmesiyle (Prins split) ayrılır.
+    Mevcut tur için ileri etiketler (ilk p müşterinin en iyi bölme maliyeti) ve
+    geri etiketler (p'den sonraki müşterilerin en iyi bölme maliyeti) tutulur.
+    Bir hamlenin (swap, 2-opt, insert) maliyeti yalnızca hamlenin değiştirdiği
+    aralığa uzanabilen rotalar yeniden fiyatlanarak bulunur; aralığın öncesi
+    ileri, sonrası geri etiketlerden alınır. Instance'taki araç sayısı (varsa)
+    rota sayısı üst sınırıdır; sınır aşılırsa aynı aralık rota sayılı
+    katmanlı etiketlerle fiyatlanır.
+    """
+    
+    def __init__(self, instance, maps_handler, vehicle_capacity, distance_weight=1.0, energy_weight=0.5):
+        self.instance = compile_instance(instance)
+        self.maps_handler = maps_handler
+        self.vehicle_capacity = vehicle_capacity
+        self.distance_weight = distance_weight
+        self.energy_weight = energy_weight
+        self.max_routes = self.instance.max_vehicle_number
+        self.distances = maps_handler.index_instance(self.instance)
+        self.demands = self.instance.demand_list
+        self.max_route_len = self._max_route_len()
+        # Aynı (i, j, yük) bacakları etiket hesaplarında defalarca fiyatlanır
+        self._leg_costs = {}
+        # Bacak maliyetinin yol mesafesi/enerjiye dokunmadan bilinen alt sınırı:
+        # maliyet >= dw * d + ew * (d + enerji), enerji >= MIN_ENERGY_COST_PER_KM * d
+        self._leg_lower_bounds = None
+        if Config.PRUNE_MOVES_WITH_LOWER_BOUND and distance_weight >= 0 and energy_weight >= 0:
+            factor = distance_weight + energy_weight * (1 + MIN_ENERGY_COST_PER_KM)
+            lower_bounds = maps_handler.get_lower_bound_matrix()
+            if lower_bounds is not None:
+                self._leg_lower_bounds = (lower_bounds * factor).tolist()
+        self.tour = []
+        self.bounds = []
+        self.cost = float('inf')
+    
+    def _max_route_len(self):
+        """Bir rotaya sığabilecek en fazla müşteri sayısı (en küçük talepler ile)"""
+        count = 0
+        load = 0.0
+        for demand in sorted(self.demands[1:]):
+            if count > 0 and load + demand > self.vehicle_capacity:
+                break
+            load += demand
+            count += 1
+        return max(count, 1)
+    
+    def leg_cost(self, i, j, load):
+        """i -> j bacağının yük altındaki ağırlıklı maliyeti"""
+        key = (i, j, load)
+        cost = self._leg_costs.get(key)
+        if cost is not None:
+            return cost
         
-    total_energy_cost = 0
-    total_distance = 0
+        distance = float(self.distances[i, j])
+        energy_cost = float('inf')
+        if distance != float('inf'):
+            energy_cost = self.maps_handler.get_route_cost_by_index(i, j, vehicle_mass=10000 + (load * 100))
+        if energy_cost == float('inf'):
+            cost = float('inf')
+        else:
+            cost = self.distance_weight * distance + self.energy_weight * energy_cost
+        self._leg_costs[key] = cost
+        return cost
     
-    for route in routes:
-        prev_point = (
-            instance_data['depart']['coordinates']['x'],
-            instance_data['depart']['coordinates']['y']
-        )
-        route_load = 0
+    def reset(self, solution):
+        """Yeni mevcut çözüm için etiketleri baştan kurar"""
+        self.tour = list(solution)
+        return self._rebuild()
+    
+    def _rebuild(self):
+        tour = self.tour
+        n = len(tour)
+        inf = float('inf')
         
-        for customer_id in route:
-            route_load += float(instance_data[f'C_{customer_id}']['demand'])
-            curr_point = (
-                instance_data[f'C_{customer_id}']['coordinates']['x'],
-                instance_data[f'C_{customer_id}']['coordinates']['y']
-            )
-            
-            # Mesafe
-            segment_distance = maps_handler.get_distance(prev_point, curr_point)
-            if segment_distance == float('inf'): return float('inf')
-            total_distance += segment_distance
-
-            # Enerji maliyeti (yük dahil)
-            # Use get_route_cost which inherently includes distance and energy factors
-            segment_energy_cost = maps_handler.get_route_cost(
-                prev_point,
-                curr_point,
-                vehicle_mass=10000 + (route_load * 100) 
-            )
-            if segment_energy_cost == float('inf'): return float('inf')
-            total_energy_cost += segment_energy_cost # Accumulate energy cost directly
-            
-            prev_point = curr_point
+        # Tüm kapasite-uygun rotaları bir kez fiyatla, ileri ve geri etiketlerde kullan
+        arcs = _tour_arcs(tour.__getitem__, n, self.demands, self.vehicle_capacity, self.leg_cost)
         
-        # Depoya dönüş
-        depot_point = (
-            instance_data['depart']['coordinates']['x'],
-            instance_data['depart']['coordinates']['y']
-        )
-        depot_return_distance = maps_handler.get_distance(prev_point, depot_point)
-        depot_return_energy_cost = maps_handler.get_route_cost(
-            prev_point, 
-            depot_point,
-            vehicle_mass=10000 + (route_load * 100) # Assume load affects return energy
-        )
+        forward = [0.0] + [inf] * n
+        forward_routes = [0] * (n + 1)
+        for i in range(n):
+            if forward[i] == inf:
+                continue
+            for end, cost in arcs[i]:
+                value = forward[i] + cost
+                if value < forward[end] or (value == forward[end] and forward_routes[i] + 1 < forward_routes[end]):
+                    forward[end] = value
+                    forward_routes[end] = forward_routes[i] + 1
         
-        if depot_return_distance == float('inf') or depot_return_energy_cost == float('inf'):
-             return float('inf')
-             
-        total_distance += depot_return_distance
-        total_energy_cost += depot_return_energy_cost
-            
-    # Hibrit maliyeti hesapla
-    hybrid_cost = (distance_weight * total_distance) + (energy_weight * total_energy_cost)
-    return hybrid_cost
+        backward = [inf] * n + [0.0]
+        backward_routes = [0] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            for end, cost in arcs[i]:
+                value = cost + backward[end]
+                if value < backward[i] or (value == backward[i] and backward_routes[end] + 1 < backward_routes[i]):
+                    backward[i] = value
+                    backward_routes[i] = backward_routes[end] + 1
+        
+        self.forward = forward
+        self.forward_routes = forward_routes
+        self.backward = backward
+        self.backward_routes = backward_routes
+        # Rota sayısına göre katmanlı etiketler yalnızca araç sınırı bir hamlede aşılırsa kurulur
+        self._arcs = arcs
+        self._route_layers = None
+        self.cost, self.bounds = _split_labels(arcs, n, self.max_routes)
+        return self.cost
+    
+    def _layers(self):
+        """
+        Mevcut tur için rota sayısına göre ileri/geri etiketler.
+        
+        forward[r][p]: ilk p müşteri tam r rota ile, backward[r][p]: p'den
+        sonraki müşteriler tam r rota ile en düşük maliyet (r <= max_routes).
+        """
+        if self._route_layers is None:
+            n = len(self.tour)
+            inf = float('inf')
+            arcs = self._arcs
+            forward = [[0.0] + [inf] * n]
+            backward = [[inf] * n + [0.0]]
+            for _ in range(min(self.max_routes, n)):
+                previous = forward[-1]
+                layer = [inf] * (n + 1)
+                for i in range(n):
+                    if previous[i] == inf:
+                        continue
+                    for end, cost in arcs[i]:
+                        if previous[i] + cost < layer[end]:
+                            layer[end] = previous[i] + cost
+                forward.append(layer)
+                
+                previous = backward[-1]
+                layer = [inf] * (n + 1)
+                for i in range(n - 1, -1, -1):
+                    for end, cost in arcs[i]:
+                        if cost + previous[end] < layer[i]:
+                            layer[i] = cost + previous[end]
+                backward.append(layer)
+            self._route_layers = (forward, backward)
+        return self._route_layers
+    
+    def routes(self):
+        """Mevcut turun en iyi bölmesini rota listesi olarak döndürür"""
+        if self.cost == float('inf'):
+            return None
+        return [self.tour[start:end] for start, end in self.bounds]
+    
+    def _leg_lower_bound(self, i, j, load):
+        return self._leg_lower_bounds[i][j]
+    
+    def _known_leg_cost(self, i, j, load):
+        """Fiyatlanmış bacak için gerçek maliyet, diğerleri için alt sınır"""
+        cost = self._leg_costs.get((i, j, load))
+        if cost is None:
+            self._used_lower_bound = True
+            return self._leg_lower_bounds[i][j]
+        return cost
+    
+    def move_cost(self, move):
+        """Hamle uygulandığında oluşacak toplam maliyeti döndürür (tur değiştirilmez)"""
+        return self._move_cost(move, self.leg_cost, exact=True)
+    
+    def move_lower_bound(self, move):
+        """
+        Hamle maliyetinin alt sınırı.
+        
+        Değişen aralıktaki rotalar kuş uçuşu alt sınır matrisiyle fiyatlanır,
+        yol mesafesi ve enerji (dolayısıyla dış servisler) hiç kullanılmaz.
+        """
+        return self._move_cost(move, self._leg_lower_bound, exact=False)
+    
+    def price_moves(self, moves):
+        """
+        Hamleleri fiyatlar, [(hamle, maliyet)] (sonsuz olmayanlar, üretim sırasıyla) döndürür.
+        
+        Her hamle önce bilinen bacak maliyetleriyle, henüz fiyatlanmamış
+        bacaklar için alt sınırla değerlendirilir; tüm bacakları bilinen
+        hamlenin sonucu zaten gerçek maliyettir. Alt sınırı bulunan en iyi
+        maliyetten büyük hamleler için yol mesafesi/enerji hiç istenmez.
+        En iyi hamle (eşitlikte ilk üretilen) elemesiz fiyatlamayla aynıdır.
+        """
+        inf = float('inf')
+        if self._leg_lower_bounds is None:
+            priced = [(move, self.move_cost(move)) for move in moves]
+            return [(move, cost) for move, cost in priced if cost != inf]
+        
+        estimates = []
+        for k, move in enumerate(moves):
+            self._used_lower_bound = False
+            value = self._move_cost(move, self._known_leg_cost, exact=True)
+            estimates.append((value, k, move, not self._used_lower_bound))
+        estimates.sort(key=lambda item: item[0])
+        
+        best = inf
+        priced = []
+        for value, k, move, is_exact in estimates:
+            if value > best:
+                break
+            cost = value if is_exact else self.move_cost(move)
+            if cost != inf:
+                priced.append((k, move, cost))
+                best = min(best, cost)
+        priced.sort(key=lambda item: item[0])
+        return [(move, cost) for _, move, cost in priced]
+    
+    def _move_cost(self, move, leg_cost, exact):
+        a, b, new_at = self._move_view(move)
+        if b < a:
+            return self.cost
+        tour = self.tour
+        n = len(tour)
+        inf = float('inf')
+        
+        def node_at(p):
+            return new_at(p) if a <= p <= b else tour[p]
+        
+        # [a, b] aralığına uzanabilecek rotalar en erken a - max_route_len'de başlar;
+        # a'ya kadar olan ileri etiketler değişmez
+        labels = {}
+        for i in range(max(0, a - self.max_route_len), b + 1):
+            if i <= a:
+                base, base_routes = self.forward[i], self.forward_routes[i]
+            else:
+                base, base_routes = labels.get(i, (inf, 0))
+            if base == inf:
+                continue
+            for end, cost in _route_arcs(node_at, n, i, self.demands, self.vehicle_capacity, leg_cost):
+                if end > a and base + cost < labels.get(end, (inf, 0))[0]:
+                    labels[end] = (base + cost, base_routes + 1)
+        
+        # b'den sonraki ilk rota sınırında değişmeyen son kısmın geri etiketiyle birleştir
+        best, best_routes = inf, 0
+        for end, (label, label_routes) in labels.items():
+            if end > b and label + self.backward[end] < best:
+                best = label + self.backward[end]
+                best_routes = label_routes + self.backward_routes[end]
+        
+        # Alt sınır için sınırsız bölme yeterli (sınırlı bölme daha küçük olamaz)
+        if exact and self.max_routes is not None and best != inf and best_routes > self.max_routes:
+            # Sınırsız en iyi bölme araç sayısını aşıyor: aynı aralık rota sayılı etiketlerle
+            # yeniden fiyatlanır, önü ve arkası katmanlı ileri/geri etiketlerden gelir
+            best = self._capped_move_cost(a, b, node_at, leg_cost)
+        return best
+    
+    def _capped_move_cost(self, a, b, node_at, leg_cost):
+        forward, backward = self._layers()
+        max_routes = len(forward) - 1
+        n = len(self.tour)
+        inf = float('inf')
+        
+        # labels[r][end]: end'e kadar tam r rota ile (aralıktaki rotalar yeniden fiyatlanmış)
+        labels = [{} for _ in range(max_routes + 1)]
+        for i in range(max(0, a - self.max_route_len), b + 1):
+            if i <= a:
+                bases = [forward[r][i] for r in range(max_routes)]
+            else:
+                bases = [labels[r].get(i, inf) for r in range(max_routes)]
+            if min(bases) == inf:
+                continue
+            for end, cost in _route_arcs(node_at, n, i, self.demands, self.vehicle_capacity, leg_cost):
+                if end <= a:
+                    continue
+                for r, base in enumerate(bases):
+                    if base + cost < labels[r + 1].get(end, inf):
+                        labels[r + 1][end] = base + cost
+        
+        best = inf
+        for r in range(1, max_routes + 1):
+            for end, label in labels[r].items():
+                if end <= b:
+                    continue
+                for remaining in range(max_routes - r + 1):
+                    if label + backward[remaining][end] < best:
+                        best = label + backward[remaining][end]
+        return best
+    
+    def apply(self, move):
+        """Hamleyi mevcut çözüme yerinde uygular ve durumu günceller"""
+        apply_move(self.tour, move, in_place=True)
+        return self._rebuild()
+    
+    def _move_view(self, move):
+        """Hamlenin değiştirdiği [a, b] aralığını ve yeni turdaki elemanı veren fonksiyonu döndürür"""
+        op, i, j = move
+        tour = self.tour
+        if op == 'swap':
+            swapped = {i: tour[j], j: tour[i]}
+            return min(i, j), max(i, j), lambda p: swapped.get(p, tour[p])
+        if op == '2-opt':
+            # tour[i:j] ters çevrilir
+            return i, j - 1, lambda p: tour[i + j - 1 - p]
+        if op == 'insert':
+            # tour.pop(i) -> tour.insert(j, ...)
+            if i < j:
+                return i, j, lambda p: tour[i] if p == j else tour[p + 1]
+            return j, i, lambda p: tour[i] if p == j else tour[p - 1]
+        raise ValueError(f"Unknown move type: {op}")
 
-def run_tabu_search(
-    instance_data,
-    individual_size, 
+def _run_single_search(
+    instance,
+    maps_handler,
+    individual_size,
     n_gen,
     tabu_size,
-    stagnation_limit=15,
-    verbose=True,
-    vehicle_capacity=None,
-    distance_weight=1.0, # Add weight parameters
-    energy_weight=0.5    # Add weight parameters
+    stagnation_limit,
+    vehicle_capacity,
+    distance_weight,
+    energy_weight,
+    verbose=True
 ):
-    """Hibrit maliyet (mesafe + enerji) odaklı tek aşamalı tabu arama"""
-    if instance_data is None or vehicle_capacity is None:
-        return None
-        
-    print("\nStarting Hybrid Cost Focused Tabu Search...")
-    print(f"Weights: Distance={distance_weight}, Energy={energy_weight}")
-    maps_handler = OSRMHandler()
-    
+    """Tek başlangıçlı tabu arama döngüsü, (en iyi çözüm, en iyi maliyet) döndürür"""
     print("Creating initial solution...")
-    initial_solution = create_initial_solution(instance_data, individual_size, maps_handler)
+    initial_solution = create_initial_solution(instance, individual_size, maps_handler)
     if not initial_solution:
         print("Failed to create initial solution")
         return None
     
     print(f"Initial solution created with {len(initial_solution)} customers")
     
+    # Hamle maliyetlerini artımlı hesaplayan değerlendirici
+    evaluator = TourCostEvaluator(
+        instance, maps_handler, vehicle_capacity, distance_weight, energy_weight
+    )
+    
     # Store the best hybrid cost and solution
     best_solution = initial_solution.copy()
-    best_cost = evaluate_solution_cost( # Hybrid cost
-        best_solution, instance_data, maps_handler, vehicle_capacity, 
-        distance_weight, energy_weight
-    )
-    current_solution = initial_solution.copy()
+    best_cost = evaluator.reset(initial_solution) # Hybrid cost
+    current_solution = evaluator.tour
     current_cost = best_cost
     
     tabu_list = AdaptiveTabuList(tabu_size, tabu_size * 2)
@@ -308,7 +667,7 @@ def run_tabu_search(
     # Main tabu search loop
     iteration = 0 # Define iteration counter outside loop for final report
     for iteration in range(n_gen):
-        if iteration % 10 == 0:  
+        if verbose and iteration % 10 == 0:  
             print(f"\nIteration {iteration}/{n_gen}")
             print(f"Current stagnation: {stagnation_counter}/{stagnation_limit}")
             print(f"Best hybrid cost so far: {best_cost:.2f}")
@@ -325,35 +684,32 @@ def run_tabu_search(
         else:
             method = "insert"
             
-        neighbors = generate_neighbors(current_solution, method=method, num_neighbors=20)
-        
-        # Evaluate neighbors based on hybrid cost
-        valid_neighbors = []
-        for neighbor in neighbors:
-            cost = evaluate_solution_cost( # Hybrid cost
-                neighbor, instance_data, maps_handler, vehicle_capacity, 
-                distance_weight, energy_weight
-            )
-            if cost != float('inf'):
-                valid_neighbors.append((neighbor, cost))
+        # Evaluate moves based on hybrid cost (only the touched edges are re-priced;
+        # moves whose lower bound is already worse than the best candidate are skipped)
+        valid_moves = evaluator.price_moves(
+            generate_moves(current_solution, method=method, num_moves=20)
+        )
         
-        if not valid_neighbors:
-            current_solution = diversify_solution(current_solution)
+        if not valid_moves:
+            evaluator.reset(diversify_solution(current_solution))
+            current_solution = evaluator.tour
             stagnation_counter += 1
             continue
             
-        # Select the best neighbor (based on hybrid cost)
-        best_neighbor_solution, best_neighbor_cost = min(valid_neighbors, key=lambda x: x[1])
+        # Select the best move (based on hybrid cost)
+        best_move, best_neighbor_cost = min(valid_moves, key=lambda x: x[1])
         
         # Update current solution
-        current_solution = best_neighbor_solution
+        evaluator.apply(best_move)
+        current_solution = evaluator.tour
         current_cost = best_neighbor_cost
         
         # Update best solution (based on hybrid cost)
         if current_cost < best_cost:
             best_solution = current_solution.copy()
             best_cost = current_cost
-            print(f"---> New best hybrid cost found: {best_cost:.2f} at iteration {iteration}")
+            if verbose:
+                print(f"---> New best hybrid cost found: {best_cost:.2f} at iteration {iteration}")
             stagnation_counter = 0
         else:
             stagnation_counter += 1
@@ -362,12 +718,192 @@ def run_tabu_search(
         tabu_list.add(current_solution)
             
     print(f"\nTabu Search completed after {iteration + 1} iterations")
+    return best_solution, best_cost
+
+def _publish_shared_arrays(arrays):
+    """
+    Dizileri paylaşımlı belleğe bir kez kopyalar.
+    
+    Returns:
+        (SharedMemory listesi, {ad: (shm adı, shape, dtype)}) - çağıran,
+        iş bitince blokları kapatıp silmekten sorumludur
+    """
+    blocks = []
+    descriptors = {}
+    for name, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        descriptors[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, descriptors
+
+def _attach_shared_arrays(descriptors):
+    """Yayınlanan paylaşımlı bellek bloklarını kopyalamadan numpy dizisi olarak açar"""
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in descriptors.items():
+        try:
+            block = shared_memory.SharedMemory(name=block_name, track=False)
+        except TypeError:
+            # Python < 3.13: işçiler ana sürecin resource tracker'ını paylaşır,
+            # blok yalnızca ana süreç unlink edince kaydından düşer
+            block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+# İşçi süreç başına bir kez kurulan durum (handler + paylaşımlı diziler)
+_worker_state = {}
+
+def _init_search_worker(instance, descriptors, matrix_path=None, degraded=False, elevation_offline=False,
+                        energy_matrix=None):
+    if matrix_path is not None:
+        # Matris diskte: tüm işçiler aynı dosyayı eşler
+        blocks = []
+        distance_array = np.load(matrix_path, mmap_mode='r')
+    else:
+        blocks, arrays = _attach_shared_arrays(descriptors)
+        distance_array = arrays['distance']
+    maps_handler = OSRMHandler()
+    maps_handler.attach_distance_array(distance_array, instance)
+    if energy_matrix is not None:
+        # Ana süreçte çıkarılan enerji katsayıları; işçiler profilleri yeniden indirgemez
+        maps_handler.attach_energy_coefficients(energy_matrix)
+    # Tahmini mesafelerle çalışılıyorsa işçiler de dış servisleri beklemez
+    maps_handler.degraded = degraded
+    maps_handler.elevation_offline = elevation_offline
+    _worker_state.update(instance=instance, maps_handler=maps_handler, blocks=blocks)
+
+def _search_worker(seed, search_params):
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = _run_single_search(
+            _worker_state['instance'], _worker_state['maps_handler'], verbose=False, **search_params
+        )
+    if result is None:
+        return None
+    best_solution, best_cost = result
+    return best_cost, best_solution
+
+def _run_multi_start_search(instance, maps_handler, search_params, num_starts, max_workers=None, seed=None):
+    """Bağımsız tohumlanmış aramaları süreç havuzunda çalıştırır, en iyisini döndürür"""
+    max_workers = min(num_starts, max_workers or os.cpu_count() or 1)
+    seeder = random.Random(seed)
+    seeds = [seeder.randrange(2 ** 32) for _ in range(num_starts)]
+    print(f"Running {num_starts} independent searches on {max_workers} processes...")
+    
+    # İşçiler yükseklik/enerji önbelleklerini diskten yükler
+    maps_handler.save_cache()
+    matrix_path = maps_handler.distance_array_path
+    if matrix_path is not None:
+        blocks, descriptors = [], {}
+    else:
+        blocks, descriptors = _publish_shared_arrays({'distance': maps_handler.distance_array})
+    # Katsayı nesneleri değişken uzunlukta (eşik listeleri), paylaşımlı belleğe sığmaz;
+    # initializer ile işçi başına bir kez gönderilir
+    energy_matrix = maps_handler.bound_energy_matrix()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_search_worker,
+            initargs=(
+                instance, descriptors, matrix_path, maps_handler.degraded, maps_handler.elevation_offline,
+                energy_matrix
+            )
+        ) as executor:
+            futures = [executor.submit(_search_worker, start_seed, search_params) for start_seed in seeds]
+            results = []
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error in search worker: {e}")
+                    continue
+                if result is not None:
+                    results.append(result)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    
+    if not results:
+        return None
+    best_cost, best_solution = min(results, key=lambda x: x[0])
+    print(f"Best of {len(results)} starts: {best_cost:.2f}")
+    return best_solution, best_cost
+
+def run_tabu_search(
+    instance_data,
+    individual_size, 
+    n_gen,
+    tabu_size,
+    stagnation_limit=15,
+    verbose=True,
+    vehicle_capacity=None,
+    distance_weight=1.0, # Add weight parameters
+    energy_weight=0.5,   # Add weight parameters
+    num_starts=None,
+    max_workers=None,
+    seed=None,
+    maps_handler=None
+):
+    """
+    Hibrit maliyet (mesafe + enerji) odaklı tabu arama.
+    
+    num_starts > 1 ise farklı tohumlarla bağımsız aramalar bir süreç havuzunda
+    çalıştırılır ve en iyi sonuç döndürülür. Mesafe matrisi süreçlere görev
+    başına serileştirilmek yerine bir kez yayınlanır: diskte saklanan matris
+    dosyası eşlenir, yoksa paylaşımlı belleğe kopyalanır. Enerji katsayı
+    matrisi işçi başına bir kez (initializer ile) gönderilir.
+    
+    maps_handler verilirse (ör. mesafeleri önceden hesaplayan istek handler'ı)
+    yenisi oluşturulmaz.
+    """
+    if instance_data is None or vehicle_capacity is None:
+        return None
+        
+    print("\nStarting Hybrid Cost Focused Tabu Search...")
+    print(f"Weights: Distance={distance_weight}, Energy={energy_weight}")
+    if maps_handler is None:
+        maps_handler = OSRMHandler()
+    
+    # Instance sözlüğünü bir kez derle, tüm çözücü fonksiyonları bunu kullanır
+    instance = compile_instance(instance_data)
+    maps_handler.index_instance(instance)
+    
+    if num_starts is None:
+        num_starts = Config.TABU_NUM_STARTS
+    search_params = {
+        'individual_size': individual_size,
+        'n_gen': n_gen,
+        'tabu_size': tabu_size,
+        'stagnation_limit': stagnation_limit,
+        'vehicle_capacity': vehicle_capacity,
+        'distance_weight': distance_weight,
+        'energy_weight': energy_weight
+    }
+    
+    if num_starts > 1:
+        result = _run_multi_start_search(instance, maps_handler, search_params, num_starts, max_workers, seed)
+    else:
+        if seed is not None:
+            random.seed(seed)
+        result = _run_single_search(instance, maps_handler, verbose=verbose, **search_params)
+    
+    if result is None:
+        return None
+    best_solution, best_cost = result
+    
+    # Raporlama için değerlendirici (bacak maliyetleri bu süreçte hesaplanır)
+    evaluator = TourCostEvaluator(
+        instance, maps_handler, vehicle_capacity, distance_weight, energy_weight
+    )
     
     # Split the best solution into routes
-    final_routes = split_into_routes(best_solution, [
-        (i, float(instance_data[f'C_{i}']['demand']))
-        for i in range(1, individual_size + 1)
-    ], vehicle_capacity)
+    final_routes = split_into_routes(
+        best_solution, instance, vehicle_capacity,
+        leg_cost=evaluator.leg_cost, max_routes=evaluator.max_routes
+    )
     
     if not final_routes:
         print("Failed to split the best solution into valid routes.")
@@ -375,7 +911,7 @@ def run_tabu_search(
 
     # Route quality analysis (remains the same)
     print("\nAnalyzing route quality...")
-    problems = analyze_route_quality(final_routes, instance_data, maps_handler)
+    problems = analyze_route_quality(final_routes, instance, maps_handler)
     
     print("\nRoute Quality Report:")
     print("-" * 80)
@@ -404,32 +940,22 @@ def run_tabu_search(
     # Recalculate pure distance and energy cost for reporting
     final_total_distance = 0
     final_total_energy_cost = 0
+    demands = instance.demand_list
     for route in final_routes:
-        prev_point = (
-            instance_data['depart']['coordinates']['x'],
-            instance_data['depart']['coordinates']['y']
-        )
+        prev_node = 0
         route_load = 0
         for customer_id in route:
-            route_load += float(instance_data[f'C_{customer_id}']['demand'])
-            curr_point = (
-                instance_data[f'C_{customer_id}']['coordinates']['x'],
-                instance_data[f'C_{customer_id}']['coordinates']['y']
-            )
-            final_total_distance += maps_handler.get_distance(prev_point, curr_point)
+            route_load += demands[customer_id]
+            final_total_distance += maps_handler.get_distance_by_index(prev_node, customer_id)
             # Use get_route_cost for final energy cost calculation as well
-            final_total_energy_cost += maps_handler.get_route_cost(
-                prev_point, curr_point, vehicle_mass=10000 + (route_load * 100)
+            final_total_energy_cost += maps_handler.get_route_cost_by_index(
+                prev_node, customer_id, vehicle_mass=10000 + (route_load * 100)
             )
-            prev_point = curr_point
+            prev_node = customer_id
             
-        depot_point = (
-            instance_data['depart']['coordinates']['x'],
-            instance_data['depart']['coordinates']['y']
-        )
-        final_total_distance += maps_handler.get_distance(prev_point, depot_point)
-        final_total_energy_cost += maps_handler.get_route_cost(
-            prev_point, depot_point, vehicle_mass=10000 + (route_load * 100)
+        final_total_distance += maps_handler.get_distance_by_index(prev_node, 0)
+        final_total_energy_cost += maps_handler.get_route_cost_by_index(
+            prev_node, 0, vehicle_mass=10000 + (route_load * 100)
         )
 
     print("\nFinal Optimized Solution (Based on Hybrid Cost):")
@@ -446,41 +972,33 @@ def evaluate_solution_with_real_distances(solution, instance, map_handler):
         return float('inf')
         
     total_cost = 0
-    previous_point = (
-        instance[DEPART][COORDINATES][X_COORD],
-        instance[DEPART][COORDINATES][Y_COORD]
-    )
+    previous_node = 0
     
     try:
+        instance = compile_instance(instance)
+        map_handler.index_instance(instance)
+        
         # Toplam yükü hesapla
-        total_load = sum(float(instance[f'C_{customer_id}'][DEMAND]) for customer_id in solution)
+        demands = instance.demand_list
+        total_load = sum(demands[customer_id] for customer_id in solution)
         vehicle_mass = 10000 + (total_load * 100)  # Boş araç + yük (kg)
         
         # Ardışık noktalar arası maliyetleri hesapla
         for customer_id in solution:
-            current_point = (
-                instance[f'C_{customer_id}'][COORDINATES][X_COORD],
-                instance[f'C_{customer_id}'][COORDINATES][Y_COORD]
-            )
-            
             # Mesafe ve yükseklik bazlı toplam maliyeti hesapla
-            segment_cost = map_handler.get_route_cost(previous_point, current_point, vehicle_mass)
+            segment_cost = map_handler.get_route_cost_by_index(previous_node, customer_id, vehicle_mass)
             if segment_cost == float('inf'):
-                print(f"Warning: Could not calculate cost between {previous_point} and {current_point}")
+                print(f"Warning: Could not calculate cost between nodes {previous_node} and {customer_id}")
                 return float('inf')
             
             total_cost += segment_cost
-            previous_point = current_point
+            previous_node = customer_id
         
         # Depoya dönüş
-        depot_point = (
-            instance[DEPART][COORDINATES][X_COORD],
-            instance[DEPART][COORDINATES][Y_COORD]
-        )
-        final_cost = map_handler.get_route_cost(previous_point, depot_point, vehicle_mass)
+        final_cost = map_handler.get_route_cost_by_index(previous_node, 0, vehicle_mass)
         
         if final_cost == float('inf'):
-            print(f"Warning: Could not calculate return cost to depot from {previous_point}")
+            print(f"Warning: Could not calculate return cost to depot from node {previous_node}")
             return float('inf')
         
         total_cost += final_cost
@@ -493,6 +1011,7 @@ def evaluate_solution_with_real_distances(solution, instance, map_handler):
 
 def evaluate_neighbors_parallel(neighbors, instance, map_handler, max_workers=4):
     """Komşu çözümleri paralel olarak değerlendir"""
+    instance = compile_instance(instance)
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         future_to_neighbor = {
             executor.submit(evaluate_solution_with_real_distances, n, instance, map_handler): n 
@@ -511,61 +1030,66 @@ def evaluate_neighbors_parallel(neighbors, instance, map_handler, max_workers=4)
     
     return valid_neighbors
 
-def generate_neighbors(solution, method="swap", num_neighbors=20):
-    """Optimize edilmiş komşu üretimi"""
-    neighbors = []
+def generate_moves(solution, method="swap", num_moves=20):
+    """
+    Komşuluk hamlelerini (op, i, j) tanımları olarak tembel üretir.
+    
+    Aday komşu listesi kurulmaz ve çözüm kopyalanmaz; hamleler komşuluk
+    kurallarına göre doğrudan örneklenir. Yalnızca seçilen hamle apply_move
+    ile mevcut çözüme uygulanır.
+    """
     size = len(solution)
+    seen = set()
+    attempts = 0
     
+    # Az sayıda geçerli hamle olan küçük çözümlerde sonsuz döngüye girme
+    while len(seen) < num_moves and attempts < num_moves * 10:
+        attempts += 1
+        move = _draw_move(size, method)
+        if move is None or move in seen:
+            continue
+        seen.add(move)
+        yield move
+
+def _draw_move(size, method):
+    """Komşuluk kurallarına uyan rastgele bir hamle çeker, geçersiz çekilişte None döner"""
     if method == "swap":
-        # Akıllı swap: Yakın noktaları değiştir
-        for i in range(size-1):
-            for j in range(i+1, min(i+5, size)):  # Yakın noktalar
-                neighbor = solution.copy()
-                neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                neighbors.append(neighbor)
-                
-            # Birkaç uzak nokta ile de değişim yap
-            for _ in range(2):
-                j = random.randint(min(i+5, size-1), size-1)
-                if j < size:  # Geçerlilik kontrolü
-                    neighbor = solution.copy()
-                    neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                    neighbors.append(neighbor)
-    
-    elif method == "2-opt":
-        # 2-opt: Çapraz yolları düzelt
-        for i in range(1, size-2):
-            for j in range(i+2, size):
-                if j - i <= 10:  # Çok uzun segmentlerden kaçın
-                    neighbor = solution.copy()
-                    neighbor[i:j] = reversed(neighbor[i:j])
-                    neighbors.append(neighbor)
-    
-    elif method == "insert":
-        # Akıllı insert: Noktaları mantıklı pozisyonlara taşı
-        for i in range(size):
-            # Yakın pozisyonlara taşı
-            for offset in [-2, -1, 1, 2]:
-                j = i + offset
-                if 0 <= j < size:
-                    neighbor = solution.copy()
-                    value = neighbor.pop(i)
-                    neighbor.insert(j, value)
-                    neighbors.append(neighbor)
-            
-            # Birkaç uzak pozisyona taşı
-            for _ in range(2):
-                j = random.randint(0, size-1)
-                if abs(i-j) > 3:
-                    neighbor = solution.copy()
-                    value = neighbor.pop(i)
-                    neighbor.insert(j, value)
-                    neighbors.append(neighbor)
-    
-    # Çözümleri filtrele ve en iyilerini seç
-    if len(neighbors) > num_neighbors:
-        return random.sample(neighbors, num_neighbors)
-    return neighbors
+        # Akıllı swap: Yakın noktaları (i+1..i+4) veya birkaç uzak noktayı değiştir
+        if size < 2:
+            return None
+        i = random.randrange(size-1)
+        k = random.randrange(6)
+        if k < 4:
+            j = i + 1 + k
+        else:
+            j = random.randint(min(i+5, size-1), size-1)
+        return ('swap', i, j) if j < size else None
+    
+    if method == "2-opt":
+        # 2-opt: Çapraz yolları düzelt, çok uzun segmentlerden kaçın
+        if size < 4:
+            return None
+        i = random.randint(1, size-3)
+        j = i + random.randint(2, 10)
+        return ('2-opt', i, j) if j < size else None
+    
+    if method == "insert":
+        # Akıllı insert: Yakın pozisyonlara veya birkaç uzak pozisyona taşı
+        if size < 2:
+            return None
+        i = random.randrange(size)
+        k = random.randrange(6)
+        if k < 4:
+            j = i + (-2, -1, 1, 2)[k]
+            return ('insert', i, j) if 0 <= j < size else None
+        j = random.randint(0, size-1)
+        return ('insert', i, j) if abs(i-j) > 3 else None
+    
+    return None
+
+def generate_neighbors(solution, method="swap", num_neighbors=20):
+    """Optimize edilmiş komşu üretimi"""
+    return [apply_move(solution, move) for move in generate_moves(solution, method, num_neighbors)]
 
 def analyze_route_quality(routes, instance_data, maps_handler):
     """Rota kalitesini analiz et"""
@@ -575,23 +1099,13 @@ def analyze_route_quality(routes, instance_data, maps_handler):
         'long_segments': []  # Uzun segmentler
     }
     
+    instance = compile_instance(instance_data)
+    distances = maps_handler.index_instance(instance)
+    
     for route_idx, route in enumerate(routes):
-        points = []
-        # Depo noktası
-        points.append((
-            instance_data['depart']['coordinates']['x'],
-            instance_data['depart']['coordinates']['y']
-        ))
-        
-        # Müşteri noktaları
-        for customer_id in route:
-            points.append((
-                instance_data[f'C_{customer_id}']['coordinates']['x'],
-                instance_data[f'C_{customer_id}']['coordinates']['y']
-            ))
-        
-        # Depoya dönüş
-        points.append(points[0])
+        # Depo -> müşteriler -> depo düğüm dizisi
+        nodes = [0] + list(route) + [0]
+        points = [instance.points[node] for node in nodes]
         
         # Çapraz yol kontrolü
         for i in range(len(points)-1):
@@ -605,11 +1119,12 @@ def analyze_route_quality(routes, instance_data, maps_handler):
         
         # Geri dönüş kontrolü
         for i in range(1, len(points)-1):
-            prev_dist = maps_handler.get_distance(points[i-1], points[i])
-            next_dist = maps_handler.get_distance(points[i], points[i+1])
-            direct_dist = maps_handler.get_distance(points[i-1], points[i+1])
+            prev_dist = float(distances[nodes[i-1], nodes[i]])
+            next_dist = float(distances[nodes[i], nodes[i+1]])
+            direct_dist = float(distances[nodes[i-1], nodes[i+1]])
             
-            if prev_dist + next_dist > direct_dist * 1.4:  # %40 sapma
+            # Aynı düğüme dönüşte (depo -> müşteri -> depo) doğrudan mesafe yoktur
+            if direct_dist > 0 and prev_dist + next_dist > direct_dist * 1.4:  # %40 sapma
                 problems['backtracking'].append({
                     'route': route_idx,
                     'point': i,
@@ -618,7 +1133,7 @@ def analyze_route_quality(routes, instance_data, maps_handler):
         
         # Uzun segment kontrolü
         for i in range(len(points)-1):
-            dist = maps_handler.get_distance(points[i], points[i+1])
+            dist = float(distances[nodes[i], nodes[i+1]])
             if dist > 20:  # 20km'den uzun segmentler
                 problems['long_segments'].append({
                     'route': route_idx,
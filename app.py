@@ -9,7 +9,8 @@ from functools import wraps
 from sqlalchemy import func
 import time
 import random
-from process_data import OSRMHandler
+from datetime import datetime, timedelta
+from process_data import OSRMHandler, get_shared_handler
 import traceback
 from sqlalchemy.orm import joinedload
 
@@ -17,6 +18,9 @@ app = Flask(__name__, static_folder='static')
 app.secret_key = os.urandom(24)  # Session için gerekli
 CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}})  # CORS ayarları güncellendi
 
+# Rota önbelleklerini istek gelmeden, süreç başında bir kez aç
+get_shared_handler()
+
 # Login gerektiren sayfalar için decorator
 def login_required(f):
     @wraps(f)
@@ -166,7 +170,7 @@ def optimize_route():
         # Problem instance verisi oluştur
         instance_data = {
             'instance_name': instance_name,
-            'max_vehicle_number': 10,  # Maksimum araç sayısı
+            'max_vehicle_number': None,  # Bu uç noktada filo bilinmiyor; rota sayısı sınırlanmaz
             'vehicle_capacity': vehicle_capacity,
             'depart': {
                 'coordinates': {
@@ -207,7 +211,8 @@ def optimize_route():
             tabu_size=20,
             stagnation_limit=50,
             verbose=True,
-            vehicle_capacity=vehicle_capacity
+            vehicle_capacity=vehicle_capacity,
+            maps_handler=map_handler
         )
         
         if not routes:
@@ -267,19 +272,15 @@ def optimize_route():
                 # Şoförü bu araca ata
                 available_vehicle.driver_id = available_driver.id
 
-            # Toplam mesafe hesapla
-            total_distance = 0
-            prev_point = (warehouse.latitude, warehouse.longitude)
-            
-            # Müşteriler arası mesafeleri hesapla
-            for customer_id in sub_route:
-                customer = selected_customers[customer_id - 1]
-                curr_point = (customer.latitude, customer.longitude)
-                total_distance += map_handler.get_distance(prev_point, curr_point)
-                prev_point = curr_point
-            
-            # Son noktadan depoya dönüş mesafesini ekle
-            total_distance += map_handler.get_distance(prev_point, (warehouse.latitude, warehouse.longitude))
+            # Depo -> müşteriler -> depo düğüm dizisi (0 = depo, i = C_i)
+            route_nodes = [0] + list(sub_route) + [0]
+            total_distance = sum(
+                map_handler.get_distance_by_index(i, j) for i, j in zip(route_nodes[:-1], route_nodes[1:])
+            )
+            # Her durağa varış süresi (dakika) süre matrisinden tek geçişte hesaplanır
+            arrival_offsets = map_handler.cumulative_durations(route_nodes)
+            # Zaman damgaları (created_at, actual_arrival_time) gibi UTC, saat dilimsiz
+            planning_time = datetime.utcnow()
 
             # Yeni rotayı oluştur
             route = Route(
@@ -289,7 +290,7 @@ def optimize_route():
                 driver_id=available_driver.id,
                 status=RouteStatus.PLANNED,
                 total_distance=total_distance,
-                total_duration=int(total_distance * 2),  # Yaklaşık süre: 30 km/saat
+                total_duration=int(round(arrival_offsets[-1])),
                 total_demand=0,  # Toplam talep aşağıda hesaplanacak
                 created_at=func.now(),
                 updated_at=func.now()
@@ -321,6 +322,7 @@ def optimize_route():
                     sequence_number=i,
                     demand=customer.desi,
                     status='pending',
+                    planned_arrival_time=planning_time + timedelta(minutes=float(arrival_offsets[i])),
                     created_at=func.now(),
                     updated_at=func.now()
                 )
@@ -365,7 +367,8 @@ def optimize_route():
             'success': True,
             'message': f'{len(routes_response)} rota başarıyla oluşturuldu.',
             'routes': routes_response,
-            'vehicle_capacity': vehicle_capacity
+            'vehicle_capacity': vehicle_capacity,
+            'degraded': map_handler.degraded  # mesafeler kısmen tahmini (OSRM yanıt vermedi)
         })
 
     except Exception as e:
@@ -4,27 +4,57 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 from process_data import *
 
-def generate_neighbors_optimized(solution, method="swap", num_neighbors=5):
-    """Optimize edilmiş komşu üretimi"""
-    neighbors = []
+def apply_move(solution, move, in_place=False):
+    """
+    Hamle tanımını çözüme uygular.
+    
+    Args:
+        solution: Çözüm dizisi (müşteri id'leri)
+        move: (op, i, j) - op: 'swap', '2-opt' (solution[i:j] ters çevrilir)
+              veya 'insert' (solution[i] çıkarılıp j pozisyonuna eklenir)
+        in_place: True ise çözüm kopyalanmadan değiştirilir
+        
+    Returns:
+        Hamle uygulanmış çözüm
+    """
+    op, i, j = move
+    neighbor = solution if in_place else solution.copy()
+    if op == 'swap':
+        neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
+    elif op == '2-opt':
+        neighbor[i:j] = reversed(neighbor[i:j])
+    elif op == 'insert':
+        value = neighbor.pop(i)
+        neighbor.insert(j, value)
+    else:
+        raise ValueError(f"Unknown move type: {op}")
+    return neighbor
+
+def generate_moves_optimized(solution, method="swap", num_moves=5):
+    """Optimize edilmiş komşuluk hamlelerini (op, i, j) tembel üretir"""
     size = len(solution)
+    produced = 0
     
     if method == "swap":
         # Sadece yakın komşular
         for i in range(size-1):
             for j in range(i+1, min(i+3, size)):
-                neighbor = solution.copy()
-                neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                neighbors.append(neighbor)
+                if produced >= num_moves:
+                    return
+                produced += 1
+                yield ('swap', i, j)
     
     elif method == "2-opt":
         for i in range(1, size-2):
             for j in range(i+1, min(i+4, size-1)):
-                neighbor = solution.copy()
-                neighbor[i:j] = reversed(neighbor[i:j])
-                neighbors.append(neighbor)
-    
-    return neighbors[:num_neighbors] if len(neighbors) > num_neighbors else neighbors
+                if produced >= num_moves:
+                    return
+                produced += 1
+                yield ('2-opt', i, j)
+
+def generate_neighbors_optimized(solution, method="swap", num_neighbors=5):
+    """Optimize edilmiş komşu üretimi"""
+    return [apply_move(solution, move) for move in generate_moves_optimized(solution, method, num_neighbors)]
 
 def evaluate_solution_with_real_distances(solution, instance, map_handler):
     """Çözümün gerçek mesafesini hesapla"""
@@ -32,31 +62,22 @@ def evaluate_solution_with_real_distances(solution, instance, map_handler):
         return float('inf')
         
     total_distance = 0
-    previous_point = (
-        instance[DEPART][COORDINATES][X_COORD],
-        instance[DEPART][COORDINATES][Y_COORD]
-    )
+    previous_node = 0
     
     try:
+        # Düğüm id'leri: 0 = depo, i = C_i
+        distances = map_handler.index_instance(instance)
+        
         for customer_id in solution:
-            current_point = (
-                instance[f'C_{customer_id}'][COORDINATES][X_COORD],
-                instance[f'C_{customer_id}'][COORDINATES][Y_COORD]
-            )
-            
-            leg_distance = map_handler.get_distance(previous_point, current_point)
+            leg_distance = float(distances[previous_node, customer_id])
             if leg_distance == float('inf'):
                 return float('inf')
             
             total_distance += leg_distance
-            previous_point = current_point
+            previous_node = customer_id
         
         # Depoya dönüş
-        depot_point = (
-            instance[DEPART][COORDINATES][X_COORD],
-            instance[DEPART][COORDINATES][Y_COORD]
-        )
-        final_leg = map_handler.get_distance(previous_point, depot_point)
+        final_leg = float(distances[previous_node, 0])
         
         if final_leg == float('inf'):
             return float('inf')
@@ -1,10 +1,24 @@
 import os
 import io
-import pickle
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import traceback
 import requests
-import time
+import threading
+from bisect import bisect_right
 import numpy as np
+from config import Config
+from utils.cache_store import get_cache_store
+from utils.dem_elevation import get_dem_source
+from utils.geo import (
+    CACHE_KEY_VERSION, canonical_point, canonicalize_key, estimate_circuity, haversine_matrix, pair_key,
+    segment_key
+)
+from utils.matrix_store import fingerprint, get_matrix_store
+from utils.osrm_table import fetch_distance_table
+from utils.http_client import get_http_client
+from utils.lru_cache import bounded_cache
+from utils.polyline import decode as decode_polyline, encode_lonlat
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -18,132 +32,155 @@ VEHICLE_CAPACITY = 'vehicle_capacity'
 DEPART = 'depart' 
 DEMAND = 'demand' 
 DISTANCE_MATRIX = 'distance_matrix' 
+MAX_ROUTE_WAYPOINTS = 100  # tek /route isteğindeki en fazla nokta
+FALLBACK_SPEED_KMH = 30  # süresi bilinmeyen bacaklar için varsayılan hız
+LOWER_BOUND_SLACK_KM = 0.001  # OSRM ile yerel haversine arasındaki yuvarlama farkları için pay
+MIN_ENERGY_COST_PER_KM = 0.1  # calculate_energy_cost'un km başına alabileceği en küçük değer
+
+
+# Süreç genelindeki önbellekler ve paylaşılan handler (ilk kullanımda bir kez açılır)
+_shared_lock = threading.Lock()
+_shared_caches = {}
+_shared_handler = None
+
+
+def _get_shared_caches():
+    with _shared_lock:
+        if not _shared_caches:
+            store = get_cache_store(Config.ROUTING_CACHE_DIR)
+            # Ham float anahtarlı eski girdiler kanonik anahtarlara bir kez taşınır
+            for name in ('osrm_distance_matrix', 'elevation_cache'):
+                store.rekey(name, canonicalize_key, CACHE_KEY_VERSION)
+            _shared_caches.update(
+                store=store,
+                distance_matrix=store.table('osrm_distance_matrix'),
+                elevation_cache=store.table('elevation_cache'),
+                # Noktanın OSRM tarafından yola oturtulduğu mesafe (km); alt sınır payı
+                snap_distance=store.table('snap_distance'),
+                # Segment geometrileri (kodlanmış polyline); yükseklik örnekleme, çok duraklı
+                # rotalar ve harita aynı tablodan okur, her bacak için OSRM'e bir kez gidilir
+                route_cache=store.table('route_cache'),
+                # Yalnızca bellekte tutulanlar; sınırlar Config'den (ENERGY_CACHE_*)
+                energy_cache=bounded_cache('energy_cache'),
+                matrix_store=get_matrix_store(Config.ROUTING_CACHE_DIR)
+            )
+        return _shared_caches
+
+
+def get_shared_handler():
+    """
+    Süreç genelinde paylaşılan OSRMHandler.
+    
+    Rota detayı, mesafe ön hesaplama gibi instance'a bağlı olmayan çağrılar
+    içindir. Çözücü instance'a özgü indeks durumu tuttuğu için istek başına
+    OSRMHandler() oluşturulmalıdır; önbellekler yine de paylaşılır.
+    """
+    global _shared_handler
+    if _shared_handler is None:
+        handler = OSRMHandler()
+        with _shared_lock:
+            if _shared_handler is None:
+                _shared_handler = handler
+    return _shared_handler
 
 
 class OSRMHandler:
-    def __init__(self):
-        self.base_url = "http://router.project-osrm.org"
-        self.elevation_api_url = "https://api.open-elevation.com/api/v1/lookup"
+    def __init__(self, base_url=None, elevation_api_url=None):
+        self.base_url = (base_url or Config.OSRM_BASE_URL).rstrip('/')
+        self.elevation_api_url = elevation_api_url or Config.ELEVATION_API_URL
         self.distance_matrix = {}
         self.elevation_cache = {}
         self.timeout = 60
         self.max_retries = 3
+        # Düğüm id'si ile indekslenen yoğun mesafe matrisi (0 = depo, i = C_i)
+        self.node_points = []
+        self.node_fingerprint = None  # node_points'in matrix_store parmak izi
+        self.distance_array = None
+        self.distance_array_path = None  # matris .npy dosyasından eşlendiyse yolu
+        self.duration_array = None  # aynı indeksli süre matrisi (dakika, nan = bilinmiyor)
+        self._lower_bound_array = None
+        self._lower_bound_key = None
+        # Bacak başına enerji katsayıları (build_energy_coefficients), düğüm kümesinin parmak izine bağlı
+        self.energy_matrix = None
+        self._energy_matrix_key = None
+        # OSRM yanıt vermediğinde mesafeler kuş uçuşu x dolambaç katsayısı ile tahmin edilir
+        self.circuity_factor = Config.CIRCUITY_FACTOR
+        self.degraded = False
+        # Profiller toplu hazırlandıktan sonra arama sırasında yükseklik için HTTP isteği yapılmaz
+        self.elevation_offline = False
+        # Profili olmayan segmentlerin yaklaşık katsayıları (kalıcı önbelleğe yazılmaz)
+        self._approximate_energy = {}
+        self._indexed_instance = None
         self._initialize_cache()
     
+    @property
+    def http_client(self):
+        # Handler fork ile işçiye geçtiğinde o sürecin kendi istemcisi kullanılır
+        return get_http_client()
+    
     def _initialize_cache(self):
-        cache_dir = os.path.join(BASE_DIR, 'cache')
-        os.makedirs(cache_dir, exist_ok=True)
-        cache_file = os.path.join(cache_dir, 'osrm_distance_matrix.pkl')
-        elevation_cache_file = os.path.join(cache_dir, 'elevation_cache.pkl')
-        
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'rb') as f:
-                    self.distance_matrix = pickle.load(f)
-                print("Loaded distance matrix from cache")
-            except Exception as e:
-                print(f"Error loading cache: {e}")
-                self.distance_matrix = {}
-        
-        if os.path.exists(elevation_cache_file):
-            try:
-                with open(elevation_cache_file, 'rb') as f:
-                    self.elevation_cache = pickle.load(f)
-                print("Loaded elevation cache")
-            except Exception as e:
-                print(f"Error loading elevation cache: {e}")
-                self.elevation_cache = {}
+        # Önbellekler süreç genelinde paylaşılır; her handler aynı nesneleri kullanır
+        caches = _get_shared_caches()
+        self.cache_store = caches['store']
+        self.distance_matrix = caches['distance_matrix']
+        self.elevation_cache = caches['elevation_cache']
+        self.snap_distance = caches['snap_distance']
+        self.energy_cache = caches['energy_cache']
+        self.route_cache = caches['route_cache']
+        self.matrix_store = caches['matrix_store']
     
     def save_cache(self):
-        cache_dir = os.path.join(BASE_DIR, 'cache')
-        cache_file = os.path.join(cache_dir, 'osrm_distance_matrix.pkl')
-        elevation_cache_file = os.path.join(cache_dir, 'elevation_cache.pkl')
-        
         try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump(self.distance_matrix, f)
-            with open(elevation_cache_file, 'wb') as f:
-                pickle.dump(self.elevation_cache, f)
-            print("Saved caches")
+            written = (
+                self.distance_matrix.flush()
+                + self.elevation_cache.flush()
+                + self.route_cache.flush()
+                + self.snap_distance.flush()
+            )
+            print(f"Saved caches ({written} new entries)")
         except Exception as e:
             print(f"Error saving cache: {e}")
 
     def get_elevation_profile(self, start_point, end_point, distance_interval=30):
-        key = (tuple(start_point), tuple(end_point))
-        if key in self.elevation_cache:
-            return self.elevation_cache[key]
+        key = pair_key(start_point, end_point)
+        cached_profile = self.elevation_cache.get(key)
+        if cached_profile is not None:
+            return cached_profile
 
         try:
-            # OSRM route API'sini kullanarak sürüş için rota koordinatlarını alıyoruz
-            url = f"{self.base_url}/route/v1/driving/{start_point[1]},{start_point[0]};{end_point[1]},{end_point[0]}"
-            params = {
-                "overview": "full",
-                "geometries": "geojson",
-                "steps": "true"
-            }
-            
-            response = requests.get(url, params=params, timeout=self.timeout)
-            data = response.json()
-            
-            if data.get("code") != "Ok" or not data.get("routes"):
-                # OSRM başarısız olursa hata fırlat
-                error_msg = f"OSRM API başarısız oldu: {data.get('message', 'Bilinmeyen hata')}"
+            # Bacak geometrisi paylaşılan route_cache'ten; yoksa get_route_details bir kez
+            # ister ve harita/çok duraklı rota çağrıları için aynı kayda yazar
+            route = self.get_route_details(start_point, end_point)
+            if route is None:
+                error_msg = "OSRM API başarısız oldu: rota alınamadı"
                 print(error_msg)
                 raise Exception(error_msg)
-            else:
-                # OSRM'den gelen rota koordinatlarını kullan
-                route = data["routes"][0]
-                # OSRM koordinatları [lon, lat] formatında döndürür, [lat, lon] kullanıyoruz
-                route_coords = [(coord[1], coord[0]) for coord in route["geometry"]["coordinates"]]
-                total_distance = route["distance"]
-                duration = route["duration"]
-                
-                if total_distance < distance_interval:
-                    points = [route_coords[0], route_coords[-1]]
-                else:
-                    # Rota üzerinde belirli aralıklarla örnekleme yap
-                    num_samples = max(2, int(total_distance / distance_interval) + 1)
-                    # Eşit aralıklı indeksler oluştur
-                    indices = np.linspace(0, len(route_coords) - 1, num_samples).astype(int)
-                    points = [route_coords[i] for i in indices]
             
-            # Yükseklik verilerini al
-            locations = [{'latitude': lat, 'longitude': lon} for lat, lon in points]
-            response = requests.post(
-                self.elevation_api_url,
-                json={'locations': locations},
-                timeout=self.timeout
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                elevations = [result['elevation'] for result in data['results']]
-                
-                # Yükseklik profilini hesapla
-                total_ascent = 0
-                total_descent = 0
-                
-                # Her noktanın bir sonraki noktayla arasındaki farkı hesapla
-                for i in range(len(elevations) - 1):
-                    diff = elevations[i+1] - elevations[i]
-                    if diff > 0:
-                        total_ascent += diff
-                    else:
-                        total_descent += abs(diff)
-
-                profile = {
-                    'elevations': elevations,
-                    'total_ascent': total_ascent,
-                    'total_descent': total_descent,
-                    'max_elevation': max(elevations),
-                    'min_elevation': min(elevations),
-                    'avg_elevation': sum(elevations) / len(elevations),
-                    'distance_interval': distance_interval,
-                    'num_samples': len(points),
-                    'total_distance': total_distance,
-                    'duration': duration
-                }
+            route_coords = decode_polyline(route["polyline"])
+            total_distance = route["distance"] * 1000  # km -> metre
+            duration = route["duration"] * 60          # dakika -> saniye
+            
+            points = _sample_route_points(route_coords, total_distance, distance_interval)
+            
+            # Yükseklik verilerini al: yerel DEM döşemeleri (varsa ve kapsıyorsa) ya da API
+            elevations = None
+            dem = get_dem_source()
+            if dem is not None:
+                values = dem.elevations(points)
+                if not np.isnan(values).any():
+                    elevations = values.tolist()
+            if elevations is None:
+                locations = [{'latitude': lat, 'longitude': lon} for lat, lon in points]
+                response = self.http_client.post(
+                    self.elevation_api_url,
+                    endpoint='elevation',
+                    json={'locations': locations}
+                )
+                if response.status_code == 200:
+                    elevations = [result['elevation'] for result in response.json()['results']]
 
+            if elevations is not None:
+                profile = _elevation_profile(elevations, distance_interval, total_distance, duration)
                 self.elevation_cache[key] = profile
                 return profile
 
@@ -151,126 +188,88 @@ class OSRMHandler:
             print(f'Error getting elevation data: {e}')
             return None
 
-    def calculate_energy_cost(self, route_segment, vehicle_mass=10000):
-        import math
-        import numpy as np
-        
+    def calculate_energy_cost(self, route_segment, vehicle_mass=10000, distance=None):
         start_point = route_segment[0]
         end_point = route_segment[1]
         
         #mesafeyi kontrolü - çok kısa mesafeler için hesaplama yok
-        distance = self.get_distance(start_point, end_point)
+        if distance is None:
+            distance = self.get_distance(start_point, end_point)
         if distance < 0.1:  
             return distance * 0.1 
         
-        # Rota segmenti için önbellekte anahtar oluştur
-        cache_key = (f"energy_{tuple(start_point)}_{tuple(end_point)}_{vehicle_mass}")
-        if hasattr(self, 'energy_cache') and cache_key in self.energy_cache:
-            return self.energy_cache[cache_key]
-        
-        # Enerji önbelleği yoksa oluştur
-        if not hasattr(self, 'energy_cache'):
-            self.energy_cache = {}
-        
-        # Yükseklik profilini al
-        elevation_profile = self.get_elevation_profile(start_point, end_point)
-        if not elevation_profile:
-            return distance * 0.15  # Yükseklik verisi yoksa basit bir yaklaşım kullan
-        
-        # Segmentlere bölünmüş yükseklik profilini kullan
-        elevations = elevation_profile['elevations']
-        
-        # Temel araç ağırlığı ve yük hesaplaması
-        base_vehicle_mass = 2000  # temel araç ağırlığı (kg)
-        payload = max(0, vehicle_mass - base_vehicle_mass)  # kg cinsinden yük
-        route_load = payload / 10  # desiye çevir (yaklaşık olarak)
+        # Katsayılar yükten bağımsızdır; segment başına tek önbellek girdisi yeterli
+        cache_key = segment_key('energy', start_point, end_point)
+        # Sınırlı önbellekte girdi kontrol ile okuma arasında atılabilir, tek get yeterli
+        coefficients = self.energy_cache.get(cache_key)
+        if coefficients is None or coefficients.distance != distance:
+            # Degraded modda ya da profiller toplu hazırlandıysa servis beklenmez
+            if self.degraded or self.elevation_offline:
+                return self._offline_energy_coefficients(start_point, end_point, distance).cost(vehicle_mass)
+            
+            # Yükseklik profilini al
+            elevation_profile = self.get_elevation_profile(start_point, end_point)
+            if not elevation_profile:
+                return distance * 0.15  # Yükseklik verisi yoksa basit bir yaklaşım kullan
+            
+            coefficients = energy_coefficients([elevation_profile['elevations']], [distance])[0]
+            self.energy_cache[cache_key] = coefficients
         
-        # Yük faktörü - Yük arttıkça enerji tüketimi artar
-        load_factor = 1.0 + 0.4 * (route_load / 500) ** 1.15
+        return coefficients.cost(vehicle_mass)
+
+    def _offline_energy_coefficients(self, start_point, end_point, distance):
+        """
+        Ağ isteği yapmadan segment katsayıları.
         
-        # Her segment için enerji maliyetini hesapla
-        total_energy_cost = 0
+        Önbellekte profil varsa ondan; yoksa yerel DEM'den, o da yoksa düz
+        profilden (eğim terimi yok, yük faktörü yine uygulanır) çıkarılır.
+        Yaklaşık katsayılar handler'da tutulur; profil hazırlığı yenilenene
+        kadar aynı segment için tekrar önbellek/DEM okuması yapılmaz.
+        """
+        cache_key = segment_key('energy', start_point, end_point)
+        coefficients = self._approximate_energy.get(cache_key)
+        if coefficients is not None and coefficients.distance == distance:
+            return coefficients
         
-        # Toplam mesafeyi segmentlere böl
-        segment_distance = distance * 1000 / (len(elevations) - 1)  # metre cinsinden her segment için mesafe
+        elevation_profile = self.elevation_cache.get(pair_key(start_point, end_point))
+        if elevation_profile:
+            coefficients = energy_coefficients([elevation_profile['elevations']], [distance])[0]
+            self.energy_cache[cache_key] = coefficients
+            return coefficients
         
-        for i in range(len(elevations) - 1):
-            # Segment yükseklik farkı (metre)
-            elevation_diff = elevations[i+1] - elevations[i]
-            
-            # Segment eğimi (yüzde)
-            gradient_percent = (elevation_diff / segment_distance) * 100
-            
-            # Segment için enerji faktörü hesapla
-            segment_energy_factor = 0
-            
-            # Eğim faktörü
-            if gradient_percent > 0:  # Yokuş yukarı
-                
-                # Üstel artış modeli (eğim arttıkça enerji tüketimi üstel olarak artıyor)
-                base_gradient_effect = 0.09  # %1 eğim başına yaklaşık %9 artış 
-                exp_factor = 1.3  # Üstel artışı kontrol eder 
-                
-                # Yük her %10 arttığında, yokuş yukarı yakıt tüketimi yaklaşık %8-12 daha fazla artıyor
-                yuk_etkisi = 1.0 + (route_load / 500) * 0.3  # Yük etkisi faktörü
-                
-                # Üstel artış formülü
-                gradient_etkisi = (gradient_percent ** exp_factor) * base_gradient_effect * yuk_etkisi
-                
-                # Eğim faktörü, artışı temsil eder
-                gradient_factor = 1.0 + gradient_etkisi
-                
-                # Gerçekçi bir üst sınır
-                gradient_factor = min(gradient_factor, 5.0)  # Maksimum 5 kat artış
-                
-                segment_energy_factor = gradient_factor
-            else:  # Yokuş aşağı veya düz
-
-                optimum_egim = 3.0  
-                max_egim = 8.0  # Bu değerden sonra verimlilik azalır
-                
+        elevation_profile = self._offline_elevation_profile(start_point, end_point, distance)
+        elevations = elevation_profile['elevations'] if elevation_profile else [0.0, 0.0]
+        coefficients = energy_coefficients([elevations], [distance])[0]
+        # Gerçek profil sonra gelebilir; kalıcı önbelleğe yazılmaz
+        self._approximate_energy[cache_key] = coefficients
+        return coefficients
 
-                max_benefit = 0.5  # Maksimum %50 tasarruf 
-                min_benefit = 0.1  # Çok dik inişlerde minimum tasarruf
-                
-                abs_gradient = abs(gradient_percent)
-                
-                # Yükün kazancı azaltıcı etkisi 
-                yuk_tasarruf_azalma = (route_load / 500) * 0.1
-                max_benefit = max(0.2, max_benefit - yuk_tasarruf_azalma)  # Yük arttıkça maksimum tasarruf azalır
-                
-                if abs_gradient < 0.5:  # Neredeyse düz
-                    gradient_factor = 1.0
-                elif abs_gradient <= optimum_egim:
-                    # Optimum eğime kadar kazanç artar
-                    benefit_ratio = (abs_gradient / optimum_egim) * max_benefit
-                    gradient_factor = 1.0 - benefit_ratio
-                else:
-                    # Optimum eğimden sonra kazanç azalır
-                    if abs_gradient >= max_egim:
-                        # Çok dik inişlerde minimum kazanç
-                        gradient_factor = 1.0 - min_benefit
-                    else:
-                        # Optimum ile max arasında kademeli azalma
-                        progress = (abs_gradient - optimum_egim) / (max_egim - optimum_egim)
-                        benefit = max_benefit - ((max_benefit - min_benefit) * progress)
-                        gradient_factor = 1.0 - benefit
-                
-                segment_energy_factor = gradient_factor
-            
-            # Segment için toplam enerji faktörü (yük ve eğim etkisi)
-            total_factor = segment_energy_factor * load_factor
-            
-            # Segment için enerji maliyeti (km başına)
-            segment_energy_cost = (segment_distance / 1000) * total_factor
-            
-            # Toplam enerji maliyetine ekle
-            total_energy_cost += segment_energy_cost
+    def _offline_elevation_profile(self, start_point, end_point, distance, distance_interval=30):
+        """
+        Ağ isteği yapmadan, yerel DEM döşemelerinden yaklaşık yükseklik profili.
         
-        # Sonucu önbelleğe al
-        self.energy_cache[cache_key] = total_energy_cost
-        
-        return total_energy_cost
+        Geometri route_cache'te varsa onun üzerinden, yoksa uçlar arasındaki
+        düz çizgi üzerinden örneklenir. DEM yoksa ya da noktaları kapsamıyorsa None.
+        """
+        dem = get_dem_source()
+        if dem is None:
+            return None
+        route = self.route_cache.get(_route_cache_key(start_point, end_point))
+        if route is not None:
+            route_coords = decode_polyline(route["polyline"])
+        else:
+            route_coords = [tuple(start_point), tuple(end_point)]
+        total_distance = distance * 1000
+        num_samples = max(2, int(total_distance / distance_interval) + 1)
+        if len(route_coords) == 2:
+            # Düz çizgide ara noktalar doğrusal olarak üretilir
+            coords = np.linspace(route_coords[0], route_coords[1], num_samples)
+        else:
+            coords = _sample_route_points(route_coords, total_distance, distance_interval)
+        values = dem.elevations(coords)
+        if np.isnan(values).any():
+            return None
+        return _elevation_profile(values.tolist(), distance_interval, total_distance, 0)
 
     def calculate_route_segment_cost(self, origin, dest, vehicle_mass=10000):
         # Mesafe maliyeti
@@ -287,8 +286,8 @@ class OSRMHandler:
         return total_cost
 
     def get_distance(self, origin, dest):
-        key = (tuple(origin), tuple(dest))
-        reverse_key = (tuple(dest), tuple(origin))
+        key = pair_key(origin, dest)
+        reverse_key = pair_key(dest, origin)
         
         if key in self.distance_matrix:
             return self.distance_matrix[key]
@@ -296,89 +295,553 @@ class OSRMHandler:
             return self.distance_matrix[reverse_key]
         
         print(f"Warning: Distance not found in cache for {key}")
+        if Config.ALLOW_DEGRADED_ROUTING:
+            self._mark_degraded(1, self.circuity_factor)
+            return float(haversine_matrix([origin, dest], self.circuity_factor)[0, 1])
         return float('inf')
     
+    def get_distance_by_index(self, i, j):
+        """Düğüm id'leri (0 = depo, i = C_i) ile mesafeyi döndürür"""
+        return float(self.distance_array[i, j])
+
+    def get_lower_bound_matrix(self):
+        """
+        İndekslenmiş düğümler arasındaki yol mesafesinin alt sınırı (km).
+        
+        OSRM mesafesi yola oturtulmuş uçlar arasındadır; bu yüzden kuş uçuşu
+        mesafeden her iki ucun table yanıtındaki oturtma mesafesi düşülür.
+        Yerelde, tek numpy geçişinde hesaplanır ve düğüm kümesi değişene kadar
+        saklanır. Herhangi bir düğümün oturtma mesafesi bilinmiyorsa sınır
+        güvenilir olmadığından None döner (hamle elemesi yapılmaz).
+        """
+        if self._lower_bound_key != self.node_fingerprint:
+            snaps = [self.snap_distance.get(canonical_point(point)) for point in self.node_points]
+            if any(snap is None for snap in snaps):
+                print("Snap distances unknown for some nodes, move pruning disabled")
+                self._lower_bound_array = None
+            else:
+                allowance = np.asarray(snaps, dtype=np.float64)
+                straight = haversine_matrix(self.node_points)
+                self._lower_bound_array = np.maximum(
+                    straight - allowance[:, None] - allowance[None, :] - LOWER_BOUND_SLACK_KM, 0.0
+                )
+            self._lower_bound_key = self.node_fingerprint
+        return self._lower_bound_array
+
+    def _store_snap_distances(self, points, snaps):
+        """Table yanıtlarındaki oturtma mesafelerini nokta başına saklar (bilinmeyenler atlanır)"""
+        for point, snap in zip(points, snaps.tolist()):
+            if not np.isnan(snap):
+                key = canonical_point(point)
+                previous = self.snap_distance.get(key)
+                if previous is None or snap > previous:
+                    self.snap_distance[key] = snap
+
+    def _estimate_missing_distances(self, points, distances):
+        """
+        Bilinmeyen (nan/inf) mesafeleri kuş uçuşu x dolambaç katsayısı ile doldurur.
+        
+        Katsayı instance'ın bilinen çiftlerinden ölçülür (şehre özgü), yeterli
+        çift yoksa Config.CIRCUITY_FACTOR kullanılır.
+        
+        Returns:
+            (doldurulmuş mesafeler km, tahmin edilen çift sayısı, katsayı)
+        """
+        straight = haversine_matrix(points)
+        known = np.where(np.isinf(distances), np.nan, np.asarray(distances, dtype=np.float64))
+        np.fill_diagonal(known, np.nan)
+        circuity = estimate_circuity(known, straight, self.circuity_factor)
+        missing = np.isnan(known)
+        np.fill_diagonal(missing, False)
+        estimated = np.where(missing, straight * circuity, known)
+        np.fill_diagonal(estimated, 0.0)
+        return estimated, int(missing.sum()), circuity
+
+    def _mark_degraded(self, estimated_count, circuity):
+        if not self.degraded:
+            print(f"Warning: routing service unavailable, continuing in degraded mode "
+                  f"({estimated_count} distance(s) estimated with circuity {circuity:.2f})")
+        self.degraded = True
+
+    def get_distance_matrix(self):
+        """Yoğun mesafe matrisinin salt okunur görünümünü döndürür"""
+        if self.distance_array is None:
+            return None
+        view = self.distance_array.view()
+        view.flags.writeable = False
+        return view
+
+    def get_duration_by_index(self, i, j):
+        """Düğüm id'leri ile seyahat süresini (dakika) döndürür, bilinmiyorsa nan"""
+        if self.duration_array is None:
+            return float('nan')
+        return float(self.duration_array[i, j])
+
+    def cumulative_durations(self, nodes):
+        """
+        Düğüm dizisi boyunca her noktaya varış süresini (dakika) döndürür.
+        
+        Tüm bacaklar tek numpy indekslemesiyle okunur; süresi bilinmeyen
+        bacaklar mesafe / FALLBACK_SPEED_KMH ile tahmin edilir.
+        
+        Returns:
+            len(nodes) uzunluğunda dizi; ilk eleman 0, son eleman toplam süre
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        origins, dests = nodes[:-1], nodes[1:]
+        distances = np.asarray(self.distance_array[origins, dests], dtype=np.float64)
+        if self.duration_array is not None:
+            legs = np.asarray(self.duration_array[origins, dests], dtype=np.float64)
+        else:
+            legs = np.full(len(origins), np.nan)
+        estimated = distances / FALLBACK_SPEED_KMH * 60
+        legs = np.where(np.isfinite(legs), legs, estimated)
+        return np.concatenate(([0.0], np.cumsum(legs)))
+
+    def build_distance_array(self, points, distances=None, durations=None):
+        """
+        Düğüm id'si ile indekslenen float32 mesafe matrisi oluşturur.
+        
+        distances (km, nan = bilinmiyor) verilirse önbellek yerine o kullanılır;
+        durations (dakika) verilirse aynı indeksli süre matrisi de kurulur.
+        """
+        n = len(points)
+        keys = [tuple(p) for p in points]
+        if distances is not None:
+            matrix = np.where(np.isnan(distances), np.inf, distances).astype(np.float32)
+            np.fill_diagonal(matrix, 0.0)
+        else:
+            matrix = np.full((n, n), np.inf, dtype=np.float32)
+            np.fill_diagonal(matrix, 0.0)
+            for i, origin in enumerate(keys):
+                for j, dest in enumerate(keys):
+                    if i == j:
+                        continue
+                    distance = self.distance_matrix.get(pair_key(origin, dest))
+                    if distance is None:
+                        distance = self.distance_matrix.get(pair_key(dest, origin))
+                    if distance is not None:
+                        matrix[i, j] = distance
+
+        self.node_points = keys
+        self.node_fingerprint = fingerprint(keys)
+        self.distance_array = matrix
+        self.distance_array_path = None
+        self.duration_array = None
+        if durations is not None:
+            self.duration_array = durations.astype(np.float32)
+            np.fill_diagonal(self.duration_array, 0.0)
+        return matrix
+
+    def map_distance_array(self, points, matrix=None, durations=None):
+        """
+        Koordinat kümesinin matrisini paylaşılan .npy dosyasından eşler.
+        
+        matrix (ve varsa durations) verilirse önce dosyaya yazılır. Aynı kümeyi
+        açan tüm süreçler aynı fiziksel sayfaları kullanır. Dosya yoksa None döner.
+        """
+        key = fingerprint(points)
+        try:
+            if matrix is None:
+                mapped = self.matrix_store.load(key)
+            else:
+                mapped = self.matrix_store.save(key, matrix, points, durations)
+        except Exception as e:
+            print(f"Error storing distance matrix: {e}")
+            return None
+        if mapped is None or mapped.shape != (len(points), len(points)):
+            return None
+        mapped_durations = self.matrix_store.load_durations(key)
+        if mapped_durations is not None and mapped_durations.shape != mapped.shape:
+            mapped_durations = None
+        self.node_points = [tuple(p) for p in points]
+        self.node_fingerprint = key
+        self.distance_array = mapped
+        self.distance_array_path = self.matrix_store.path(key)
+        self.duration_array = mapped_durations
+        return mapped
+
+    def attach_distance_array(self, distance_array, instance):
+        """Hazır (ör. paylaşımlı bellekteki) mesafe matrisini instance için kullanır"""
+        instance = compile_instance(instance)
+        self.node_points = list(instance.points)
+        self.node_fingerprint = fingerprint(self.node_points)
+        self.distance_array = distance_array
+        self.duration_array = None
+        self._indexed_instance = instance
+
+    def index_instance(self, instance):
+        """
+        Instance için mesafe matrisini hazırlar.
+        
+        Aynı düğüm kümesi zaten indekslenmişse (ör. precompute_distances'ın
+        sözlüğü çözücüde derlendiğinde) matris, süreler ve enerji katsayıları
+        aynen kullanılır; karşılaştırma nesne kimliğiyle değil, instance
+        kaynağı ya da koordinat parmak iziyle yapılır.
+        """
+        if self.distance_array is not None and self._indexed_instance is not None:
+            indexed = self._indexed_instance
+            if instance is indexed or getattr(instance, 'source', None) is indexed \
+                    or getattr(indexed, 'source', None) is instance:
+                return self.distance_array
+        if isinstance(instance, CompiledInstance):
+            points = instance.points
+        else:
+            points = _collect_instance_points(instance)
+        if self.distance_array is None or fingerprint(points) != self.node_fingerprint:
+            if self.map_distance_array(points) is None:
+                matrix = self.build_distance_array(points)
+                # Eksiksiz matrisler diğer işçilerle paylaşılmak üzere diske yazılır
+                if np.isfinite(matrix).all():
+                    self.map_distance_array(points, matrix)
+                elif Config.ALLOW_DEGRADED_ROUTING:
+                    # Tahmini matris diske yazılmaz, servis dönünce gerçek değerler çekilir
+                    estimated, count, circuity = self._estimate_missing_distances(points, matrix)
+                    self._mark_degraded(count, circuity)
+                    self.build_distance_array(points, estimated)
+        self._indexed_instance = instance
+        return self.distance_array
+
     def get_route_cost(self, origin, dest, vehicle_mass=10000):
         return self.calculate_route_segment_cost(origin, dest, vehicle_mass)
+
+    def get_route_cost_by_index(self, i, j, vehicle_mass=10000):
+        distance = float(self.distance_array[i, j])
+        if distance == float('inf'):
+            return float('inf')
+        
+        # Katsayı matrisi bu düğüm kümesi için kurulduysa önbellek araması yapılmaz
+        if self.energy_matrix is not None and self._energy_matrix_key == self.node_fingerprint:
+            coefficients = self.energy_matrix[i][j]
+            if coefficients is not None:
+                return distance + coefficients.cost(vehicle_mass)
+        
+        fuel_consumption = self.calculate_energy_cost(
+            [self.node_points[i], self.node_points[j]], vehicle_mass, distance=distance
+        )
+        if fuel_consumption == float('inf'):
+            return float('inf')
+        
+        return distance + fuel_consumption
     
+    def build_energy_coefficients(self):
+        """
+        İndekslenmiş instance'ın bacakları için EnergyCoefficients matrisi.
+        
+        Profili önbellekte olan bacakların eksik katsayıları tek
+        energy_coefficients çağrısıyla çıkarılır; ağ isteği yapılmaz (profiller
+        prefetch_elevation_profiles ile hazırlanır). Matris handler'a
+        bağlanır; get_route_cost_by_index bu bacakları önbellek aramadan,
+        kapalı formdan fiyatlar. Profili olmayan bacaklar None kalır.
+        """
+        n = len(self.node_points)
+        distances = np.asarray(self.distance_array, dtype=np.float64)
+        matrix = [[None] * n for _ in range(n)]
+        
+        missing = []
+        for i in range(n):
+            for j in range(n):
+                if i == j or not 0.1 <= distances[i, j] < float('inf'):
+                    continue
+                cache_key = segment_key('energy', self.node_points[i], self.node_points[j])
+                coefficients = self.energy_cache.get(cache_key)
+                if coefficients is not None and coefficients.distance == distances[i, j]:
+                    matrix[i][j] = coefficients
+                    continue
+                profile = self.elevation_cache.get(pair_key(self.node_points[i], self.node_points[j]))
+                if profile:
+                    missing.append((i, j, cache_key, profile['elevations']))
+        
+        # Önbellekte olmayan segmentlerin katsayıları tek geçişte çıkarılır
+        if missing:
+            computed = energy_coefficients(
+                [item[3] for item in missing], [distances[i, j] for i, j, _, _ in missing]
+            )
+            for (i, j, cache_key, _), coefficients in zip(missing, computed):
+                self.energy_cache[cache_key] = coefficients
+                matrix[i][j] = coefficients
+        self.attach_energy_coefficients(matrix)
+        return matrix
+
+    def attach_energy_coefficients(self, matrix):
+        """Hazır katsayı matrisini (ör. ana süreçten gelen) mevcut düğüm kümesi için kullanır"""
+        self.energy_matrix = matrix
+        self._energy_matrix_key = self.node_fingerprint
+
+    def bound_energy_matrix(self):
+        """Mevcut düğüm kümesi için kurulmuş katsayı matrisi, yoksa None"""
+        if self.energy_matrix is not None and self._energy_matrix_key == self.node_fingerprint:
+            return self.energy_matrix
+        return None
+
     def precompute_distances(self, instance):
         print("\nPrecomputing all distances using OSRM table service...")
         
-        all_points = []
-        depot = (instance[DEPART][COORDINATES][X_COORD], 
-                instance[DEPART][COORDINATES][Y_COORD])
-        all_points.append(depot)
-        
-        i = 1
-        while True:
-            customer_key = f'C_{i}'
-            if customer_key not in instance:
-                break
-            customer = instance[customer_key]
-            point = (customer[COORDINATES][X_COORD],
-                    customer[COORDINATES][Y_COORD])
-            all_points.append(point)
-            i += 1
+        all_points = _collect_instance_points(instance)
         
         print(f"Found {len(all_points)-1} customer points")
-        coordinates = [f"{p[1]},{p[0]}" for p in all_points]
+        self.degraded = False
+        self.elevation_offline = False
         
-        for attempt in range(self.max_retries):
-            try:
-                url = f"{self.base_url}/table/v1/driving/{';'.join(coordinates)}"
-                params = {
-                    "annotations": "distance",
-                    "sources": "all",
-                    "destinations": "all"
-                }
-                
-                print("Requesting distance matrix from OSRM...")
-                response = requests.get(url, params=params, timeout=self.timeout)
-                data = response.json()
-                
-                if response.status_code == 200 and "distances" in data:
-                    print("Successfully received distance matrix")
-                    
-                    distances = data["distances"]
-                    for i, origin in enumerate(all_points):
-                        for j, dest in enumerate(all_points):
-                            if i != j:
-                                distance = distances[i][j] / 1000
-                                self.distance_matrix[(tuple(origin), tuple(dest))] = distance
-                    
-                    print(f"Cached {len(self.distance_matrix)} distances")
-                    self.save_cache()
-                    return True
-                
-                print(f"Invalid response from OSRM (attempt {attempt + 1}/{self.max_retries})")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)
+        # Aynı koordinat kümesi için matris başka bir işçi tarafından hesaplanmış olabilir
+        if self.map_distance_array(all_points) is not None:
+            self._indexed_instance = instance
+            print("Using stored distance matrix")
+            self._prepare_elevation_profiles(all_points)
+            return True
+        
+        # Önceki bir matris düğümlerin çoğunu kapsıyorsa yalnızca yeni satır/sütunlar çekilir
+        extended = self._extend_stored_distances(all_points)
+        if extended is not None:
+            distances, durations, fetched, snaps, complete = extended
+        else:
+            # Sunucunun koordinat sınırını aşmamak için matris bloklar halinde çekilir;
+            # mesafe ve süreler aynı istekte gelir
+            distances, durations, snaps, complete = fetch_distance_table(
+                self.base_url, all_points, timeout=self.timeout, max_retries=self.max_retries
+            )
+            fetched = np.ones(distances.shape, dtype=bool)
+        self._store_snap_distances(all_points, snaps)
+        # OSRM ulaşılamayan çiftler için null (nan) döndürür
+        for i, j in zip(*np.nonzero(fetched & ~np.isnan(distances))):
+            if i != j:
+                self.distance_matrix[pair_key(all_points[i], all_points[j])] = float(distances[i, j])
+        
+        if complete:
+            print("Successfully received distance matrix")
+            matrix = self.build_distance_array(all_points, distances, durations)
+            self.map_distance_array(all_points, matrix, self.duration_array)
+            self._indexed_instance = instance
             
-            except requests.Timeout:
-                print(f"Timeout error (attempt {attempt + 1}/{self.max_retries})")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)
-            except requests.RequestException as e:
-                print(f"Network error (attempt {attempt + 1}/{self.max_retries}): {str(e)}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)
-            except Exception as e:
-                print(f"Error calculating distance matrix: {str(e)}")
-                break
+            self.save_cache()
+            print(f"Cached {len(self.distance_matrix)} distances")
+            self._prepare_elevation_profiles(all_points)
+            return True
+        
+        if Config.ALLOW_DEGRADED_ROUTING:
+            # Servis (kısmen) yanıt vermedi: eksik çiftler tahmin edilir, optimizasyon sürer.
+            # Tahmini matris paylaşılan depoya yazılmaz
+            estimated, count, circuity = self._estimate_missing_distances(all_points, distances)
+            self._mark_degraded(count, circuity)
+            self.build_distance_array(all_points, estimated, durations)
+            self._indexed_instance = instance
+            self.save_cache()
+            return True
         
         print("Failed to compute distance matrix")
         return False
 
+    def _prepare_elevation_profiles(self, points):
+        """Enerji maliyetleri tabu döngüsünde tek tek HTTP beklemesin diye profilleri hazırlar"""
+        if Config.PREFETCH_ELEVATION:
+            self._approximate_energy.clear()
+            self.prefetch_elevation_profiles(points)
+            # Hazırlanmayan çiftler arama sırasında HTTP'siz yedekle fiyatlanır
+            self.elevation_offline = True
+            self.build_energy_coefficients()
+
+    def _prefetch_pairs(self, points):
+        """
+        Profili önceden çekilecek yönlü düğüm çiftleri.
+        
+        İyi turlar çoğunlukla yakın düğümleri bağlar; bu yüzden her düğümün
+        ELEVATION_PREFETCH_NEIGHBORS en yakın komşusuna giden çiftler ve depo
+        bağlantıları seçilir (küçük instance'larda tüm çiftler). Diğer
+        çiftlerin enerjisi arama sırasında HTTP'siz yedekle hesaplanır.
+        """
+        n = len(points)
+        neighbors = Config.ELEVATION_PREFETCH_NEIGHBORS
+        if n - 1 <= neighbors or self.distance_array is None or len(self.distance_array) != n:
+            candidates = [(i, j) for i in range(n) for j in range(n) if i != j]
+        else:
+            order = np.argsort(np.asarray(self.distance_array, dtype=np.float64), axis=1)
+            candidates = set()
+            for i in range(n):
+                for j in order[i, :neighbors + 1].tolist():
+                    if j != i:
+                        candidates.add((i, j))
+                if i != 0:
+                    candidates.update(((0, i), (i, 0)))
+            candidates = sorted(candidates)
+        return [
+            (i, j) for i, j in candidates
+            if pair_key(points[i], points[j]) not in self.elevation_cache
+        ]
+
+    def prefetch_elevation_profiles(self, points, distance_interval=30):
+        """
+        Instance'ın segmentleri için yükseklik profillerini toplu olarak hazırlar.
+        
+        1. Profili olmayan çiftler, her çifti bir kez içeren çok duraklı
+           rotalara dizilir; bacak geometrileri ~99 çift başına tek istekle gelir.
+        2. Tüm segmentlerin örnek noktaları ELEVATION_GRID_PRECISION ızgarasında
+           tekilleştirilir, önbellekte olmayanlar büyük toplu isteklerle sorulur.
+        3. Profiller get_elevation_profile ile aynı biçimde önbelleğe yazılır.
+        
+        Returns:
+            Hazırlanan profil sayısı
+        """
+        points = [tuple(p) for p in points]
+        pairs = self._prefetch_pairs(points)
+        if not pairs:
+            return 0
+        print(f"Prefetching elevation profiles for {len(pairs)} segment(s)...")
+        
+        # 1. Bacak geometrileri: yürüyüşler tek dizide birleştirilir (aradaki bağlantı
+        # bacakları da geçerli çiftlerdir) ve MAX_ROUTE_WAYPOINTS noktalık isteklere bölünür
+        sequence = []
+        for walk in _edge_walks(pairs):
+            sequence.extend(walk[1:] if sequence and sequence[-1] == walk[0] else walk)
+        pieces = [
+            sequence[start:start + MAX_ROUTE_WAYPOINTS]
+            for start in range(0, len(sequence) - 1, MAX_ROUTE_WAYPOINTS - 1)
+        ]
+        with ThreadPoolExecutor(max_workers=min(Config.OSRM_TABLE_MAX_WORKERS, len(pieces))) as executor:
+            piece_legs = list(executor.map(
+                lambda piece: self._request_route_legs([points[node] for node in piece]), pieces
+            ))
+        
+        # 2. Örnek noktaları ve ızgara üzerinde tekilleştirme
+        precision = Config.ELEVATION_GRID_PRECISION
+        segments = []
+        grid_points = {}
+        for piece, legs in zip(pieces, piece_legs):
+            if legs is None:
+                continue
+            for i, j, leg in zip(piece[:-1], piece[1:], legs):
+                # Geometri haritada da kullanılabilsin diye paylaşılan tabloya yazılır
+                self.route_cache[_route_cache_key(points[i], points[j])] = leg
+                route_coords = decode_polyline(leg["polyline"])
+                total_distance = leg["distance"] * 1000  # km -> metre
+                samples = [
+                    (round(lat, precision) + 0.0, round(lon, precision) + 0.0)
+                    for lat, lon in _sample_route_points(route_coords, total_distance, distance_interval)
+                ]
+                for sample in samples:
+                    grid_points.setdefault(sample, None)
+                segments.append((i, j, samples, total_distance, leg["duration"] * 60))
+        
+        elevations = self._lookup_elevations(list(grid_points))
+        
+        # 3. Profiller
+        prepared = 0
+        for i, j, samples, total_distance, duration in segments:
+            values = [elevations.get(sample) for sample in samples]
+            if any(value is None for value in values):
+                continue
+            self.elevation_cache[pair_key(points[i], points[j])] = _elevation_profile(
+                values, distance_interval, total_distance, duration
+            )
+            prepared += 1
+        self.save_cache()
+        print(f"Prepared {prepared} elevation profiles from {len(pieces)} route request(s) "
+              f"and {len(grid_points)} distinct sample point(s)")
+        return prepared
+
+    def _lookup_elevations(self, grid_points):
+        """
+        Izgara noktalarının yüksekliklerini döndürür {nokta: metre}.
+        
+        ELEVATION_SOURCE = 'dem' ise önce yerel döşemeler okunur, kalanlar
+        ELEVATION_BATCH_SIZE'lık isteklerle sorulur. Nokta yükseklikleri ayrı
+        ayrı önbelleğe yazılmaz; kalıcı olan segment başına tek profil kaydıdır.
+        """
+        elevations = {}
+        dem = get_dem_source()
+        if dem is not None:
+            # Yerel döşemelerden okunan değerler önbelleğe yazılmaz; kapsanmayanlar API'ye kalır
+            values = dem.elevations(grid_points)
+            covered = ~np.isnan(values)
+            elevations.update(zip(
+                (point for point, ok in zip(grid_points, covered) if ok), values[covered].tolist()
+            ))
+            grid_points = [point for point, ok in zip(grid_points, covered) if not ok]
+        
+        missing = grid_points
+        batch_size = Config.ELEVATION_BATCH_SIZE
+        batches = [missing[k:k + batch_size] for k in range(0, len(missing), batch_size)]
+        
+        def lookup(batch):
+            try:
+                response = self.http_client.post(
+                    self.elevation_api_url,
+                    endpoint='elevation',
+                    json={'locations': [{'latitude': lat, 'longitude': lon} for lat, lon in batch]}
+                )
+                if response.status_code == 200:
+                    return [result['elevation'] for result in response.json()['results']]
+                print(f"Elevation batch failed: HTTP {response.status_code}")
+            except Exception as e:
+                print(f"Error in elevation batch: {e}")
+            return None
+        
+        if batches:
+            print(f"Looking up {len(missing)} elevation point(s) in {len(batches)} request(s)")
+            with ThreadPoolExecutor(max_workers=min(Config.OSRM_TABLE_MAX_WORKERS, len(batches))) as executor:
+                for batch, values in zip(batches, executor.map(lookup, batches)):
+                    if values is None or len(values) != len(batch):
+                        continue
+                    elevations.update(zip(batch, values))
+        return elevations
+
+    def _extend_stored_distances(self, points):
+        """
+        En çok ortak düğüme sahip kayıtlı matrisi yeni noktalara genişletir.
+        
+        Ortak düğümler arasındaki mesafeler kopyalanır, yeni düğümler için
+        yalnızca satırlar (yeni x tümü) ve sütunlar (eski x yeni) istenir;
+        k yeni düğüm için n^2 yerine 2kn çift.
+        
+        Returns:
+            (mesafeler km/nan, süreler dakika/nan, yeni çekilen çiftlerin
+            maskesi, oturtma mesafeleri km/nan, başarı) ya da kullanılabilir
+            kayıtlı matris yoksa None
+        """
+        match = self.matrix_store.best_overlap(points)
+        if match is None:
+            return None
+        stored, stored_durations, stored_index = match
+        known = np.nonzero(stored_index >= 0)[0]
+        new = np.nonzero(stored_index < 0)[0]
+        if len(known) < 2:
+            return None
+        print(f"Reusing stored matrix for {len(known)} nodes, requesting {len(new)} new node(s)")
+        
+        n = len(points)
+        distances = np.full((n, n), np.nan, dtype=np.float64)
+        reused = np.asarray(stored[np.ix_(stored_index[known], stored_index[known])], dtype=np.float64)
+        reused[np.isinf(reused)] = np.nan
+        distances[np.ix_(known, known)] = reused
+        durations = np.full((n, n), np.nan, dtype=np.float64)
+        if stored_durations is not None:
+            durations[np.ix_(known, known)] = stored_durations[np.ix_(stored_index[known], stored_index[known])]
+        fetched = np.zeros((n, n), dtype=bool)
+        if len(new) == 0:
+            return distances, durations, fetched, np.full(n, np.nan), True
+        
+        rows, row_durations, row_snaps, rows_complete = fetch_distance_table(
+            self.base_url, points, sources=new, timeout=self.timeout, max_retries=self.max_retries
+        )
+        columns, column_durations, column_snaps, columns_complete = fetch_distance_table(
+            self.base_url, points, sources=known, destinations=new,
+            timeout=self.timeout, max_retries=self.max_retries
+        )
+        distances[new, :] = rows[new, :]
+        distances[np.ix_(known, new)] = columns[np.ix_(known, new)]
+        durations[new, :] = row_durations[new, :]
+        durations[np.ix_(known, new)] = column_durations[np.ix_(known, new)]
+        fetched[new, :] = True
+        fetched[:, new] = True
+        snaps = np.fmax(row_snaps, column_snaps)
+        return distances, durations, fetched, snaps, rows_complete and columns_complete
+
     def get_route_details(self, origin, dest):
 
         # Önbellekte bir anahtar oluştur
-        cache_key = f"route_{tuple(origin)}_{tuple(dest)}"
-        if hasattr(self, 'route_cache') and cache_key in self.route_cache:
-            return self.route_cache[cache_key]
-        
-        # Önbellek yoksa oluştur
-        if not hasattr(self, 'route_cache'):
-            self.route_cache = {}
+        cache_key = _route_cache_key(origin, dest)
+        cached_route = self.route_cache.get(cache_key)
+        if cached_route is not None:
+            return cached_route
         
         # OSRM API'sine istek yap - tam rota verisini al
         try:
@@ -388,90 +851,61 @@ class OSRMHandler:
             
             # OSRM route API'sine istek yap
             url = f"{self.base_url}/route/v1/driving/{origin_str};{dest_str}"
+            # Yalnızca tam geometri, mesafe ve süre kullanılır; adım ve açıklama istenmez
             params = {
                 "overview": "full",  # Tam rota geometrisi iste
-                "geometries": "geojson",  # GeoJSON formatında geometri
-                "steps": "true",  # Rota adımlarını dahil et
-                "annotations": "true"  # Ekstra açıklamalar (mesafe, süre vs.)
+                "geometries": "geojson"  # GeoJSON formatında geometri
             }
             
-            print(f"Requesting route from OSRM: {url} with params: {params}")
+            # Bağlantı hataları ve 429/5xx istemci tarafından geri çekilmeyle tekrar denenir
+            try:
+                response = self.http_client.get(url, endpoint='route', params=params)
+                data = response.json()
+            except requests.RequestException as e:
+                print(f"Request error: {str(e)}")
+                return None
+            except ValueError as e:
+                print(f"JSON parsing error: {str(e)}")
+                return None
+            
+            # Check response status code *before* checking data content
+            if response.status_code != 200:
+                error_msg = data.get("message", f"HTTP Status {response.status_code}")
+                print(f"OSRM API HTTP error: {error_msg}")
+                return None
+
+            # Check OSRM-specific status code
+            if data.get("code") != "Ok":
+                error_msg = data.get("message", "Unknown OSRM error code")
+                print(f"OSRM API specific error: {error_msg} (Code: {data.get('code')})")
+                return None
             
-            # 3 deneme yapacak şekilde retry logic ekle
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = requests.get(url, params=params, timeout=self.timeout)
-                    
-                    # Log status code explicitly
-                    print(f"OSRM Response Status (attempt {attempt+1}/{max_retries}): {response.status_code}")
-                    
-                    data = response.json()
-                    
-                    # Check response status code *before* checking data content
-                    if response.status_code != 200:
-                        error_msg = data.get("message", f"HTTP Status {response.status_code}")
-                        print(f"OSRM API HTTP error (attempt {attempt+1}/{max_retries}): {error_msg}")
-                        if attempt < max_retries - 1:
-                            print(f"Retrying in 1 second...")
-                            time.sleep(1)
-                            continue
-                        return None # Failed after retries
-
-                    # Check OSRM-specific status code
-                    if data.get("code") != "Ok":
-                        error_msg = data.get("message", "Unknown OSRM error code")
-                        print(f"OSRM API specific error (attempt {attempt+1}/{max_retries}): {error_msg} (Code: {data.get('code')})")
-                        if attempt < max_retries - 1:
-                            print(f"Retrying in 1 second...")
-                            time.sleep(1)
-                            continue
-                        return None # Failed after retries
-                    
-                    # Rota bilgilerini çıkart
-                    if "routes" in data and len(data["routes"]) > 0:
-                        route = data["routes"][0]
-                        
-                        # GeoJSON geometrisi içinden koordinatları al
-                        if "geometry" in route and "coordinates" in route["geometry"]:
-                            coordinates = route["geometry"]["coordinates"]
-                            distance = route["distance"] / 1000  # metre -> km
-                            duration = route["duration"] / 60    # saniye -> dakika
-                            
-                            result = {
-                                "coordinates": coordinates,  # [[lon, lat], [lon, lat], ...]
-                                "distance": distance,        # km cinsinden
-                                "duration": duration,        # dakika cinsinden
-                                "success": True
-                            }
-                            
-                            # Önbelleğe ekle
-                            self.route_cache[cache_key] = result
-                            print(f"Successfully got route with {len(coordinates)} points, distance: {distance:.2f} km")
-                            return result
-                        else:
-                            print(f"No geometry found in OSRM response: {route.keys()}")
-                    else:
-                        print(f"No routes found in OSRM response: {data.keys()}")
+            # Rota bilgilerini çıkart
+            if "routes" in data and len(data["routes"]) > 0:
+                route = data["routes"][0]
+                
+                # GeoJSON geometrisi içinden koordinatları al
+                if "geometry" in route and "coordinates" in route["geometry"]:
+                    coordinates = route["geometry"]["coordinates"]
+                    distance = route["distance"] / 1000  # metre -> km
+                    duration = route["duration"] / 60    # saniye -> dakika
                     
-                    # Geçerli yanıt ama gerekli veriler yok
-                    return None
+                    result = {
+                        "polyline": encode_lonlat(coordinates),  # kodlanmış polyline, gerektiğinde çözülür
+                        "distance": distance,        # km cinsinden
+                        "duration": duration,        # dakika cinsinden
+                        "success": True
+                    }
                     
-                except requests.RequestException as e:
-                    print(f"Request error (attempt {attempt+1}/{max_retries}): {str(e)}")
-                    if attempt < max_retries - 1:
-                        print(f"Retrying in 1 second...")
-                        time.sleep(1)
-                    else:
-                        return None
-                except ValueError as e:
-                    print(f"JSON parsing error: {str(e)}")
-                    return None
-                except Exception as e:
-                    print(f"Unexpected error getting route details: {str(e)}")
-                    return None
+                    # Önbelleğe ekle
+                    self.route_cache[cache_key] = result
+                    return result
+                else:
+                    print(f"No geometry found in OSRM response: {route.keys()}")
+            else:
+                print(f"No routes found in OSRM response: {data.keys()}")
             
-            # Tüm denemeler başarısız
+            # Geçerli yanıt ama gerekli veriler yok
             return None
         
         except Exception as e:
@@ -479,6 +913,378 @@ class OSRMHandler:
             traceback.print_exc()
             return None
 
+    async def get_route_details_async(self, pairs, max_concurrency=None):
+        """
+        Birden çok (origin, dest) çiftinin rota detaylarını eşzamanlı ister.
+        
+        Aynı anda en fazla max_concurrency istek, her biri kendi iş
+        parçacığında gönderilir. Sonuçlar pairs sırasıyla döner, alınamayan
+        bacaklar için None.
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return []
+        max_concurrency = max_concurrency or self.http_client.max_concurrency
+        semaphore = asyncio.Semaphore(max_concurrency)
+        loop = asyncio.get_running_loop()
+        
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(pairs))) as executor:
+            async def fetch(origin, dest):
+                async with semaphore:
+                    return await loop.run_in_executor(executor, self.get_route_details, origin, dest)
+            
+            return await asyncio.gather(*(fetch(origin, dest) for origin, dest in pairs))
+
+    def get_route_details_many(self, pairs, max_concurrency=None):
+        """get_route_details_async'in senkron (ör. Flask görünümleri) karşılığı"""
+        legs = asyncio.run(self.get_route_details_async(pairs, max_concurrency))
+        self.route_cache.flush()
+        return legs
+
+    def get_multi_route_details(self, points):
+        """
+        Tüm rotayı (a;b;c;...) tek /route isteğiyle alır ve bacaklara böler.
+        
+        Her bacak get_route_details ile aynı biçimde route_cache'e yazılır;
+        böylece rota haritası ve yükseklik profilleri ayrı istek yapmaz.
+        Çok uzun rotalar MAX_ROUTE_WAYPOINTS noktalık parçalarla istenir.
+        
+        Returns:
+            len(points) - 1 bacak sözlüğü listesi ya da istek başarısızsa None
+        """
+        points = [tuple(p) for p in points]
+        keys = [_route_cache_key(origin, dest) for origin, dest in zip(points[:-1], points[1:])]
+        cached_legs = [self.route_cache.get(key) for key in keys]
+        if all(leg is not None for leg in cached_legs):
+            return cached_legs
+        
+        legs = []
+        chunk_starts = range(0, len(keys), MAX_ROUTE_WAYPOINTS - 1)
+        for start in chunk_starts:
+            chunk_legs = self._request_route_legs(points[start:start + MAX_ROUTE_WAYPOINTS])
+            if chunk_legs is None:
+                return None
+            legs.extend(chunk_legs)
+        
+        for key, leg in zip(keys, legs):
+            self.route_cache[key] = leg
+        self.route_cache.flush()
+        print(f"Got {len(legs)} route legs from {len(chunk_starts)} request(s)")
+        return legs
+
+    def _request_route_legs(self, points):
+        """Noktalardan geçen tek bir rota ister, bacak bazında sonuç döndürür"""
+        coordinates = ';'.join(f"{p[1]},{p[0]}" for p in points)
+        url = f"{self.base_url}/route/v1/driving/{coordinates}"
+        params = {
+            "overview": "false",      # Bacak geometrileri adımlardan kurulur
+            "geometries": "geojson",
+            "steps": "true",
+            "continue_straight": "false"  # her bacak tek başına istenmiş gibi en kısa yoldan
+        }
+        try:
+            response = self.http_client.get(url, endpoint='route', params=params)
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"Error requesting multi-waypoint route: {str(e)}")
+            return None
+        
+        if response.status_code != 200 or data.get("code") != "Ok" or not data.get("routes"):
+            print(f"OSRM multi-waypoint route failed: {data.get('message', data.get('code'))}")
+            return None
+        
+        route_legs = data["routes"][0].get("legs", [])
+        if len(route_legs) != len(points) - 1:
+            print(f"Unexpected leg count in OSRM response: {len(route_legs)}")
+            return None
+        
+        legs = []
+        for leg in route_legs:
+            # Ardışık adımlar uç noktalarını paylaşır, tekrarlananlar atlanır
+            coordinates = []
+            for step in leg.get("steps", []):
+                for coord in step["geometry"]["coordinates"]:
+                    if not coordinates or coordinates[-1] != coord:
+                        coordinates.append(coord)
+            legs.append({
+                "polyline": encode_lonlat(coordinates),  # kodlanmış polyline, gerektiğinde çözülür
+                "distance": leg["distance"] / 1000,  # metre -> km
+                "duration": leg["duration"] / 60,    # saniye -> dakika
+                "success": True
+            })
+        return legs
+
+class CompiledInstance:
+    """
+    Instance sözlüğünün çözücü için bir kez derlenmiş hali.
+    
+    Düğüm id'leri 0 = depo, i = C_i şeklindedir. Sıcak döngülerde f-string ve
+    iç içe sözlük erişimi yerine bu dizilerin kullanılması amaçlanır.
+    """
+    
+    def __init__(self, instance):
+        points = _collect_instance_points(instance)
+        
+        self.source = instance
+        self.name = instance.get(INSTANCE_NAME)
+        self.vehicle_capacity = instance.get(VEHICLE_CAPACITY)
+        self.max_vehicle_number = instance.get(MAX_VEHICLE_NUMBER)
+        self.size = len(points) - 1
+        
+        # Handler önbellek anahtarları için ham koordinat tuple'ları
+        self.points = points
+        self.node_ids = np.arange(len(points), dtype=np.int32)
+        self.coordinates = np.array(points, dtype=np.float64)
+        self.demands = np.zeros(len(points), dtype=np.float64)
+        for i in range(1, len(points)):
+            self.demands[i] = float(instance[f'C_{i}'][DEMAND])
+        
+        # Skaler erişimli döngüler için Python listesi (numpy skaler erişimi yavaş)
+        self.demand_list = self.demands.tolist()
+    
+    def __len__(self):
+        return self.size
+    
+    @property
+    def depot(self):
+        return self.points[0]
+    
+    def point(self, node_id):
+        return self.points[node_id]
+
+class EnergyCoefficients:
+    """
+    Bir segmentin yükten bağımsız enerji katsayıları.
+    
+    Eğim/yük modelinde yük yalnızca birkaç skaler terimde yer alır; profil
+    bir kez bu terimlere indirgenir ve her araç ağırlığı için maliyet
+    kapalı formdan hesaplanır. Yokuş yukarı faktörünün 5 kat sınırı, her
+    adımın sınıra ulaştığı yük eşiklerinin sıralı listesiyle tam olarak
+    uygulanır (bisect ile).
+    """
+    __slots__ = ('distance', 'step_km', 'n_up', 'n_down', 'cap_thresholds', 'cap_prefix', 'uphill_sum',
+                 'benefit_sum', 'tail_sum')
+    
+    def __init__(self, distance, step_km, n_up, n_down, cap_thresholds, cap_prefix, benefit_sum, tail_sum):
+        self.distance = distance
+        self.step_km = step_km
+        self.n_up = n_up
+        self.n_down = n_down
+        # Yokuş adımlarının sınıra ulaştığı yük (L) eşikleri ve bu sıradaki eğim terimlerinin önek toplamları
+        self.cap_thresholds = cap_thresholds
+        self.cap_prefix = cap_prefix
+        self.uphill_sum = cap_prefix[-1]
+        self.benefit_sum = benefit_sum
+        self.tail_sum = tail_sum
+    
+    def cost(self, vehicle_mass):
+        """Verilen araç ağırlığı (kg) için segmentin enerji maliyeti"""
+        # temel araç ağırlığı 2000 kg, yük desiye çevrilir (yaklaşık olarak)
+        relative_load = max(0, vehicle_mass - 2000) / 10 / 500
+        # Yük faktörü - Yük arttıkça enerji tüketimi artar
+        load_factor = 1.0 + 0.4 * relative_load ** 1.15
+        
+        capped = bisect_right(self.cap_thresholds, relative_load)
+        uphill = (
+            self.n_up + 4.0 * capped
+            + (1.0 + 0.3 * relative_load) * (self.uphill_sum - self.cap_prefix[capped])
+        )
+        max_benefit = max(0.2, 0.5 - relative_load * 0.1)
+        downhill = self.n_down - max_benefit * self.benefit_sum - 0.1 * self.tail_sum
+        return self.step_km * (uphill + downhill) * load_factor
+
+
+def energy_coefficients(elevation_lists, distances):
+    """
+    Segment profillerini tek dizi geçişinde EnergyCoefficients'a indirger.
+    
+    Modeldeki adım maliyeti (km) x eğim faktörü x yük faktörüdür:
+    yokuş yukarı min(1 + 0.09 * g^1.3 * (1 + 0.3 L), 5), yokuş aşağı
+    kazanç %3 eğime kadar artar, %8'e kadar en az %10'a iner, %0.5'in
+    altında yoktur; L = yük / 500. Tüm segmentlerin adımları tek diziye
+    açılır, yükten bağımsız toplamlar np.bincount ile segment başına alınır.
+    
+    Args:
+        elevation_lists: Her segmentin yükseklik örnekleri
+        distances: Segment mesafeleri (km)
+    
+    Returns:
+        Segment başına EnergyCoefficients listesi
+    """
+    distances = np.asarray(distances, dtype=np.float64).reshape(-1)
+    if not len(distances):
+        return []
+    # İkiden az örneği olan profillerde adım yok; maliyetleri sıfırdır
+    profiled = [k for k, elevations in enumerate(elevation_lists) if len(elevations) >= 2]
+    if len(profiled) < len(distances):
+        result = [EnergyCoefficients(float(d), 0.0, 0, 0, [], [0.0], 0.0, 0.0) for d in distances]
+        if profiled:
+            computed = energy_coefficients([elevation_lists[k] for k in profiled], distances[profiled])
+            for k, coefficients in zip(profiled, computed):
+                result[k] = coefficients
+        return result
+    
+    segment_count = len(distances)
+    steps = np.array([len(elevations) - 1 for elevations in elevation_lists], dtype=np.int64)
+    elevations = np.concatenate([np.asarray(e, dtype=np.float64) for e in elevation_lists])
+    # Segment içindeki ardışık farklar; segment sınırlarını aşan farklar atılır
+    valid = np.ones(len(elevations) - 1, dtype=bool)
+    valid[np.cumsum(steps + 1)[:-1] - 1] = False
+    diffs = np.diff(elevations)[valid]
+    segment_ids = np.repeat(np.arange(segment_count), steps)
+    step_km = distances / steps
+    gradient = diffs / (step_km[segment_ids] * 1000) * 100  # yüzde eğim
+    
+    uphill = gradient > 0
+    # Yokuş yukarı eğim terimi ve adımın 5 kat sınırına ulaştığı L değeri
+    uphill_term = np.where(uphill, np.maximum(gradient, 0.0) ** 1.3 * 0.09, 0.0)
+    with np.errstate(divide='ignore'):
+        thresholds = (4.0 / uphill_term - 1.0) / 0.3
+    
+    abs_gradient = np.where(uphill, 0.0, -gradient)
+    tail = np.minimum((abs_gradient - 3.0) / 5.0, 1.0)
+    benefit = np.where(
+        abs_gradient < 0.5, 0.0, np.where(abs_gradient <= 3.0, abs_gradient / 3.0, 1.0 - tail)
+    )
+    tail = np.where(abs_gradient > 3.0, tail, 0.0)
+    
+    def per_segment(values):
+        return np.bincount(segment_ids, weights=values, minlength=segment_count)
+    
+    n_up = np.bincount(segment_ids[uphill], minlength=segment_count)
+    benefit_sums = per_segment(benefit)
+    tail_sums = per_segment(tail)
+    
+    # Eşikler segment içinde sıralanır; önek toplamları sınıra ulaşmamış adımların terimini verir
+    order = np.flatnonzero(uphill)
+    order = order[np.lexsort((thresholds[order], segment_ids[order]))]
+    starts = np.concatenate(([0], np.cumsum(n_up)))
+    sorted_thresholds = thresholds[order].tolist()
+    running = np.concatenate(([0.0], np.cumsum(uphill_term[order]))).tolist()
+    
+    result = []
+    for k, (start, end) in enumerate(zip(starts[:-1].tolist(), starts[1:].tolist())):
+        base = running[start]
+        result.append(EnergyCoefficients(
+            float(distances[k]), float(step_km[k]), int(n_up[k]), int(steps[k] - n_up[k]),
+            sorted_thresholds[start:end], [value - base for value in running[start:end + 1]],
+            float(benefit_sums[k]), float(tail_sums[k])
+        ))
+    return result
+
+
+def _sample_route_points(route_coords, total_distance, distance_interval):
+    """Rota geometrisinden yükseklik örnek noktalarını seçer (mesafe metre)"""
+    if total_distance < distance_interval:
+        return [route_coords[0], route_coords[-1]]
+    # Rota üzerinde belirli aralıklarla, eşit aralıklı indekslerle örnekleme yap
+    num_samples = max(2, int(total_distance / distance_interval) + 1)
+    indices = np.linspace(0, len(route_coords) - 1, num_samples).astype(int)
+    return [route_coords[i] for i in indices]
+
+
+def _elevation_profile(elevations, distance_interval, total_distance, duration):
+    """Örnek yüksekliklerinden segmentin yükseklik profilini kurar"""
+    total_ascent = 0
+    total_descent = 0
+    
+    # Her noktanın bir sonraki noktayla arasındaki farkı hesapla
+    for i in range(len(elevations) - 1):
+        diff = elevations[i+1] - elevations[i]
+        if diff > 0:
+            total_ascent += diff
+        else:
+            total_descent += abs(diff)
+    
+    return {
+        'elevations': elevations,
+        'total_ascent': total_ascent,
+        'total_descent': total_descent,
+        'max_elevation': max(elevations),
+        'min_elevation': min(elevations),
+        'avg_elevation': sum(elevations) / len(elevations),
+        'distance_interval': distance_interval,
+        'num_samples': len(elevations),
+        'total_distance': total_distance,
+        'duration': duration
+    }
+
+
+def _edge_walks(pairs):
+    """
+    Yönlü kenarları (i, j) her birini bir kez kullanan en az sayıda yürüyüşe böler.
+    
+    Dengesiz düğümler sanal bir düğüme bağlanarak graf Euler'e tamamlanır,
+    Hierholzer ile bulunan devre sanal düğümlerde kesilir. Her yürüyüşün
+    ardışık düğümleri istenen bir kenardır; tüm çiftler (tam yönlü graf)
+    tek bir yürüyüşe sığar.
+    """
+    virtual = -1
+    outgoing = {}
+    balance = {}
+    for i, j in pairs:
+        outgoing.setdefault(i, []).append(j)
+        balance[i] = balance.get(i, 0) + 1
+        balance[j] = balance.get(j, 0) - 1
+    for node, excess in balance.items():
+        if excess > 0:
+            outgoing.setdefault(virtual, []).extend([node] * excess)
+        elif excess < 0:
+            outgoing.setdefault(node, []).extend([virtual] * -excess)
+    
+    walks = []
+    for start in list(outgoing):
+        if not outgoing.get(start):
+            continue
+        stack, circuit = [start], []
+        while stack:
+            node = stack[-1]
+            if outgoing.get(node):
+                stack.append(outgoing[node].pop())
+            else:
+                circuit.append(stack.pop())
+        circuit.reverse()
+        if virtual in circuit:
+            # Kapalı devre sanal düğümden başlayacak şekilde döndürülür
+            k = circuit.index(virtual)
+            circuit = circuit[k:-1] + circuit[:k] + [virtual]
+        walk = []
+        for node in circuit:
+            if node == virtual:
+                if len(walk) > 1:
+                    walks.append(walk)
+                walk = []
+            else:
+                walk.append(node)
+        if len(walk) > 1:
+            walks.append(walk)
+    return walks
+
+
+def _route_cache_key(origin, dest):
+    return segment_key('route', origin, dest)
+
+
+def compile_instance(instance):
+    """Instance sözlüğünü derler, zaten derlenmişse aynen döndürür"""
+    if isinstance(instance, CompiledInstance):
+        return instance
+    return CompiledInstance(instance)
+
+def _collect_instance_points(instance):
+    """Depo ve müşteri koordinatlarını düğüm id sırasıyla döndürür (0 = depo, i = C_i)"""
+    points = [(instance[DEPART][COORDINATES][X_COORD],
+               instance[DEPART][COORDINATES][Y_COORD])]
+    
+    i = 1
+    while f'C_{i}' in instance:
+        customer = instance[f'C_{i}']
+        points.append((customer[COORDINATES][X_COORD],
+                       customer[COORDINATES][Y_COORD]))
+        i += 1
+    
+    return points
+
 def create_navigation_link(route, instance_data):
     base_url = "https://graphhopper.com/maps/?" 
     
@@ -2,12 +2,14 @@ from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from models import Company, Driver, Vehicle, Route, RouteDetail, Customer, Warehouse, RouteStatus, VehicleStatus
 from database import SessionLocal, db
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import and_
 from utils.route_optimizer import optimize_routes
 from utils.auth import company_required
-from process_data import OSRMHandler
+from utils.polyline import POLYLINE_PRECISION, decode_lonlat
+from process_data import OSRMHandler, get_shared_handler
 from alg_creator import run_tabu_search
+from config import Config
 import random
 import traceback
 
@@ -93,10 +95,10 @@ def _check_prerequisites(db, num_customers=None):
                     'error': 'Müşteri sayısı en az 2 olmalı veya tüm müşteriler için 0 olmalı.'
                 }), 400)
                 
-            if num_customers != 0 and num_customers > 15:
+            if num_customers != 0 and num_customers > Config.MAX_OPTIMIZE_CUSTOMERS:
                 return False, (jsonify({
                     'success': False,
-                    'error': "Müşteri sayısı 15'in üstünde olamaz."
+                    'error': f"Müşteri sayısı {Config.MAX_OPTIMIZE_CUSTOMERS}'in üstünde olamaz."
                 }), 400)
 
             if num_customers == 0:
@@ -208,7 +210,8 @@ def optimize():
             n_gen=min(500, len(selected_customers) * 20),
             tabu_size=min(20, len(selected_customers) // 2 + 5),
             stagnation_limit=15,
-            vehicle_capacity=float(min_vehicle_capacity)
+            vehicle_capacity=float(min_vehicle_capacity),
+            maps_handler=maps_handler
         )
 
         if not routes:
@@ -240,6 +243,15 @@ def optimize():
                 for customer_id in route_customers
             )
 
+            # Depo -> müşteriler -> depo düğüm dizisi; varış süreleri tek geçişte hesaplanır
+            route_nodes = [0] + list(route_customers) + [0]
+            route_distance = sum(
+                maps_handler.get_distance_by_index(i, j) for i, j in zip(route_nodes[:-1], route_nodes[1:])
+            )
+            arrival_offsets = maps_handler.cumulative_durations(route_nodes)
+            # Zaman damgaları (created_at, actual_arrival_time) gibi UTC, saat dilimsiz
+            planning_time = datetime.utcnow()
+
             # Rotayı oluştur
             route = Route(
                 company_id=current_user.company_id,
@@ -248,8 +260,9 @@ def optimize():
                 warehouse_id=warehouse.id,
                 status=RouteStatus.PLANNED,
                 total_demand=float(route_demand),
-                total_distance=0.0,  # Mesafe daha sonra hesaplanacak
-                created_at=datetime.utcnow()
+                total_distance=float(route_distance),
+                total_duration=int(round(arrival_offsets[-1])),
+                created_at=planning_time
             )
             db.add(route)
             db.flush()
@@ -263,6 +276,7 @@ def optimize():
                     sequence_number=sequence,
                     demand=float(customer.desi),
                     status='pending',
+                    planned_arrival_time=planning_time + timedelta(minutes=float(arrival_offsets[sequence])),
                     created_at=datetime.utcnow()
                 )
                 db.add(detail)
@@ -275,6 +289,7 @@ def optimize():
         return jsonify({
             'success': True,
             'message': f'{len(created_routes)} rota başarıyla oluşturuldu',
+            'degraded': maps_handler.degraded,  # mesafeler kısmen tahmini (OSRM yanıt vermedi)
             'routes': [{
                 'id': route.id,
                 'driver': f"{route.driver.user.first_name} {route.driver.user.last_name}",
@@ -336,8 +351,8 @@ def get_route(route_id):
         if not route:
             return jsonify({'success': False, 'error': 'Rota bulunamadı'}), 404
         
-        # OSRM handler'ı başlat
-        osrm_handler = OSRMHandler()
+        # Süreç genelindeki OSRM handler'ı kullan
+        osrm_handler = get_shared_handler()
         
         # Depo koordinatları
         warehouse_coords = (route.warehouse.latitude, route.warehouse.longitude)
@@ -345,6 +360,9 @@ def get_route(route_id):
         # Durakları sıraya göre al
         stops = sorted(route.route_details, key=lambda x: x.sequence_number)
         
+        # ?geometry=polyline ile geometriler kodlanmış polyline olarak gönderilir (istemci çözer)
+        geometry_format = 'polyline' if request.args.get('geometry') == 'polyline' else 'coordinates'
+        
         # Rota geometrilerini hesapla
         route_geometries = []
         total_calculated_distance = 0.0 # Hesaplanan mesafeyi de toplayalım
@@ -358,18 +376,15 @@ def get_route(route_id):
             # DEBUG: Check if coordinates list is populated
             print(f"DEBUG: Total coordinates to process: {len(coordinates)}")
             
-            # Her bağlantı için rota detaylarını hesapla
-            for i in range(len(coordinates) - 1):
-                from_point = coordinates[i]
-                to_point = coordinates[i + 1]
-                
-                # DEBUG: Check points before calling OSRM
-                print(f"DEBUG: Attempting to get route segment {i}: from {from_point} to {to_point}")
-                
-                print(f"Fetching route details for segment {i}: {from_point} -> {to_point}") # Debug log
-                segment = osrm_handler.get_route_details(from_point, to_point)
-                
-                if segment and segment.get('coordinates'):
+            # Tüm rotayı tek istekle al; olmazsa bacakları eşzamanlı iste (sonuçlar sırayla döner)
+            segments = osrm_handler.get_multi_route_details(coordinates)
+            if segments is None:
+                legs = list(zip(coordinates[:-1], coordinates[1:]))
+                print(f"Fetching route details for {len(legs)} segments concurrently") # Debug log
+                segments = osrm_handler.get_route_details_many(legs)
+            
+            for i, segment in enumerate(segments):
+                if segment and segment.get('polyline'):
                     print(f"Segment {i} details found. Distance: {segment.get('distance', 0)}") # Debug log
                     # "from" ve "to" etiketlerini oluştur
                     if i == 0:
@@ -382,11 +397,12 @@ def get_route(route_id):
                         from_label = f'customer_{stops[i-1].customer.id}'
                         to_label = f'customer_{stops[i].customer.id}'
                     
-                    route_geometries.append({
-                        'from': from_label,
-                        'to': to_label,
-                        'coordinates': segment['coordinates'] # OSRM'den gelen koordinatlar
-                    })
+                    geometry = {'from': from_label, 'to': to_label}
+                    if geometry_format == 'polyline':
+                        geometry['polyline'] = segment['polyline']
+                    else:
+                        geometry['coordinates'] = decode_lonlat(segment['polyline']) # [[lon, lat], ...]
+                    route_geometries.append(geometry)
                     total_calculated_distance += segment.get('distance', 0.0)
                 else:
                     # Eğer OSRM'den geometri alınamazsa logla ve bu segmenti atla (düz çizgi de çizilmeyecek)
@@ -445,7 +461,9 @@ def get_route(route_id):
                     'longitude': detail.customer.longitude
                 }
             } for detail in stops], # Sıralı durakları kullanalım
-            'route_geometries': route_geometries # Hesaplanan geometriler
+            'route_geometries': route_geometries, # Hesaplanan geometriler
+            'geometry_format': geometry_format,
+            'polyline_precision': POLYLINE_PRECISION
         }
         
         return jsonify(route_data)
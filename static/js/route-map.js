@@ -75,7 +75,8 @@ function showRouteDetails(routeId, modalId, mapId, infoId, stopsId, isDriverView
     // Harita container'ını sıfırla
     mapContainer.innerHTML = '';
         
-    fetch(`/api/route/${routeId}`)
+    // Geometriler kodlanmış polyline olarak istenir, yanıt ~10 kat küçülür
+    fetch(`/api/route/${routeId}?geometry=polyline`)
         .then(response => response.json())
         .then(data => {
             // API yanıtı artık doğrudan data objesi olarak geliyor, success.data yapısı yok
@@ -137,8 +138,17 @@ function showRouteDetails(routeId, modalId, mapId, infoId, stopsId, isDriverView
                     console.log(`Using ${data.route_geometries.length} route geometries from API`); // Log geometry count
                     
                     data.route_geometries.forEach(segment => {
+                        // Kodlanmış polyline geldiyse doğrudan [lat, lon] dizisine çöz
+                        if (typeof segment.polyline === 'string') {
+                            const coords = decodePolyline(segment.polyline, data.polyline_precision);
+                            if (coords.length >= 2) {
+                                routeLayer.addLayer(createRoutePolyline(coords));
+                                coords.forEach(coord => bounds.extend(coord));
+                            } else {
+                                console.warn('Not enough decoded coordinates to draw polyline for segment:', segment);
+                            }
                         // Koordinatların geçerli olup olmadığını kontrol et
-                        if (segment.coordinates && Array.isArray(segment.coordinates) && segment.coordinates.length >= 2) {
+                        } else if (segment.coordinates && Array.isArray(segment.coordinates) && segment.coordinates.length >= 2) {
                             try {
                                 // OSRM'den gelen koordinatları [lat, lon] formatına dönüştür
                                 // OSRM genellikle [lon, lat] döndürür, Leaflet [lat, lon] bekler
@@ -307,6 +317,35 @@ function createMarker(point, label, isDepot = false) {
     return marker;
 }
 
+/**
+ * Kodlanmış polyline'ı Leaflet'in beklediği [lat, lon] dizisine çözer
+ * @param {string} encoded - Kodlanmış polyline
+ * @param {number} precision - Ondalık basamak sayısı (varsayılan 5)
+ * @returns {Array} - [[lat, lon], ...]
+ */
+function decodePolyline(encoded, precision = 5) {
+    const factor = Math.pow(10, precision || 5);
+    const coordinates = [];
+    let index = 0, lat = 0, lng = 0;
+
+    while (index < encoded.length) {
+        const deltas = [];
+        for (let k = 0; k < 2; k++) {
+            let shift = 0, result = 0, byte;
+            do {
+                byte = encoded.charCodeAt(index++) - 63;
+                result |= (byte & 0x1f) << shift;
+                shift += 5;
+            } while (byte >= 0x20);
+            deltas.push((result & 1) ? ~(result >> 1) : (result >> 1));
+        }
+        lat += deltas[0];
+        lng += deltas[1];
+        coordinates.push([lat / factor, lng / factor]);
+    }
+    return coordinates;
+}
+
 function createRoutePolyline(coordinates) {
     const options = {
         color: '#0d6efd',
@@ -0,0 +1,62 @@
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from config import Config
+from utils import routing_stub
+from utils.geo import segment_key
+from utils.osrm_handler import OSRMHandler
+
+
+class DetailedRouteCostTest(unittest.TestCase):
+    """get_detailed_route_cost against the local routing stub"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = routing_stub.serve(port=0)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.multiple(
+            Config,
+            ROUTING_CACHE_DIR=self.cache_dir.name,
+            ELEVATION_API_URL=f"{self.base_url}/api/v1/lookup",
+            ELEVATION_SOURCE='api'
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache_dir.cleanup)
+        self.handler = OSRMHandler(base_url=self.base_url)
+        self.origin = (39.90, 32.80)
+        self.dest = (39.93, 32.86)
+
+    def test_cache_miss_builds_terms_from_route_geometry(self):
+        cost = self.handler.get_detailed_route_cost(self.origin, self.dest, vehicle_mass=12000)
+
+        terms = self.handler.route_cost_cache.get(segment_key('route_cost', self.origin, self.dest))
+        self.assertIsNotNone(terms)
+        distance, ascent_cost, descent_benefit = terms
+        self.assertGreater(distance, 0)
+        self.assertAlmostEqual(cost, distance + ascent_cost * 1.2 - descent_benefit)
+
+    def test_terms_are_reused_for_every_vehicle_mass(self):
+        self.handler.get_detailed_route_cost(self.origin, self.dest, vehicle_mass=10000)
+        with mock.patch.object(self.handler, 'get_route_details') as get_route_details:
+            distance, ascent_cost, descent_benefit = self.handler.route_cost_cache.get(
+                segment_key('route_cost', self.origin, self.dest)
+            )
+            cost = self.handler.get_detailed_route_cost(self.origin, self.dest, vehicle_mass=25000)
+        get_route_details.assert_not_called()
+        self.assertAlmostEqual(cost, distance + ascent_cost * 2.5 - descent_benefit)
+
+
+if __name__ == '__main__':
+    unittest.main()
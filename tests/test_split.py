@@ -0,0 +1,184 @@
+import itertools
+import random
+import unittest
+
+import numpy as np
+
+import alg_creator
+from core_funs import apply_move
+
+
+def make_instance(size, rnd, max_vehicle_number=None):
+    instance = {
+        'instance_name': 'split',
+        'max_vehicle_number': max_vehicle_number,
+        'vehicle_capacity': 100,
+        'depart': {'coordinates': {'x': 40.0, 'y': 29.0}, 'demand': 0}
+    }
+    for i in range(1, size + 1):
+        instance[f'C_{i}'] = {
+            'coordinates': {'x': 40.0 + rnd.uniform(-0.05, 0.05), 'y': 29.0 + rnd.uniform(-0.05, 0.05)},
+            'demand': rnd.randint(5, 40)
+        }
+    return instance
+
+
+class MatrixHandler:
+    """Sabit mesafe matrisli handler; enerji yükle artar, alt sınır mesafenin altındadır"""
+
+    def __init__(self, size, rnd):
+        generator = np.random.default_rng(rnd.randrange(2 ** 32))
+        self.distances = generator.uniform(1, 10, (size + 1, size + 1))
+        np.fill_diagonal(self.distances, 0.0)
+        self.lower_bounds = self.distances * generator.uniform(0.5, 1.0, self.distances.shape)
+
+    def index_instance(self, instance):
+        return self.distances
+
+    def get_route_cost_by_index(self, i, j, vehicle_mass=10000):
+        distance = self.distances[i, j]
+        return distance + distance * (0.1 + vehicle_mass / 1e5)
+
+    def get_lower_bound_matrix(self):
+        return self.lower_bounds
+
+
+def route_cost(route, demands, leg_cost):
+    """_route_arcs ile aynı tanım: yük, ulaşılan müşteri dahil kümülatif"""
+    load = 0.0
+    cost = 0.0
+    prev = 0
+    for customer_id in route:
+        load += demands[customer_id]
+        cost += leg_cost(prev, customer_id, load)
+        prev = customer_id
+    return cost + leg_cost(prev, 0, load)
+
+
+def brute_force_split(tour, demands, vehicle_capacity, leg_cost, max_routes=None):
+    """Tüm ardışık bölmeleri dener, en düşük maliyeti döndürür (uygun bölme yoksa inf)"""
+    best = float('inf')
+    n = len(tour)
+    for cuts in itertools.product((False, True), repeat=n - 1):
+        routes = [[tour[0]]]
+        for customer_id, cut in zip(tour[1:], cuts):
+            if cut:
+                routes.append([customer_id])
+            else:
+                routes[-1].append(customer_id)
+        if max_routes is not None and len(routes) > max_routes:
+            continue
+        # Tek müşterili rota kapasiteyi aşsa da kabul edilir
+        if any(len(route) > 1 and sum(demands[c] for c in route) > vehicle_capacity for route in routes):
+            continue
+        best = min(best, sum(route_cost(route, demands, leg_cost) for route in routes))
+    return best
+
+
+def random_moves(rnd, size, count):
+    for _ in range(count):
+        op = rnd.choice(['swap', '2-opt', 'insert'])
+        i, j = rnd.sample(range(size), 2)
+        if op == '2-opt':
+            i, j = min(i, j), max(i, j) + 1
+        yield op, i, j
+
+
+class OptimalSplitTest(unittest.TestCase):
+    """_optimal_split / _split_labels, tüm bölmeleri deneyen kaba kuvvete karşı"""
+
+    def test_split_matches_brute_force(self):
+        rnd = random.Random(5)
+        for _ in range(500):
+            size = rnd.randint(1, 8)
+            demands = [0] + [rnd.randint(5, 60) for _ in range(size)]
+            costs = np.random.default_rng(rnd.randrange(2 ** 32)).uniform(1, 10, (size + 1, size + 1))
+
+            def leg_cost(i, j, load):
+                return costs[i, j] * (1 + load / 100)
+
+            tour = rnd.sample(range(1, size + 1), size)
+            vehicle_capacity = rnd.choice([40, 60, 100])
+            for max_routes in (None, rnd.randint(1, size)):
+                expected = brute_force_split(tour, demands, vehicle_capacity, leg_cost, max_routes)
+                routes = alg_creator._optimal_split(tour, demands, vehicle_capacity, leg_cost, max_routes)
+                if expected == float('inf'):
+                    self.assertIsNone(routes)
+                    continue
+                self.assertEqual([c for route in routes for c in route], tour)
+                if max_routes is not None:
+                    self.assertLessEqual(len(routes), max_routes)
+                cost = sum(route_cost(route, demands, leg_cost) for route in routes)
+                self.assertAlmostEqual(cost, expected)
+
+
+class IncrementalMoveCostTest(unittest.TestCase):
+    """TourCostEvaluator.move_cost, hamle uygulanmış turun baştan bölmesine karşı"""
+
+    def check_moves(self, max_vehicle_number):
+        rnd = random.Random(11)
+        for _ in range(30):
+            size = rnd.randint(6, 20)
+            instance = make_instance(size, rnd, max_vehicle_number(rnd))
+            handler = MatrixHandler(size, rnd)
+            vehicle_capacity = rnd.choice([40, 60, 100])
+            evaluator = alg_creator.TourCostEvaluator(instance, handler, vehicle_capacity)
+            tour = rnd.sample(range(1, size + 1), size)
+            evaluator.reset(tour)
+            for move in random_moves(rnd, size, 40):
+                full = alg_creator.TourCostEvaluator(instance, handler, vehicle_capacity)
+                expected = full.reset(apply_move(tour, move))
+                cost = evaluator.move_cost(move)
+                if expected == float('inf'):
+                    self.assertEqual(cost, expected)
+                else:
+                    self.assertAlmostEqual(cost, expected, msg=str(move))
+
+    def test_move_cost_matches_full_split(self):
+        self.check_moves(lambda rnd: None)
+
+    def test_capped_move_cost_matches_full_split(self):
+        # Araç sınırı çoğu turda sınırsız bölmenin rota sayısının altında kalır
+        self.check_moves(lambda rnd: rnd.randint(1, 4))
+
+
+class MovePricingTest(unittest.TestCase):
+    """price_moves alt sınır elemesiyle, tüm hamlelerin tam fiyatlanmasına karşı"""
+
+    def test_pruned_pricing_keeps_exact_costs_and_best_move(self):
+        rnd = random.Random(23)
+        pruned = 0
+        for _ in range(40):
+            size = rnd.randint(6, 20)
+            instance = make_instance(size, rnd, rnd.choice([None, rnd.randint(1, 4)]))
+            handler = MatrixHandler(size, rnd)
+            vehicle_capacity = rnd.choice([40, 60, 100])
+            tour = rnd.sample(range(1, size + 1), size)
+            moves = list(random_moves(rnd, size, 60))
+
+            evaluator = alg_creator.TourCostEvaluator(instance, handler, vehicle_capacity)
+            evaluator.reset(tour)
+            priced = evaluator.price_moves(moves)
+
+            reference = alg_creator.TourCostEvaluator(instance, handler, vehicle_capacity)
+            reference.reset(tour)
+            expected = [(move, reference.move_cost(move)) for move in moves]
+            expected = [(move, cost) for move, cost in expected if cost != float('inf')]
+
+            # Fiyatlanan hamleler üretim sırasında ve gerçek maliyetleriyle döner
+            remaining = iter(moves)
+            self.assertTrue(all(move in remaining for move, _ in priced))
+            for move, cost in priced:
+                self.assertAlmostEqual(cost, reference.move_cost(move), msg=str(move))
+            # En iyi hamle (eşitlikte ilk üretilen) elemesiz fiyatlamayla aynı
+            if expected:
+                best_move, best_cost = min(priced, key=lambda item: item[1])
+                expected_move, expected_cost = min(expected, key=lambda item: item[1])
+                self.assertEqual(best_move, expected_move)
+                self.assertAlmostEqual(best_cost, expected_cost)
+            pruned += len(expected) - len(priced)
+        self.assertGreater(pruned, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
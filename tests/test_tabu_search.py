@@ -0,0 +1,176 @@
+import contextlib
+import io
+import random
+import tempfile
+import threading
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+import numpy as np
+
+import alg_creator
+import process_data
+from config import Config
+from utils import routing_stub
+from utils.geo import pair_key
+
+
+def make_instance(size, seed=1):
+    rnd = random.Random(seed)
+    instance = {
+        'instance_name': 'stub',
+        'max_vehicle_number': size,
+        'vehicle_capacity': 100,
+        'depart': {'coordinates': {'x': 40.0, 'y': 29.0}, 'demand': 0}
+    }
+    for i in range(1, size + 1):
+        instance[f'C_{i}'] = {
+            'coordinates': {'x': 40.0 + rnd.uniform(-0.05, 0.05), 'y': 29.0 + rnd.uniform(-0.05, 0.05)},
+            'demand': rnd.randint(5, 40)
+        }
+    return instance
+
+
+class InlineExecutor:
+    """ProcessPoolExecutor yerine: initializer ve görevler bu süreçte çalışır"""
+
+    def __init__(self, max_workers=None, initializer=None, initargs=()):
+        initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class PrecomputedSearchTest(unittest.TestCase):
+    """precompute_distances ardından run_tabu_search, yerel routing stub'ına karşı"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = routing_stub.serve(port=0)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.multiple(
+            Config,
+            ROUTING_CACHE_DIR=self.cache_dir.name,
+            OSRM_BASE_URL=self.base_url,
+            ELEVATION_API_URL=f"{self.base_url}/api/v1/lookup",
+            ELEVATION_SOURCE='api',
+            PREFETCH_ELEVATION=True
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Önbellekler geçici dizinde yeniden açılır
+        caches = mock.patch.dict(process_data._shared_caches, clear=True)
+        caches.start()
+        self.addCleanup(caches.stop)
+        self.addCleanup(self.cache_dir.cleanup)
+        self.instance = make_instance(12)
+        self.handler = process_data.OSRMHandler()
+
+    def precompute(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(self.handler.precompute_distances(self.instance))
+
+    def run_search(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return alg_creator.run_tabu_search(
+                self.instance, 12, 30, 10, stagnation_limit=10, vehicle_capacity=100,
+                maps_handler=self.handler, seed=3, **kwargs
+            )
+
+    def test_prefetched_legs_are_priced_from_the_coefficient_matrix(self):
+        self.precompute()
+        points = self.handler.node_points
+        prefetched = {
+            (points[i], points[j])
+            for i in range(len(points)) for j in range(len(points))
+            if i != j and pair_key(points[i], points[j]) in self.handler.elevation_cache
+        }
+        self.assertTrue(prefetched)
+        self.assertIsNotNone(self.handler.bound_energy_matrix())
+
+        with mock.patch.object(
+            self.handler, 'calculate_energy_cost', wraps=self.handler.calculate_energy_cost
+        ) as calculate_energy_cost:
+            routes = self.run_search(num_starts=1)
+
+        self.assertEqual(sorted(c for route in routes for c in route), list(range(1, 13)))
+        self.assertIsNotNone(self.handler.bound_energy_matrix())
+        priced = {tuple(call.args[0]) for call in calculate_energy_cost.call_args_list}
+        self.assertFalse(priced & prefetched)
+
+    def test_unprofiled_legs_are_priced_with_a_flat_profile(self):
+        self.precompute()
+        points = self.handler.node_points
+        i, j = next(
+            (i, j) for i in range(len(points)) for j in range(len(points))
+            if i != j and pair_key(points[i], points[j]) not in self.handler.elevation_cache
+        )
+        distance = self.handler.get_distance_by_index(i, j)
+        flat = process_data.energy_coefficients([[0.0, 0.0]], [distance])[0]
+
+        cost = self.handler.calculate_energy_cost([points[i], points[j]], 12000, distance=distance)
+        self.assertAlmostEqual(cost, flat.cost(12000))
+        self.assertGreater(cost, distance)
+        # Tekrarlanan fiyatlamada önbellek tablosuna gidilmez
+        with mock.patch.object(self.handler.elevation_cache, 'get') as get:
+            cost = self.handler.calculate_energy_cost([points[i], points[j]], 20000, distance=distance)
+        get.assert_not_called()
+        self.assertAlmostEqual(cost, flat.cost(20000))
+
+    def test_search_workers_receive_the_coefficient_matrix(self):
+        self.precompute()
+        self.addCleanup(alg_creator._worker_state.clear)
+        with mock.patch.object(alg_creator, 'ProcessPoolExecutor', InlineExecutor):
+            routes = self.run_search(num_starts=2)
+
+        self.assertEqual(sorted(c for route in routes for c in route), list(range(1, 13)))
+        worker_handler = alg_creator._worker_state['maps_handler']
+        self.assertIsNot(worker_handler, self.handler)
+        self.assertIs(worker_handler.bound_energy_matrix(), self.handler.bound_energy_matrix())
+
+    def test_degraded_search_keeps_fetched_durations(self):
+        fetched = {}
+        fetch_distance_table = process_data.fetch_distance_table
+
+        def partial_table(*args, **kwargs):
+            distances, durations, snaps, _ = fetch_distance_table(*args, **kwargs)
+            # Bir çift yanıtsız kalır, matris tahminle tamamlanır (degraded mod)
+            distances[1, 2] = durations[1, 2] = np.nan
+            fetched['durations'] = durations.copy()
+            return distances, durations, snaps, False
+
+        with mock.patch.object(process_data, 'fetch_distance_table', partial_table):
+            self.precompute()
+        self.assertTrue(self.handler.degraded)
+
+        self.run_search(num_starts=1)
+
+        self.assertIsNotNone(self.handler.duration_array)
+        durations = fetched['durations']
+        np.testing.assert_allclose(
+            self.handler.cumulative_durations([0, 3, 0]),
+            [0.0, durations[0, 3], durations[0, 3] + durations[3, 0]],
+            rtol=1e-6
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
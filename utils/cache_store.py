@@ -0,0 +1,240 @@
+import ast
+import os
+import pickle
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Hashable
+
+from .lru_cache import bounded_cache
+
+CACHE_DB_NAME = 'cache.sqlite3'
+
+
+class CacheStore:
+    """
+    SQLite (WAL) backed key-value store shared by all on-disk caches.
+
+    Each cache lives in its own table; keys are stored as their canonical
+    repr and values as pickled blobs, so saving a cache only writes the
+    entries that changed since the last save.
+    """
+
+    def __init__(self, cache_dir: str):
+        """
+        Initialize cache store.
+
+        Args:
+            cache_dir: Directory holding the database and legacy .pkl files
+        """
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, CACHE_DB_NAME)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._tables: Dict[str, 'PersistentCache'] = {}
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the connection of the current process (reopened after fork)"""
+        with self._lock:
+            if self._conn is None or self._pid != os.getpid():
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('PRAGMA synchronous=NORMAL')
+                self._pid = os.getpid()
+            return self._conn
+
+    def execute(self, sql: str, params=()):
+        with self._lock:
+            return self.connection().execute(sql, params).fetchall()
+
+    def table(self, name: str) -> 'PersistentCache':
+        """Return the dict-like cache for a table, creating it if needed"""
+        with self._lock:
+            if name not in self._tables:
+                self.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" (key TEXT PRIMARY KEY, value BLOB NOT NULL)'
+                )
+                self._tables[name] = PersistentCache(self, name)
+                self._migrate_pickle(name)
+            return self._tables[name]
+
+    def _migrate_pickle(self, name: str):
+        """Import a legacy <name>.pkl cache once, then move it out of the way"""
+        pickle_file = os.path.join(self.cache_dir, f'{name}.pkl')
+        if not os.path.exists(pickle_file):
+            return
+        try:
+            with open(pickle_file, 'rb') as f:
+                data = pickle.load(f)
+            cache = self._tables[name]
+            cache.update(data)
+            cache.flush()
+            os.replace(pickle_file, pickle_file + '.migrated')
+            print(f"Migrated {len(data)} entries from {name}.pkl")
+        except Exception as e:
+            print(f"Error migrating {name}.pkl: {e}")
+
+    def rekey(self, name: str, transform: Callable[[Any], Any], version: int):
+        """
+        Rewrite every key of a table through transform, once per version.
+
+        Keys mapping to None are dropped; keys that collide keep one value.
+        The previous version is recorded in a _meta table so the rewrite
+        runs only on the first open after a key format change.
+        """
+        with self._lock:
+            conn = self.connection()
+            conn.execute('CREATE TABLE IF NOT EXISTS _meta (name TEXT PRIMARY KEY, key_version INTEGER)')
+            row = conn.execute('SELECT key_version FROM _meta WHERE name = ?', (name,)).fetchone()
+            if row is not None and row[0] >= version:
+                return
+            cache = self.table(name)
+            cache.flush()
+            tmp_name = f'{name}__rekey'
+            moved = 0
+            with conn:
+                conn.execute(f'DROP TABLE IF EXISTS "{tmp_name}"')
+                conn.execute(f'CREATE TABLE "{tmp_name}" (key TEXT PRIMARY KEY, value BLOB NOT NULL)')
+                for key_repr, value in conn.execute(f'SELECT key, value FROM "{name}"').fetchall():
+                    try:
+                        new_key = transform(ast.literal_eval(key_repr))
+                    except (ValueError, SyntaxError):
+                        new_key = None
+                    if new_key is None:
+                        continue
+                    conn.execute(
+                        f'INSERT OR REPLACE INTO "{tmp_name}" (key, value) VALUES (?, ?)',
+                        (PersistentCache._encode_key(new_key), value)
+                    )
+                    moved += 1
+                conn.execute(f'DROP TABLE "{name}"')
+                conn.execute(f'ALTER TABLE "{tmp_name}" RENAME TO "{name}"')
+                conn.execute(
+                    'INSERT OR REPLACE INTO _meta (name, key_version) VALUES (?, ?)', (name, version)
+                )
+            cache._memory.clear()
+            if moved:
+                print(f"Rewrote {moved} keys of {name} to key format v{version}")
+
+    def flush(self):
+        """Write pending entries of every table"""
+        with self._lock:
+            for cache in self._tables.values():
+                cache.flush()
+
+
+class PersistentCache(MutableMapping):
+    """
+    Dict-like view of one CacheStore table.
+
+    Reads go to a bounded LRU memory layer first (limits from Config, see
+    bounded_cache) and fall back to a single-row lookup; writes are kept in
+    memory until flush() persists just the pending entries.
+    """
+
+    def __init__(self, store: CacheStore, name: str):
+        self.store = store
+        self.name = name
+        self._memory = bounded_cache(name)
+        self._pending: Dict[Hashable, Any] = {}
+
+    @staticmethod
+    def _encode_key(key: Hashable) -> str:
+        return repr(key)
+
+    def __getitem__(self, key):
+        try:
+            return self._memory[key]
+        except KeyError:
+            pass
+        # Bellekten atılmış ama henüz yazılmamış girdi
+        if key in self._pending:
+            return self._pending[key]
+        rows = self.store.execute(
+            f'SELECT value FROM "{self.name}" WHERE key = ?', (self._encode_key(key),)
+        )
+        if not rows:
+            raise KeyError(key)
+        value = pickle.loads(rows[0][0])
+        self._memory[key] = value
+        return value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def __setitem__(self, key, value):
+        self._memory[key] = value
+        self._pending[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._memory.pop(key, None)
+        self._pending.pop(key, None)
+        with self.store._lock:
+            conn = self.store.connection()
+            conn.execute(f'DELETE FROM "{self.name}" WHERE key = ?', (self._encode_key(key),))
+            conn.commit()
+
+    def _unwritten_keys(self):
+        """Pending keys that have no row on disk yet"""
+        pending = list(self._pending)
+        on_disk = set()
+        for start in range(0, len(pending), 500):
+            chunk = [self._encode_key(key) for key in pending[start:start + 500]]
+            rows = self.store.execute(
+                f'SELECT key FROM "{self.name}" WHERE key IN ({",".join("?" * len(chunk))})', chunk
+            )
+            on_disk.update(row[0] for row in rows)
+        return [key for key in pending if self._encode_key(key) not in on_disk]
+
+    def __iter__(self):
+        # Diskteki anahtarlar repr olarak tutulur ve geri çözülür; henüz yazılmamış
+        # bekleyen anahtarlar eklenir. __len__ ile aynı küme, yazma yan etkisi yok
+        rows = self.store.execute(f'SELECT key FROM "{self.name}"')
+        keys = [ast.literal_eval(row[0]) for row in rows]
+        return iter(keys + self._unwritten_keys())
+
+    def __len__(self):
+        rows = self.store.execute(f'SELECT COUNT(*) FROM "{self.name}"')
+        return rows[0][0] + len(self._unwritten_keys())
+
+    def flush(self) -> int:
+        """Persist pending entries; returns the number of rows written"""
+        if not self._pending:
+            return 0
+        with self.store._lock:
+            pending = dict(self._pending)
+            rows = [
+                (self._encode_key(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+                for key, value in pending.items()
+            ]
+            conn = self.store.connection()
+            with conn:
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO "{self.name}" (key, value) VALUES (?, ?)', rows
+                )
+            # Yazım sırasında değişmeyen girdiler artık diskte
+            for key, value in pending.items():
+                if self._pending.get(key) is value:
+                    del self._pending[key]
+        return len(rows)
+
+
+_stores: Dict[str, CacheStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_cache_store(cache_dir: str) -> CacheStore:
+    """Return the process-wide store for a cache directory"""
+    cache_dir = os.path.abspath(cache_dir)
+    with _stores_lock:
+        if cache_dir not in _stores:
+            _stores[cache_dir] = CacheStore(cache_dir)
+        return _stores[cache_dir]
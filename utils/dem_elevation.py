@@ -0,0 +1,122 @@
+import math
+import os
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+
+HGT_VOID = -32768
+
+
+def hgt_tile_name(lat_floor: int, lon_floor: int) -> str:
+    """SRTM tile name of the 1x1 degree cell whose south-west corner is given, e.g. N39E032.hgt"""
+    return (
+        f"{'N' if lat_floor >= 0 else 'S'}{abs(lat_floor):02d}"
+        f"{'E' if lon_floor >= 0 else 'W'}{abs(lon_floor):03d}.hgt"
+    )
+
+
+class DemElevationSource:
+    """
+    Elevation lookups from local SRTM .hgt tiles.
+
+    Each tile is opened once with np.memmap (big-endian int16, 1201x1201 for
+    3 arc-second or 3601x3601 for 1 arc-second data), so only the pages that
+    are actually sampled are read and all processes share them. Lookups are
+    vectorized bilinear interpolations over whole point arrays.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize DEM source.
+
+        Args:
+            directory: Directory holding <N|S>yy<E|W>xxx.hgt tiles
+        """
+        self.directory = directory
+        self._tiles: Dict[Tuple[int, int], Optional[np.memmap]] = {}
+        self._lock = threading.Lock()
+
+    def _tile(self, lat_floor: int, lon_floor: int) -> Optional[np.memmap]:
+        key = (lat_floor, lon_floor)
+        with self._lock:
+            if key not in self._tiles:
+                self._tiles[key] = self._open_tile(hgt_tile_name(lat_floor, lon_floor))
+            return self._tiles[key]
+
+    def _open_tile(self, name: str) -> Optional[np.memmap]:
+        for candidate in (name, name.lower()):
+            path = os.path.join(self.directory, candidate)
+            if not os.path.exists(path):
+                continue
+            size = math.isqrt(os.path.getsize(path) // 2)
+            if size * size * 2 != os.path.getsize(path):
+                print(f"Invalid HGT tile size: {path}")
+                return None
+            return np.memmap(path, dtype='>i2', mode='r', shape=(size, size))
+        return None
+
+    def elevations(self, points: Sequence[Sequence[float]]) -> np.ndarray:
+        """
+        Bilinearly interpolated elevations (meters) of (latitude, longitude) points.
+
+        Returns:
+            float64 array, nan where no tile covers the point or the data is void
+        """
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        result = np.full(len(coords), np.nan)
+        if not len(coords):
+            return result
+        lat, lon = coords[:, 0], coords[:, 1]
+        cells = np.floor(coords).astype(np.int64)
+        unique_cells, cell_index = np.unique(cells, axis=0, return_inverse=True)
+        cell_index = cell_index.reshape(-1)
+
+        for k, (lat_floor, lon_floor) in enumerate(unique_cells.tolist()):
+            tile = self._tile(lat_floor, lon_floor)
+            if tile is None:
+                continue
+            mask = cell_index == k
+            last = tile.shape[0] - 1
+            # Satır 0 hücrenin kuzey kenarı, sütun 0 batı kenarıdır
+            row = (lat_floor + 1 - lat[mask]) * last
+            col = (lon[mask] - lon_floor) * last
+            r0 = np.clip(np.floor(row).astype(np.int64), 0, last - 1)
+            c0 = np.clip(np.floor(col).astype(np.int64), 0, last - 1)
+            fr = row - r0
+            fc = col - c0
+
+            corners = [tile[r0, c0], tile[r0, c0 + 1], tile[r0 + 1, c0], tile[r0 + 1, c0 + 1]]
+            z00, z01, z10, z11 = (
+                np.where(z == HGT_VOID, np.nan, z.astype(np.float64)) for z in corners
+            )
+            result[mask] = (
+                z00 * (1 - fr) * (1 - fc) + z01 * (1 - fr) * fc
+                + z10 * fr * (1 - fc) + z11 * fr * fc
+            )
+        return result
+
+    def elevation(self, lat: float, lon: float) -> float:
+        """Elevation of a single point (nan if not covered)"""
+        return float(self.elevations([(lat, lon)])[0])
+
+
+_source: Optional[DemElevationSource] = None
+_source_lock = threading.Lock()
+
+
+def get_dem_source() -> Optional[DemElevationSource]:
+    """
+    Return the process-wide DEM source if ELEVATION_SOURCE is 'dem', else None.
+
+    Callers fall back to the HTTP elevation API for points the tiles do not cover.
+    """
+    global _source
+    if Config.ELEVATION_SOURCE != 'dem':
+        return None
+    with _source_lock:
+        if _source is None:
+            _source = DemElevationSource(Config.DEM_DIRECTORY)
+        return _source
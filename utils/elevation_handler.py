@@ -1,45 +1,44 @@
-import requests
 import numpy as np
 from typing import List, Tuple
-import os
-import pickle
-import time
+from config import Config
+from .cache_store import get_cache_store
+from .dem_elevation import get_dem_source
+from .geo import CACHE_KEY_VERSION, canonical_point, canonicalize_key
+from .http_client import get_http_client
+from .lru_cache import bounded_cache
 
 class ElevationHandler:
-    def __init__(self):
-        self.api_url = "https://api.open-elevation.com/api/v1/lookup"
+    def __init__(self, api_url=None):
+        self.api_url = api_url or Config.ELEVATION_API_URL
         self.elevation_cache = {}
+        # Bellekte tutulan profil önbelleği; sınırlar PROFILE_CACHE_* ayarlarından
+        self.profile_cache = bounded_cache('profile_cache')
         self._initialize_cache()
     
     def _initialize_cache(self):
-        """Initialize elevation cache from disk"""
-        cache_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
-        os.makedirs(cache_dir, exist_ok=True)
-        cache_file = os.path.join(cache_dir, 'elevation_cache.pkl')
-        
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'rb') as f:
-                    self.elevation_cache = pickle.load(f)
-                print("Loaded elevation cache")
-            except Exception as e:
-                print(f"Error loading elevation cache: {e}")
-                self.elevation_cache = {}
+        """Open elevation cache (SQLite table, read lazily)"""
+        cache_dir = Config.ROUTING_CACHE_DIR
+        store = get_cache_store(cache_dir)
+        store.rekey('elevation_cache', canonicalize_key, CACHE_KEY_VERSION)
+        self.elevation_cache = store.table('elevation_cache')
     
     def _save_cache(self):
-        """Save elevation cache to disk"""
-        cache_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
-        cache_file = os.path.join(cache_dir, 'elevation_cache.pkl')
+        """Save new elevation entries to disk"""
         try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump(self.elevation_cache, f)
-            print("Saved elevation cache")
+            self.elevation_cache.flush()
         except Exception as e:
             print(f"Error saving elevation cache: {e}")
     
     def get_elevation(self, lat: float, lon: float) -> float:
         """Belirli bir koordinat için yükseklik bilgisini al"""
-        cache_key = (round(lat, 6), round(lon, 6)) 
+        # Yerel DEM döşemesi noktayı kapsıyorsa ağ ve önbellek kullanılmaz
+        dem = get_dem_source()
+        if dem is not None:
+            elevation = dem.elevation(lat, lon)
+            if not np.isnan(elevation):
+                return elevation
+        
+        cache_key = canonical_point((lat, lon))
         if cache_key in self.elevation_cache:
             return self.elevation_cache[cache_key]
         
@@ -47,7 +46,7 @@ class ElevationHandler:
             params = {
                 "locations": [{"latitude": lat, "longitude": lon}]
             }
-            response = requests.post(self.api_url, json=params)
+            response = get_http_client().post(self.api_url, endpoint='elevation', json=params)
             data = response.json()
             
             if "results" in data and len(data["results"]) > 0:
@@ -90,15 +89,12 @@ class ElevationHandler:
             }
         
         # Önbellek anahtarı oluştur
-        cache_key = tuple((round(lat, 6), round(lon, 6)) for lat, lon in coordinates)
+        cache_key = tuple(canonical_point(point) for point in coordinates)
         
         # Önbellekte profil varsa kullan
-        if hasattr(self, 'profile_cache') and cache_key in self.profile_cache:
-            return self.profile_cache[cache_key]
-            
-        # Profil önbelleği yoksa oluştur
-        if not hasattr(self, 'profile_cache'):
-            self.profile_cache = {}
+        cached_profile = self.profile_cache.get(cache_key)
+        if cached_profile is not None:
+            return cached_profile
         
         # Çok fazla nokta varsa örnekleme yap
         if len(coordinates) > 10:
@@ -112,10 +108,14 @@ class ElevationHandler:
         total_ascent = 0
         total_descent = 0
         
-        # Yükseklik verilerini al
-        for lat, lon in sampled_coordinates:
-            elevation = self.get_elevation(lat, lon)
-            elevations.append(elevation)
+        # Yükseklik verilerini al (DEM varsa tüm noktalar tek vektörel okumayla)
+        dem = get_dem_source()
+        values = dem.elevations(sampled_coordinates) if dem is not None else None
+        for k, (lat, lon) in enumerate(sampled_coordinates):
+            if values is not None and not np.isnan(values[k]):
+                elevations.append(float(values[k]))
+            else:
+                elevations.append(self.get_elevation(lat, lon))
         
         # Yükseklik değişimlerini hesapla
         for i in range(len(elevations) - 1):
@@ -0,0 +1,98 @@
+from typing import Hashable, Sequence, Tuple
+
+import numpy as np
+
+# 5 ondalık basamak ~1.1 m: aynı adresin farklı kayıtları aynı anahtara düşer
+COORDINATE_PRECISION = 5
+
+# Kalıcı önbelleklerin anahtar biçimi; değişirse CacheStore.rekey eski girdileri taşır
+CACHE_KEY_VERSION = 2
+
+EARTH_RADIUS_KM = 6371.0088
+
+Point = Tuple[float, float]
+
+
+def canonical_point(point: Sequence[float]) -> Point:
+    """
+    Snap a (latitude, longitude) pair to the canonical grid used by all caches.
+
+    Floats that differ only below the grid (re-saved with another precision,
+    customers a few centimeters apart) map to the same point.
+    """
+    lat, lon = point[0], point[1]
+    # +0.0 negatif sıfırı normalize eder, repr tabanlı anahtarlar da eşleşir
+    return (round(float(lat), COORDINATE_PRECISION) + 0.0, round(float(lon), COORDINATE_PRECISION) + 0.0)
+
+
+def node_id(point: Sequence[float]) -> str:
+    """Stable textual id of a location, e.g. '39.93340,32.85970'"""
+    lat, lon = canonical_point(point)
+    return f"{lat:.{COORDINATE_PRECISION}f},{lon:.{COORDINATE_PRECISION}f}"
+
+
+def pair_key(origin: Sequence[float], dest: Sequence[float]) -> Tuple[Point, Point]:
+    """Directed cache key of a segment"""
+    return (canonical_point(origin), canonical_point(dest))
+
+
+def segment_key(kind: str, origin: Sequence[float], dest: Sequence[float], *extra: Hashable) -> tuple:
+    """Cache key of a per-segment value (route, energy, cost...) plus its parameters"""
+    return (kind, node_id(origin), node_id(dest)) + extra
+
+
+def _is_point(value) -> bool:
+    return (
+        isinstance(value, tuple) and len(value) == 2
+        and all(isinstance(v, (int, float)) for v in value)
+    )
+
+
+def canonicalize_key(key):
+    """
+    Map a legacy raw-float cache key to its canonical form (None to drop it).
+
+    Used once when migrating caches: (lat, lon), (origin, dest) and
+    (origin, dest, vehicle_mass) keys are recognized.
+    """
+    if _is_point(key):
+        return canonical_point(key)
+    if isinstance(key, tuple) and len(key) in (2, 3) and _is_point(key[0]) and _is_point(key[1]):
+        if len(key) == 2:
+            return pair_key(key[0], key[1])
+        return segment_key('route_cost', key[0], key[1], key[2])
+    return None
+
+
+def haversine_matrix(points: Sequence[Sequence[float]], circuity: float = 1.0) -> np.ndarray:
+    """
+    Great-circle distances between all (latitude, longitude) points in km.
+
+    Computed locally in one vectorized pass. With circuity = 1 the result
+    is a lower bound on road distance; a circuity factor (road distance /
+    straight-line distance, ~1.2-1.4 in cities) turns it into an estimate.
+
+    Returns:
+        len(points) x len(points) float64 matrix
+    """
+    coords = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    lat = coords[:, 0][:, None]
+    lon = coords[:, 1][:, None]
+    h = (
+        np.sin((lat.T - lat) / 2) ** 2
+        + np.cos(lat) * np.cos(lat.T) * np.sin((lon.T - lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * circuity * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def estimate_circuity(road: np.ndarray, straight: np.ndarray, default: float, min_km: float = 0.5) -> float:
+    """
+    Median road / straight-line ratio over pairs whose road distance is known.
+
+    Pairs shorter than min_km (dominated by snapping to the road network)
+    are ignored; default is returned when too few pairs are known.
+    """
+    usable = np.isfinite(road) & (straight >= min_km)
+    if usable.sum() < 10:
+        return default
+    return float(np.median(road[usable] / straight[usable]))
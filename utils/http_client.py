@@ -0,0 +1,117 @@
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+# (connect, read) timeouts per endpoint, in seconds
+ENDPOINT_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    'route': (3.05, 30),
+    'table': (3.05, 60),
+    'elevation': (3.05, 30),
+    'default': (3.05, 30)
+}
+
+# Geçici kabul edilip tekrar denenen HTTP durumları
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RoutingClient:
+    """
+    Shared HTTP client for OSRM and elevation requests.
+
+    Uses one keep-alive connection pool, limits the number of in-flight
+    requests per process and retries transient failures with exponential
+    backoff and full jitter.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0
+    ):
+        """
+        Initialize routing client.
+
+        Args:
+            max_concurrency: Maximum simultaneous requests (also the pool size)
+            max_retries: Attempts per request, including the first
+            backoff_base: First backoff window in seconds
+            backoff_max: Upper bound of the backoff window in seconds
+        """
+        self.max_concurrency = max_concurrency or Config.HTTP_MAX_CONCURRENCY
+        self.max_retries = max_retries or Config.HTTP_MAX_RETRIES
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number attempt + 1"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str = 'default',
+        timeout: Optional[Union[float, Tuple[float, float]]] = None,
+        retries: Optional[int] = None,
+        **kwargs
+    ) -> requests.Response:
+        """
+        Send a request, retrying connection errors, timeouts and 429/5xx.
+
+        Returns:
+            The last response (callers still check status and payload)
+
+        Raises:
+            requests.RequestException if every attempt failed without a response
+        """
+        timeout = timeout or ENDPOINT_TIMEOUTS.get(endpoint, ENDPOINT_TIMEOUTS['default'])
+        retries = retries or self.max_retries
+        for attempt in range(retries):
+            last_attempt = attempt == retries - 1
+            try:
+                with self._semaphore:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+                print(f"{endpoint} request returned {response.status_code} (attempt {attempt + 1}/{retries})")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise
+                print(f"{endpoint} request failed (attempt {attempt + 1}/{retries}): {str(e)}")
+            time.sleep(self.backoff(attempt))
+
+    def get(self, url: str, endpoint: str = 'default', **kwargs) -> requests.Response:
+        return self.request('GET', url, endpoint=endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: str = 'default', **kwargs) -> requests.Response:
+        return self.request('POST', url, endpoint=endpoint, **kwargs)
+
+
+_client: Optional[RoutingClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> RoutingClient:
+    """Return the process-wide routing client (rebuilt after fork)"""
+    global _client, _client_pid
+    with _client_lock:
+        # Fork edilen işçiler ebeveynin keep-alive soketlerini paylaşmamalı
+        if _client is None or _client_pid != os.getpid():
+            _client = RoutingClient()
+            _client_pid = os.getpid()
+        return _client
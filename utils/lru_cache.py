@@ -0,0 +1,161 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Hashable, Optional
+
+import numpy as np
+
+from config import Config
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Approximate memory footprint of a cached value in bytes.
+
+    Walks lists, tuples and dicts (GeoJSON coordinate arrays, elevation
+    profiles) and uses nbytes for numpy arrays; shared objects are counted
+    once per reference, which is good enough for an eviction budget.
+    """
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) if value.base is None else value.nbytes + 112
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+
+class BoundedCache(MutableMapping):
+    """
+    Thread-safe in-memory LRU cache with entry, memory and age limits.
+
+    The least recently used entries are evicted once max_entries or
+    max_bytes is exceeded; entries older than ttl seconds are treated as
+    missing. A limit of 0 disables that limit.
+    """
+
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0, ttl: float = 0, name: str = 'cache'):
+        """
+        Initialize bounded cache.
+
+        Args:
+            max_entries: Maximum number of entries
+            max_bytes: Maximum estimated size of all values in bytes
+            ttl: Maximum entry age in seconds
+            name: Label used in stats()
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.RLock()
+        # key -> (value, size, expires_at)
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                raise KeyError(key)
+            if entry[2] and entry[2] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                raise KeyError(key)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not (entry[2] and entry[2] < time.monotonic())
+
+    def __setitem__(self, key, value):
+        # Boyut yalnızca bellek sınırı varsa ölçülür; küçük sayısal değerlerde ek yük olmaz
+        size = estimate_size(value) if self.max_bytes else 0
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            self._evict()
+
+    def __delitem__(self, key):
+        with self._lock:
+            if key not in self._entries:
+                raise KeyError(key)
+            self._remove(key)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_entries and len(self._entries) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Current size and hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+def bounded_cache(name: str, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                  ttl: Optional[float] = None) -> BoundedCache:
+    """
+    Create a cache whose limits come from Config.
+
+    Limits are read from <NAME>_MAX_ENTRIES, <NAME>_MAX_MB and <NAME>_TTL
+    (e.g. ROUTE_CACHE_MAX_ENTRIES for 'route_cache'); missing settings and
+    0 mean unlimited. Explicit arguments take precedence.
+    """
+    prefix = name.upper()
+    if max_entries is None:
+        max_entries = getattr(Config, f'{prefix}_MAX_ENTRIES', 0)
+    if max_bytes is None:
+        max_bytes = getattr(Config, f'{prefix}_MAX_MB', 0) * 1024 * 1024
+    if ttl is None:
+        ttl = getattr(Config, f'{prefix}_TTL', 0)
+    return BoundedCache(max_entries, max_bytes, ttl, name=name)
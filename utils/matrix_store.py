@@ -0,0 +1,271 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from .geo import canonical_point
+
+MATRIX_DIR_NAME = 'matrices'
+INDEX_DB_NAME = 'index.sqlite3'
+
+
+def fingerprint(points: Sequence[Tuple[float, float]]) -> str:
+    """Stable id of an ordered coordinate set (node id order matters)"""
+    digest = hashlib.sha1()
+    for point in points:
+        lat, lon = canonical_point(point)
+        digest.update(f"{lat},{lon};".encode())
+    return digest.hexdigest()
+
+
+class MatrixStore:
+    """
+    Directory of per-instance distance matrices stored as .npy files.
+
+    A travel time matrix (minutes) may be stored next to each distance
+    matrix as <fingerprint>.durations.npy. Matrices are opened with
+    mmap_mode='r', so every worker process that maps the same fingerprint
+    shares the same physical pages.
+
+    An SQLite index next to the files maps every node to the (matrix, row)
+    pairs that contain it, so overlap lookups never read .npy files, and
+    records size and last use for age- and size-based eviction
+    (MATRIX_STORE_MAX_AGE_DAYS, MATRIX_STORE_MAX_MB).
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize matrix store.
+
+        Args:
+            directory: Directory holding <fingerprint>.npy files
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def connection(self) -> sqlite3.Connection:
+        """Index connection of the current process (reopened after fork)"""
+        with self._lock:
+            if self._conn is None or self._pid != os.getpid():
+                self._conn = sqlite3.connect(
+                    os.path.join(self.directory, INDEX_DB_NAME), timeout=30, check_same_thread=False
+                )
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._pid = os.getpid()
+                with self._conn:
+                    self._conn.execute(
+                        'CREATE TABLE IF NOT EXISTS matrices '
+                        '(key TEXT PRIMARY KEY, bytes INTEGER NOT NULL, last_used REAL NOT NULL)'
+                    )
+                    self._conn.execute(
+                        'CREATE TABLE IF NOT EXISTS matrix_nodes '
+                        '(point TEXT NOT NULL, key TEXT NOT NULL, row INTEGER NOT NULL, PRIMARY KEY (point, key))'
+                    )
+                    self._conn.execute('CREATE INDEX IF NOT EXISTS matrix_nodes_key ON matrix_nodes (key)')
+                self._index_unlisted()
+            return self._conn
+
+    def _index_unlisted(self):
+        """Add matrices written before the index existed (one directory scan per process)"""
+        conn = self._conn
+        listed = {row[0] for row in conn.execute('SELECT key FROM matrices')}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.points.npy') or name[:-len('.points.npy')] in listed:
+                continue
+            key = name[:-len('.points.npy')]
+            try:
+                stored_points = np.load(self.points_path(key))
+            except Exception:
+                continue
+            self._index(key, stored_points.tolist())
+
+    def _index(self, key: str, points: Sequence[Tuple[float, float]]):
+        size = sum(
+            os.path.getsize(path)
+            for path in (self.path(key), self.points_path(key), self.durations_path(key))
+            if os.path.exists(path)
+        )
+        with self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO matrices (key, bytes, last_used) VALUES (?, ?, ?)',
+                (key, size, time.time())
+            )
+            self._conn.execute('DELETE FROM matrix_nodes WHERE key = ?', (key,))
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO matrix_nodes (point, key, row) VALUES (?, ?, ?)',
+                [(repr(canonical_point(point)), key, row) for row, point in enumerate(points)]
+            )
+
+    def _touch(self, key: str):
+        with self._lock:
+            conn = self.connection()
+            with conn:
+                conn.execute('UPDATE matrices SET last_used = ? WHERE key = ?', (time.time(), key))
+
+    def _remove(self, key: str):
+        for path in (self.path(key), self.points_path(key), self.durations_path(key)):
+            # Eşlenmiş dosyalar silinse de açık eşlemeler geçerli kalır (POSIX)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._conn:
+            self._conn.execute('DELETE FROM matrices WHERE key = ?', (key,))
+            self._conn.execute('DELETE FROM matrix_nodes WHERE key = ?', (key,))
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Remove matrices unused for MATRIX_STORE_MAX_AGE_DAYS, then the least
+        recently used ones until the store fits MATRIX_STORE_MAX_MB.
+
+        Returns:
+            Number of removed matrices
+        """
+        max_age = Config.MATRIX_STORE_MAX_AGE_DAYS * 86400
+        max_bytes = Config.MATRIX_STORE_MAX_MB * 1024 * 1024
+        removed = 0
+        with self._lock:
+            conn = self.connection()
+            rows = conn.execute('SELECT key, bytes, last_used FROM matrices ORDER BY last_used').fetchall()
+            total = sum(row[1] for row in rows)
+            now = time.time()
+            for key, size, last_used in rows:
+                if key == keep:
+                    continue
+                expired = max_age and now - last_used > max_age
+                if not expired and not (max_bytes and total > max_bytes):
+                    continue
+                self._remove(key)
+                total -= size
+                removed += 1
+        if removed:
+            print(f"Evicted {removed} stored matri{'x' if removed == 1 else 'ces'}")
+        return removed
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npy')
+
+    def points_path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.points.npy')
+
+    def durations_path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.durations.npy')
+
+    def _map(self, path: str, key: str) -> Optional[np.ndarray]:
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode='r')
+        except Exception as e:
+            print(f"Error mapping matrix {key}: {e}")
+            return None
+
+    def load(self, key: str) -> Optional[np.ndarray]:
+        """Map a stored distance matrix read-only, None if it does not exist"""
+        matrix = self._map(self.path(key), key)
+        if matrix is not None:
+            self._touch(key)
+        return matrix
+
+    def load_durations(self, key: str) -> Optional[np.ndarray]:
+        """Map a stored duration matrix read-only, None if it does not exist"""
+        return self._map(self.durations_path(key), key)
+
+    def _write(self, path: str, array: np.ndarray):
+        """Write an array atomically (readers never see a partial file)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.npy.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def save(
+        self,
+        key: str,
+        matrix: np.ndarray,
+        points: Optional[Sequence[Tuple[float, float]]] = None,
+        durations: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Write a matrix atomically and return its read-only mapping.
+
+        The node coordinates are stored next to the matrix so later
+        instances can reuse the rows and columns they share with it.
+        """
+        if points is not None:
+            self._write(self.points_path(key), np.asarray(points, dtype=np.float64))
+        if durations is not None:
+            # Süreler mesafeden önce yazılır: mesafe dosyası görünen her anahtarın süreleri hazırdır
+            self._write(self.durations_path(key), durations)
+        self._write(self.path(key), matrix)
+        if points is not None:
+            with self._lock:
+                self.connection()
+                self._index(key, points)
+            self.evict(keep=key)
+        return np.load(self.path(key), mmap_mode='r')
+
+    def best_overlap(
+        self, points: Sequence[Tuple[float, float]]
+    ) -> Optional[Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]]:
+        """
+        Find the stored matrix sharing the most nodes with a coordinate set.
+
+        Returns:
+            (mapped distance matrix, mapped duration matrix or None, index
+             array giving each point's row in those matrices or -1 if it is
+             not covered), None if nothing overlaps
+        """
+        wanted = {repr(canonical_point(point)): k for k, point in enumerate(points)}
+        names = list(wanted)
+        counts: Dict[str, int] = {}
+        with self._lock:
+            conn = self.connection()
+            # Düğüm -> (matris, satır) indeksinden ortak düğüm sayıları; .npy dosyası okunmaz
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                for key, count in conn.execute(
+                    f'SELECT key, COUNT(*) FROM matrix_nodes WHERE point IN ({",".join("?" * len(chunk))}) '
+                    'GROUP BY key', chunk
+                ):
+                    counts[key] = counts.get(key, 0) + count
+            if not counts:
+                return None
+            best_key = max(counts, key=counts.get)
+            rows = conn.execute('SELECT point, row FROM matrix_nodes WHERE key = ?', (best_key,)).fetchall()
+
+        index = np.full(len(points), -1, dtype=np.int64)
+        for point, row in rows:
+            k = wanted.get(point)
+            if k is not None:
+                index[k] = row
+        matrix = self.load(best_key)
+        if matrix is None:
+            return None
+        return matrix, self.load_durations(best_key), index
+
+
+_stores: Dict[str, MatrixStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_matrix_store(cache_dir: str) -> MatrixStore:
+    """Return the process-wide matrix store under a cache directory"""
+    directory = os.path.join(os.path.abspath(cache_dir), MATRIX_DIR_NAME)
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = MatrixStore(directory)
+        return _stores[directory]
@@ -1,22 +1,36 @@
 import requests
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 import numpy as np
-import os
-import pickle
 import time
+import threading
+from config import Config
 from .elevation_handler import ElevationHandler
+from .cache_store import get_cache_store
+from .geo import CACHE_KEY_VERSION, canonicalize_key, pair_key, segment_key
+from .osrm_table import fetch_distance_table
+from .http_client import get_http_client
+from .polyline import decode, encode_lonlat
+
+# route_cost_cache anahtarları segment başına (ağırlık içermez)
+ROUTE_COST_KEY_VERSION = CACHE_KEY_VERSION + 1
+
+
+def _drop_mass_keyed(key):
+    """Keep ('route_cost', origin, dest) keys, drop the old per-vehicle-mass ones"""
+    return key if isinstance(key, tuple) and len(key) == 3 else None
+
 
 class OSRMHandler:
     """Handler for OSRM (Open Source Routing Machine) API requests."""
     
-    def __init__(self, base_url: str = "http://router.project-osrm.org"):
+    def __init__(self, base_url: Optional[str] = None):
         """
         Initialize OSRM handler.
         
         Args:
-            base_url: Base URL for OSRM service
+            base_url: Base URL for OSRM service (default: Config.OSRM_BASE_URL)
         """
-        self.base_url = base_url.rstrip('/')
+        self.base_url = (base_url or Config.OSRM_BASE_URL).rstrip('/')
         self.distance_matrix = {}
         self.elevation_cache = {}
         self.route_cost_cache = {}  # Yeni: rota maliyet önbelleği
@@ -26,100 +40,96 @@ class OSRMHandler:
         self.elevation_weight = 0.3  # Yükseklik faktörünün ağırlığı (0-1 arası)
         self._initialize_cache()
     
+    @property
+    def http_client(self):
+        # Handler fork ile işçiye geçtiğinde o sürecin kendi istemcisi kullanılır
+        return get_http_client()
+    
     def _initialize_cache(self):
-        """Initialize all caches from disk"""
-        cache_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
-        os.makedirs(cache_dir, exist_ok=True)
+        """Open all caches (SQLite tables, read lazily)"""
+        cache_dir = Config.ROUTING_CACHE_DIR
+        self.cache_store = get_cache_store(cache_dir)
+        
+        # Ham float anahtarlı eski girdiler kanonik anahtarlara bir kez taşınır
+        for name in ('osrm_distance_matrix', 'elevation_cache', 'route_cost_cache'):
+            self.cache_store.rekey(name, canonicalize_key, CACHE_KEY_VERSION)
         
         # Mesafe matrisi önbelleği
-        distance_cache_file = os.path.join(cache_dir, 'osrm_distance_matrix.pkl')
-        if os.path.exists(distance_cache_file):
-            try:
-                with open(distance_cache_file, 'rb') as f:
-                    self.distance_matrix = pickle.load(f)
-                print("Loaded distance matrix from cache")
-            except Exception as e:
-                print(f"Error loading distance cache: {e}")
-                self.distance_matrix = {}
+        self.distance_matrix = self.cache_store.table('osrm_distance_matrix')
         
         # Yükseklik önbelleği
-        elevation_cache_file = os.path.join(cache_dir, 'elevation_cache.pkl')
-        if os.path.exists(elevation_cache_file):
-            try:
-                with open(elevation_cache_file, 'rb') as f:
-                    self.elevation_cache = pickle.load(f)
-                print("Loaded elevation cache")
-            except Exception as e:
-                print(f"Error loading elevation cache: {e}")
-                self.elevation_cache = {}
+        self.elevation_cache = self.cache_store.table('elevation_cache')
         
-        # Rota maliyet önbelleği
-        cost_cache_file = os.path.join(cache_dir, 'route_cost_cache.pkl')
-        if os.path.exists(cost_cache_file):
-            try:
-                with open(cost_cache_file, 'rb') as f:
-                    self.route_cost_cache = pickle.load(f)
-                print("Loaded route cost cache")
-            except Exception as e:
-                print(f"Error loading route cost cache: {e}")
-                self.route_cost_cache = {}
+        # Segment geometrileri; process_data.OSRMHandler ile aynı tablo ve kayıt biçimi
+        self.route_cache = self.cache_store.table('route_cache')
+        
+        # Rota maliyet önbelleği; ağırlık başına tutulmuş eski girdiler bir kez atılır
+        self.cache_store.rekey('route_cost_cache', _drop_mass_keyed, ROUTE_COST_KEY_VERSION)
+        self.route_cost_cache = self.cache_store.table('route_cost_cache')
     
     def save_cache(self):
-        """Save all caches to disk"""
-        cache_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
+        """Save new cache entries to disk"""
         try:
-            # Mesafe matrisi önbelleği
-            with open(os.path.join(cache_dir, 'osrm_distance_matrix.pkl'), 'wb') as f:
-                pickle.dump(self.distance_matrix, f)
-            
-            # Yükseklik önbelleği
-            with open(os.path.join(cache_dir, 'elevation_cache.pkl'), 'wb') as f:
-                pickle.dump(self.elevation_cache, f)
-            
-            # Rota maliyet önbelleği
-            with open(os.path.join(cache_dir, 'route_cost_cache.pkl'), 'wb') as f:
-                pickle.dump(self.route_cost_cache, f)
-            
-            print("Saved all caches")
+            written = (
+                self.distance_matrix.flush()
+                + self.elevation_cache.flush()
+                + self.route_cost_cache.flush()
+                + self.route_cache.flush()
+            )
+            print(f"Saved all caches ({written} new entries)")
         except Exception as e:
             print(f"Error saving caches: {e}")
     
     def get_route_details(self, origin: Tuple[float, float], dest: Tuple[float, float]) -> Dict:
         """İki nokta arasındaki rota detaylarını al"""
-        url = f"{self.base_url}/route/v1/driving/{origin[1]},{origin[0]};{dest[1]},{dest[0]}"
-        params = {
-            "overview": "full",
-            "geometries": "geojson",
-            "steps": "true"
-        }
+        # Geometri paylaşılan route_cache'te varsa (optimizasyon ya da harita
+        # sırasında alınmışsa) OSRM'e tekrar gidilmez
+        cache_key = segment_key('route', origin, dest)
+        leg = self.route_cache.get(cache_key)
         
-        try:
-            response = requests.get(url, params=params)
-            data = response.json()
+        if leg is None:
+            url = f"{self.base_url}/route/v1/driving/{origin[1]},{origin[0]};{dest[1]},{dest[0]}"
+            params = {
+                "overview": "full",
+                "geometries": "geojson",
+                "steps": "true"
+            }
             
-            if data["code"] != "Ok" or not data["routes"]:
-                return None
+            try:
+                response = self.http_client.get(url, endpoint='route', params=params)
+                data = response.json()
                 
-            route = data["routes"][0]
-            coordinates = [(coord[1], coord[0]) for coord in route["geometry"]["coordinates"]]
-            
-            # Yükseklik profilini hesapla
-            elevation_profile = self.elevation_handler.get_path_elevation_profile(coordinates)
-            
-            return {
-                "distance": route["distance"] / 1000,  # km cinsinden
-                "duration": route["duration"] / 60,    # dakika cinsinden
-                "coordinates": coordinates,
-                "elevation_profile": elevation_profile
-            }
-        except Exception as e:
-            print(f"Error getting route details: {str(e)}")
-            return None
+                if data["code"] != "Ok" or not data["routes"]:
+                    return None
+                    
+                route = data["routes"][0]
+                leg = {
+                    "polyline": encode_lonlat(route["geometry"]["coordinates"]),
+                    "distance": route["distance"] / 1000,  # km cinsinden
+                    "duration": route["duration"] / 60,    # dakika cinsinden
+                    "success": True
+                }
+                self.route_cache[cache_key] = leg
+            except Exception as e:
+                print(f"Error getting route details: {str(e)}")
+                return None
+        
+        coordinates = decode(leg["polyline"])
+        
+        # Yükseklik profilini hesapla
+        elevation_profile = self.elevation_handler.get_path_elevation_profile(coordinates)
+        
+        return {
+            "distance": leg["distance"],
+            "duration": leg["duration"],
+            "coordinates": coordinates,
+            "elevation_profile": elevation_profile
+        }
             
     def get_distance(self, origin: Tuple[float, float], dest: Tuple[float, float]) -> float:
         """İki nokta arasındaki ağırlıklı mesafeyi hesapla"""
-        cache_key = (tuple(origin), tuple(dest))
-        reverse_key = (tuple(dest), tuple(origin))
+        cache_key = pair_key(origin, dest)
+        reverse_key = pair_key(dest, origin)
         
         if cache_key in self.distance_matrix:
             return self.distance_matrix[cache_key]
@@ -169,7 +179,7 @@ class OSRMHandler:
                 'annotations': 'distance'
             }
             
-            response = requests.get(url, params=params, timeout=self.timeout)
+            response = self.http_client.get(url, endpoint='table', params=params, timeout=self.timeout)
             response.raise_for_status()
             
             data = response.json()
@@ -235,59 +245,20 @@ class OSRMHandler:
         
         print(f"Found {len(all_points)-1} customer points")
         
-        # Büyük veri setleri için parçalara ayırma
-        max_batch_size = 100  # OSRM'nin işleyebileceği maksimum nokta sayısı
-        if len(all_points) > max_batch_size:
-            print(f"Large dataset detected. Processing in batches of {max_batch_size} points.")
-            return self._batch_precompute_distances(all_points, max_batch_size)
-        
-        coordinates = [f"{p[1]},{p[0]}" for p in all_points]
+        # Matris kaynak x hedef blokları halinde, sınırlı eşzamanlılıkla çekilir
+        distances, _, _, complete = fetch_distance_table(
+            self.base_url, all_points, timeout=self.timeout, max_retries=self.max_retries
+        )
+        for i, j in zip(*np.nonzero(~np.isnan(distances))):
+            if i != j:
+                self.distance_matrix[pair_key(all_points[i], all_points[j])] = float(distances[i, j])
         
-        for attempt in range(self.max_retries):
-            try:
-                url = f"{self.base_url}/table/v1/driving/{';'.join(coordinates)}"
-                params = {
-                    "annotations": "distance",
-                    "sources": "all",
-                    "destinations": "all"
-                }
-                
-                print("Requesting distance matrix from OSRM...")
-                response = requests.get(url, params=params, timeout=self.timeout)
-                data = response.json()
-                
-                if response.status_code == 200 and "distances" in data:
-                    print("Successfully received distance matrix")
-                    
-                    distances = data["distances"]
-                    for i, origin in enumerate(all_points):
-                        for j, dest in enumerate(all_points):
-                            if i != j:
-                                distance = distances[i][j] / 1000
-                                self.distance_matrix[(tuple(origin), tuple(dest))] = distance
-                                self.distance_matrix[(tuple(dest), tuple(origin))] = distance
-                    
-                    print(f"Cached {len(self.distance_matrix)} distances")
-                    self.save_cache()
-                    return True
-                
-                print(f"Invalid response from OSRM (attempt {attempt + 1}/{self.max_retries})")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)
-            
-            except requests.Timeout:
-                print(f"Timeout error (attempt {attempt + 1}/{self.max_retries})")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)
-            except requests.RequestException as e:
-                print(f"Network error (attempt {attempt + 1}/{self.max_retries}): {str(e)}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)
-            except Exception as e:
-                print(f"Error calculating distance matrix: {str(e)}")
-                break
+        self.save_cache()
+        print(f"Cached {len(self.distance_matrix)} distances")
+        if complete:
+            return True
         
-        print("Failed to compute distance matrix using table service. Falling back to route service...")
+        print("Some table blocks failed. Falling back to route service for the missing pairs...")
         return self._fallback_precompute_distances(all_points)
     
     def _check_all_distances_cached(self, instance: Dict) -> bool:
@@ -312,78 +283,13 @@ class OSRMHandler:
         for i, origin in enumerate(all_points):
             for j, dest in enumerate(all_points):
                 if i != j:
-                    cache_key = (tuple(origin), tuple(dest))
-                    reverse_key = (tuple(dest), tuple(origin))
+                    cache_key = pair_key(origin, dest)
+                    reverse_key = pair_key(dest, origin)
                     if cache_key not in self.distance_matrix and reverse_key not in self.distance_matrix:
                         return False
         
         return True
     
-    def _batch_precompute_distances(self, all_points: List[Tuple[float, float]], batch_size: int) -> bool:
-        """
-        Precompute distances in batches for large datasets.
-        
-        Args:
-            all_points: List of (latitude, longitude) tuples
-            batch_size: Maximum number of points to process in a single batch
-            
-        Returns:
-            Boolean indicating if precomputation was successful
-        """
-        success = True
-        total_points = len(all_points)
-        
-        # Depo noktasını her batch'e dahil et
-        depot = all_points[0]
-        
-        for i in range(0, total_points, batch_size - 1):
-            batch_points = [depot]  # Her batch depo ile başlar
-            if i > 0:  # İlk batch değilse
-                batch_points.extend(all_points[i:min(i + batch_size - 1, total_points)])
-            else:  # İlk batch ise
-                batch_points.extend(all_points[1:min(batch_size, total_points)])
-            
-            print(f"Processing batch {i//batch_size + 1} with {len(batch_points)} points")
-            
-            coordinates = [f"{p[1]},{p[0]}" for p in batch_points]
-            
-            for attempt in range(self.max_retries):
-                try:
-                    url = f"{self.base_url}/table/v1/driving/{';'.join(coordinates)}"
-                    params = {
-                        "annotations": "distance",
-                        "sources": "all",
-                        "destinations": "all"
-                    }
-                    
-                    response = requests.get(url, params=params, timeout=self.timeout)
-                    data = response.json()
-                    
-                    if response.status_code == 200 and "distances" in data:
-                        distances = data["distances"]
-                        for i, origin in enumerate(batch_points):
-                            for j, dest in enumerate(batch_points):
-                                if i != j:
-                                    distance = distances[i][j] / 1000
-                                    self.distance_matrix[(tuple(origin), tuple(dest))] = distance
-                        
-                        break  # Başarılı olduğunda döngüden çık
-                    
-                    print(f"Invalid response from OSRM (attempt {attempt + 1}/{self.max_retries})")
-                    if attempt < self.max_retries - 1:
-                        time.sleep(2)
-                
-                except Exception as e:
-                    print(f"Error in batch processing: {str(e)}")
-                    if attempt < self.max_retries - 1:
-                        time.sleep(2)
-                    else:
-                        success = False
-        
-        print(f"Cached {len(self.distance_matrix)} distances")
-        self.save_cache()
-        return success
-    
     def _fallback_precompute_distances(self, all_points: List[Tuple[float, float]]) -> bool:
         """
         Fallback method to precompute distances using route service instead of table service.
@@ -401,7 +307,7 @@ class OSRMHandler:
         for i, origin in enumerate(all_points):
             for j, dest in enumerate(all_points):
                 if i != j:
-                    key = (tuple(origin), tuple(dest))
+                    key = pair_key(origin, dest)
                     if key in self.distance_matrix:
                         success_count += 1
                         continue
@@ -416,7 +322,7 @@ class OSRMHandler:
                             'alternatives': 'false'
                         }
                         
-                        response = requests.get(url, params=params, timeout=10)
+                        response = self.http_client.get(url, endpoint='route', params=params, timeout=10)
                         data = response.json()
                         
                         if response.status_code == 200 and "routes" in data and len(data["routes"]) > 0:
@@ -443,14 +349,7 @@ class OSRMHandler:
         İki nokta arasındaki toplam rota maliyetini hesaplar.
         Önbellekleme ile optimize edilmiş.
         """
-        # Önbellek anahtarı oluştur
-        cache_key = (tuple(origin), tuple(dest), vehicle_mass)
-        
-        # Önbellekte varsa kullan
-        if cache_key in self.route_cost_cache:
-            return self.route_cost_cache[cache_key]
-        
-        # Mesafe bazlı maliyet
+        # Mesafe bazlı maliyet (mesafe zaten önbellekte; ağırlık başına girdi tutulmaz)
         distance = self.get_distance(origin, dest)
         if distance == float('inf'):
             return float('inf')
@@ -461,11 +360,7 @@ class OSRMHandler:
         else:  # Yüklü araç
             elevation_factor = 1.2
         
-        # Toplam maliyeti hesapla ve önbelleğe al
-        total_cost = distance * elevation_factor
-        self.route_cost_cache[cache_key] = total_cost
-        
-        return total_cost
+        return distance * elevation_factor
     
     def get_detailed_route_cost(self, origin, dest, vehicle_mass=10000):
         """
@@ -480,38 +375,53 @@ class OSRMHandler:
         Returns:
             float: Toplam rota maliyeti
         """
-        # Önbellek anahtarı
-        cache_key = (tuple(origin), tuple(dest), vehicle_mass)
-        
-        # Önbellekte varsa kullan
-        if cache_key in self.route_cost_cache:
-            return self.route_cost_cache[cache_key]
-        
-        # Mesafe bazlı maliyet
-        distance = self.get_distance(origin, dest)
-        if distance == float('inf'):
-            return float('inf')
-        
-        # Yükseklik profili al
-        elevation_profile = self.get_elevation_profile(origin, dest)
-        if not elevation_profile:
-            return distance * 1.2  # Varsayılan faktör
+        # Segment başına yükten bağımsız terimler önbelleğe alınır:
+        # (mesafe, yokuş yukarı maliyeti / ağırlık faktörü, yokuş aşağı avantajı)
+        cache_key = segment_key('route_cost', origin, dest)
+        terms = self.route_cost_cache.get(cache_key)
+        
+        if terms is None:
+            # Mesafe bazlı maliyet
+            distance = self.get_distance(origin, dest)
+            if distance == float('inf'):
+                return float('inf')
+            
+            # Yükseklik profili, rota geometrisinden ElevationHandler ile çıkarılır
+            route_details = self.get_route_details(origin, dest)
+            elevation_profile = route_details["elevation_profile"] if route_details else None
+            if not elevation_profile:
+                return distance * 1.2  # Varsayılan faktör
+            
+            # Yokuş yukarı daha maliyetli, yokuş aşağı avantaj
+            terms = (
+                distance,
+                elevation_profile['total_ascent'] * 0.1,
+                elevation_profile['total_descent'] * 0.05
+            )
+            self.route_cost_cache[cache_key] = terms
         
-        # Yükseklik bazlı ek maliyet hesapla
-        total_ascent = elevation_profile['total_ascent']
-        total_descent = elevation_profile['total_descent']
+        distance, ascent_cost, descent_benefit = terms
         
         # Araç ağırlığına göre faktör
         mass_factor = max(1.0, vehicle_mass / 10000)
         
-        # Yokuş yukarı ve aşağı faktörleri
-        ascent_cost = total_ascent * 0.1 * mass_factor  # Yokuş yukarı daha maliyetli
-        descent_benefit = total_descent * 0.05  # Yokuş aşağı avantaj
-        
         # Toplam maliyet
-        total_cost = distance + ascent_cost - descent_benefit
-        
-        # Önbelleğe kaydet
-        self.route_cost_cache[cache_key] = total_cost
-        
-        return total_cost 
\ No newline at end of file
+        return distance + ascent_cost * mass_factor - descent_benefit
+
+
+_shared_handlers: Dict[str, OSRMHandler] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_handler(base_url: Optional[str] = None) -> OSRMHandler:
+    """
+    Return the process-wide handler for a base URL.
+
+    The handler keeps no per-request state, so it is safe to share between
+    request threads; its caches are opened once and saved incrementally.
+    """
+    base_url = (base_url or Config.OSRM_BASE_URL).rstrip('/')
+    with _shared_lock:
+        if base_url not in _shared_handlers:
+            _shared_handlers[base_url] = OSRMHandler(base_url)
+        return _shared_handlers[base_url]
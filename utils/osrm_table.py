@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from .http_client import get_http_client
+
+
+def _tiles(indices: Sequence[int], tile_size: int) -> List[List[int]]:
+    return [list(indices[k:k + tile_size]) for k in range(0, len(indices), tile_size)]
+
+
+def _snap_distances(waypoints: Optional[list], count: int) -> np.ndarray:
+    """Distance (km) from each requested coordinate to where OSRM snapped it onto the road network"""
+    if not waypoints or len(waypoints) != count:
+        return np.full(count, np.nan)
+    return np.array([
+        np.nan if waypoint.get("distance") is None else waypoint["distance"] / 1000
+        for waypoint in waypoints
+    ], dtype=np.float64)
+
+
+def _fetch_tile(
+    base_url: str,
+    points: Sequence[Tuple[float, float]],
+    sources: List[int],
+    destinations: List[int],
+    timeout: Optional[float],
+    max_retries: Optional[int]
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Fetch one sources x destinations block of the table service.
+
+    Returns:
+        (distances in km, durations in minutes) as len(sources) x
+        len(destinations) arrays with nan where unreachable, followed by the
+        snap distances (km, nan if not reported) of the sources and of the
+        destinations, or None if the request failed
+    """
+    # İstek yalnızca bloğun kullandığı koordinatları içerir
+    tile_nodes = list(dict.fromkeys(sources + destinations))
+    position = {node: k for k, node in enumerate(tile_nodes)}
+    coordinates = ';'.join(f"{points[node][1]},{points[node][0]}" for node in tile_nodes)
+    url = f"{base_url}/table/v1/driving/{coordinates}"
+    params = {
+        "annotations": "distance,duration",
+        "sources": ';'.join(str(position[node]) for node in sources),
+        "destinations": ';'.join(str(position[node]) for node in destinations)
+    }
+
+    try:
+        response = get_http_client().get(
+            url, endpoint='table', params=params, timeout=timeout, retries=max_retries
+        )
+        data = response.json()
+        if response.status_code == 200 and "distances" in data:
+            distances = np.array(data["distances"], dtype=np.float64)  # null -> nan
+            if "durations" in data:
+                durations = np.array(data["durations"], dtype=np.float64)
+            else:
+                durations = np.full(distances.shape, np.nan)
+            return (
+                distances / 1000, durations / 60,
+                _snap_distances(data.get("sources"), len(sources)),
+                _snap_distances(data.get("destinations"), len(destinations))
+            )
+        print(f"Invalid table response: {data.get('code')}")
+    except Exception as e:
+        print(f"Error fetching table tile: {str(e)}")
+    return None
+
+
+def fetch_distance_table(
+    base_url: str,
+    points: Sequence[Tuple[float, float]],
+    sources: Optional[Sequence[int]] = None,
+    destinations: Optional[Sequence[int]] = None,
+    tile_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, bool]:
+    """
+    Build distance and duration matrices from tiled, concurrent OSRM table requests.
+
+    The sources x destinations grid is split into tile_size x tile_size
+    blocks so no request exceeds the server's coordinate limit; blocks are
+    fetched on a bounded thread pool and written into one matrix.
+
+    Args:
+        base_url: OSRM base URL
+        points: (latitude, longitude) of every node
+        sources: Row node indices (default: all)
+        destinations: Column node indices (default: all)
+        tile_size: Sources/destinations per block
+        max_workers: Maximum concurrent requests
+
+    Returns:
+        (len(points) x len(points) distances in km, durations in minutes,
+         both nan where unknown; per-point snap distances in km, nan for
+         points no block reported; True if every block succeeded)
+    """
+    n = len(points)
+    sources = list(range(n)) if sources is None else list(sources)
+    destinations = list(range(n)) if destinations is None else list(destinations)
+    tile_size = tile_size or Config.OSRM_TABLE_TILE_SIZE
+    max_workers = max_workers or Config.OSRM_TABLE_MAX_WORKERS
+
+    matrix = np.full((n, n), np.nan, dtype=np.float64)
+    durations = np.full((n, n), np.nan, dtype=np.float64)
+    snaps = np.full(n, np.nan, dtype=np.float64)
+    blocks = [
+        (row_tile, col_tile)
+        for row_tile in _tiles(sources, tile_size)
+        for col_tile in _tiles(destinations, tile_size)
+    ]
+    if not blocks:
+        return matrix, durations, snaps, True
+    print(f"Requesting {len(blocks)} table block(s) for {len(sources)}x{len(destinations)} pairs...")
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(blocks))) as executor:
+        results = executor.map(
+            lambda block: _fetch_tile(base_url, points, block[0], block[1], timeout, max_retries),
+            blocks
+        )
+        complete = True
+        for (row_tile, col_tile), block in zip(blocks, results):
+            if block is None:
+                complete = False
+                continue
+            matrix[np.ix_(row_tile, col_tile)] = block[0]
+            durations[np.ix_(row_tile, col_tile)] = block[1]
+            # Bir nokta her blokta aynı yere oturtulur; yine de en büyük değer tutulur
+            for tile, tile_snaps in ((row_tile, block[2]), (col_tile, block[3])):
+                snaps[tile] = np.fmax(snaps[tile], tile_snaps)
+
+    return matrix, durations, snaps, complete
@@ -0,0 +1,65 @@
+from typing import List, Sequence, Tuple
+
+# 5 basamak ~1.1 m; Google/Leaflet kod çözücülerinin varsayılanı
+POLYLINE_PRECISION = 5
+
+
+def _encode_value(value: int, chunks: List[str]):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+
+
+def encode(points: Sequence[Sequence[float]], precision: int = POLYLINE_PRECISION) -> str:
+    """
+    Encode (latitude, longitude) points as an encoded polyline string.
+
+    Each coordinate is stored as the zig-zag varint of its delta to the
+    previous point, so a road geometry takes a few bytes per point instead
+    of two Python floats inside a list.
+    """
+    factor = 10 ** precision
+    chunks: List[str] = []
+    prev_lat = prev_lon = 0
+    for point in points:
+        lat, lon = int(round(point[0] * factor)), int(round(point[1] * factor))
+        _encode_value(lat - prev_lat, chunks)
+        _encode_value(lon - prev_lon, chunks)
+        prev_lat, prev_lon = lat, lon
+    return ''.join(chunks)
+
+
+def decode(encoded: str, precision: int = POLYLINE_PRECISION) -> List[Tuple[float, float]]:
+    """Decode an encoded polyline into [(latitude, longitude), ...]"""
+    factor = 10 ** precision
+    points = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+    return points
+
+
+def encode_lonlat(coordinates: Sequence[Sequence[float]], precision: int = POLYLINE_PRECISION) -> str:
+    """Encode GeoJSON-ordered [[lon, lat], ...] coordinates"""
+    return encode([(coord[1], coord[0]) for coord in coordinates], precision)
+
+
+def decode_lonlat(encoded: str, precision: int = POLYLINE_PRECISION) -> List[List[float]]:
+    """Decode a polyline back to GeoJSON-ordered [[lon, lat], ...] coordinates"""
+    return [[lon, lat] for lat, lon in decode(encoded, precision)]
@@ -2,7 +2,7 @@ import random
 import numpy as np
 from typing import List, Dict, Any
 from models import Customer, Warehouse, Vehicle, Driver, VehicleStatus
-from utils.osrm_handler import OSRMHandler
+from utils.osrm_handler import get_shared_handler
 from sqlalchemy.orm import Session
 from alg_creator import run_tabu_search
 
@@ -110,8 +110,8 @@ def optimize_routes(
                 'error': f'Total demand ({total_demand:.2f}) exceeds total vehicle capacity ({total_capacity:.2f})'
             }
             
-        # Initialize OSRM handler and precompute distances
-        osrm_handler = OSRMHandler()
+        # Use the process-wide OSRM handler and precompute distances
+        osrm_handler = get_shared_handler()
         if not osrm_handler.precompute_distances(instance_data):
             return {
                 'success': False,
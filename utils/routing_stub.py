@@ -0,0 +1,266 @@
+"""
+Local stand-in for the OSRM and Open-Elevation services.
+
+Implements the endpoints the handlers use (/table, /route and the elevation
+lookup) so the solver and the Flask endpoints can run, be benchmarked and
+load-tested without network access:
+
+    python -m utils.routing_stub --port 5001 --latency 20
+    OSRM_BASE_URL=http://127.0.0.1:5001 \
+    ELEVATION_API_URL=http://127.0.0.1:5001/api/v1/lookup python app.py
+
+Modes:
+    synth   answer from haversine distances and a deterministic elevation field
+    replay  answer from recorded fixtures, synthesizing anything not recorded
+    record  forward to the real services and store every answer as a fixture
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+EARTH_RADIUS_M = 6371000
+CIRCUITY_FACTOR = 1.3     # yol mesafesi / kuş uçuşu mesafe
+AVERAGE_SPEED_MS = 40 / 3.6
+STEP_LENGTH_M = 50        # sentetik geometride noktalar arası mesafe
+
+
+def haversine_m(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Great-circle distance between two (lat, lon) points in meters"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def synthetic_elevation(lat: float, lon: float) -> float:
+    """Smooth, deterministic terrain (meters) so energy costs are reproducible"""
+    return round(
+        900
+        + 60 * math.sin(math.radians(lat) * 900)
+        + 40 * math.cos(math.radians(lon) * 700)
+        + 15 * math.sin(math.radians(lat + lon) * 2300),
+        1
+    )
+
+
+def _parse_coordinates(path_part: str) -> List[Tuple[float, float]]:
+    """OSRM 'lon,lat;lon,lat' path segment -> [(lat, lon), ...]"""
+    points = []
+    for pair in path_part.split(';'):
+        lon, lat = pair.split(',')
+        points.append((float(lat), float(lon)))
+    return points
+
+
+def _indices(value: Optional[str], count: int) -> List[int]:
+    if not value or value == 'all':
+        return list(range(count))
+    return [int(v) for v in value.split(';')]
+
+
+def synth_table(points: List[Tuple[float, float]], query: Dict[str, str]) -> dict:
+    sources = _indices(query.get('sources'), len(points))
+    destinations = _indices(query.get('destinations'), len(points))
+    distances = [
+        [round(haversine_m(points[i], points[j]) * CIRCUITY_FACTOR, 1) for j in destinations]
+        for i in sources
+    ]
+    # Sentetik noktalar tam yol üzerindedir (OSRM'deki gibi her uç için waypoint nesnesi)
+    response = {
+        "code": "Ok",
+        "distances": distances,
+        "sources": [{"location": [points[i][1], points[i][0]], "distance": 0.0} for i in sources],
+        "destinations": [{"location": [points[j][1], points[j][0]], "distance": 0.0} for j in destinations]
+    }
+    if 'duration' in query.get('annotations', 'duration'):
+        response["durations"] = [[round(d / AVERAGE_SPEED_MS, 1) for d in row] for row in distances]
+    return response
+
+
+def _leg_geometry(a: Tuple[float, float], b: Tuple[float, float]) -> List[List[float]]:
+    """Straight line a -> b sampled every STEP_LENGTH_M, as [lon, lat] pairs"""
+    count = max(1, int(haversine_m(a, b) / STEP_LENGTH_M))
+    return [
+        [round(a[1] + (b[1] - a[1]) * k / count, 6), round(a[0] + (b[0] - a[0]) * k / count, 6)]
+        for k in range(count + 1)
+    ]
+
+
+def synth_route(points: List[Tuple[float, float]], query: Dict[str, str]) -> dict:
+    legs = []
+    route_coordinates = []
+    for a, b in zip(points[:-1], points[1:]):
+        geometry = _leg_geometry(a, b)
+        distance = round(haversine_m(a, b) * CIRCUITY_FACTOR, 1)
+        duration = round(distance / AVERAGE_SPEED_MS, 1)
+        leg = {"distance": distance, "duration": duration, "summary": "", "weight": duration}
+        if query.get('steps') == 'true':
+            leg["steps"] = [
+                {"geometry": {"type": "LineString", "coordinates": geometry},
+                 "distance": distance, "duration": duration, "maneuver": {"type": "depart"}},
+                {"geometry": {"type": "LineString", "coordinates": [geometry[-1], geometry[-1]]},
+                 "distance": 0, "duration": 0, "maneuver": {"type": "arrive"}}
+            ]
+        legs.append(leg)
+        route_coordinates.extend(geometry if not route_coordinates else geometry[1:])
+
+    route = {
+        "distance": round(sum(leg["distance"] for leg in legs), 1),
+        "duration": round(sum(leg["duration"] for leg in legs), 1),
+        "legs": legs
+    }
+    if query.get('overview') != 'false':
+        route["geometry"] = {"type": "LineString", "coordinates": route_coordinates}
+    return {
+        "code": "Ok",
+        "routes": [route],
+        "waypoints": [{"location": [p[1], p[0]]} for p in points]
+    }
+
+
+def synth_lookup(locations: List[Dict[str, float]]) -> dict:
+    return {"results": [
+        {"latitude": loc["latitude"], "longitude": loc["longitude"],
+         "elevation": synthetic_elevation(loc["latitude"], loc["longitude"])}
+        for loc in locations
+    ]}
+
+
+class StubConfig:
+    def __init__(self, mode='synth', fixtures_dir=None, latency_ms=0.0,
+                 upstream_osrm=None, upstream_elevation=None):
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        self.latency_ms = latency_ms
+        self.upstream_osrm = (upstream_osrm or '').rstrip('/')
+        self.upstream_elevation = upstream_elevation
+        if fixtures_dir:
+            os.makedirs(fixtures_dir, exist_ok=True)
+
+    def fixture_path(self, method: str, path: str, query: str, body: bytes) -> str:
+        # Sorgu parametreleri sıralanır, aynı istek her zaman aynı dosyaya düşer
+        canonical_query = '&'.join(sorted(query.split('&'))) if query else ''
+        digest = hashlib.sha1(f"{method} {path}?{canonical_query}\n".encode() + body).hexdigest()
+        return os.path.join(self.fixtures_dir, f"{digest}.json")
+
+
+class RoutingStubHandler(BaseHTTPRequestHandler):
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle(b'')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self._handle(self.rfile.read(length))
+
+    def _handle(self, body: bytes):
+        if self.config.latency_ms:
+            time.sleep(self.config.latency_ms / 1000)
+        url = urlsplit(self.path)
+        fixture = None
+        if self.config.fixtures_dir:
+            fixture = self.config.fixture_path(self.command, url.path, url.query, body)
+
+        try:
+            if self.config.mode == 'replay' and fixture and os.path.exists(fixture):
+                with open(fixture) as f:
+                    recorded = json.load(f)
+                return self._send(recorded["status"], recorded["body"])
+
+            if self.config.mode == 'record':
+                status, payload = self._forward(url, body)
+                if fixture:
+                    with open(fixture, 'w') as f:
+                        json.dump({"status": status, "body": payload}, f)
+                return self._send(status, payload)
+
+            self._send(200, self._synthesize(url, body))
+        except ValueError as e:
+            self._send(400, {"code": "InvalidQuery", "message": str(e)})
+        except LookupError as e:
+            self._send(404, {"code": "InvalidUrl", "message": str(e)})
+
+    def _synthesize(self, url, body: bytes) -> dict:
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        if len(parts) == 4 and parts[0] == 'table':
+            return synth_table(_parse_coordinates(parts[3]), query)
+        if len(parts) == 4 and parts[0] == 'route':
+            return synth_route(_parse_coordinates(parts[3]), query)
+        if url.path.rstrip('/').endswith('/lookup'):
+            if body:
+                locations = json.loads(body)["locations"]
+            else:
+                # Open-Elevation GET biçimi: ?locations=lat,lon|lat,lon
+                locations = [
+                    {"latitude": float(lat), "longitude": float(lon)}
+                    for lat, lon in (p.split(',') for p in query.get('locations', '').split('|') if p)
+                ]
+            return synth_lookup(locations)
+        raise LookupError(f"Unsupported path: {url.path}")
+
+    def _forward(self, url, body: bytes) -> Tuple[int, dict]:
+        if url.path.rstrip('/').endswith('/lookup'):
+            target = self.config.upstream_elevation
+        else:
+            target = f"{self.config.upstream_osrm}{url.path}"
+        if url.query:
+            target = f"{target}?{url.query}"
+        if self.command == 'POST':
+            response = requests.post(target, data=body, headers={'Content-Type': 'application/json'}, timeout=60)
+        else:
+            response = requests.get(target, timeout=60)
+        return response.status_code, response.json()
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(host='127.0.0.1', port=5001, config: Optional[StubConfig] = None) -> ThreadingHTTPServer:
+    """Create the stub server (call serve_forever() or run it in a thread)"""
+    handler = type('ConfiguredRoutingStubHandler', (RoutingStubHandler,), {'config': config or StubConfig()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OSRM / Open-Elevation stand-in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--mode', choices=['synth', 'replay', 'record'], default='synth')
+    parser.add_argument('--fixtures', default=None, help="Fixture directory for replay/record")
+    parser.add_argument('--latency', type=float, default=0.0, help="Fixed delay per request (ms)")
+    parser.add_argument('--upstream-osrm', default='http://router.project-osrm.org')
+    parser.add_argument('--upstream-elevation', default='https://api.open-elevation.com/api/v1/lookup')
+    args = parser.parse_args()
+
+    if args.mode != 'synth' and not args.fixtures:
+        parser.error("--fixtures is required for replay and record modes")
+    config = StubConfig(args.mode, args.fixtures, args.latency, args.upstream_osrm, args.upstream_elevation)
+    server = serve(args.host, args.port, config)
+    print(f"Routing stub ({args.mode}) listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()